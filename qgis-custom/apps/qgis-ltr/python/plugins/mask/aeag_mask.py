@@ -35,10 +35,10 @@ from qgis.PyQt.QtWidgets import QAction
 
 from qgis.core import (
     Qgis,
+    QgsApplication,
     QgsExpression,
     QgsExpressionFunction,
     QgsGeometry,
-    QgsPointXY,
     QgsProject,
     QgsMapLayer,
     QgsVectorLayer,
@@ -48,10 +48,8 @@ from qgis.core import (
     QgsFeature,
     QgsVectorFileWriter,
     QgsRectangle,
-    QgsMapToPixelSimplifier,
-    QgsCoordinateReferenceSystem,
-    QgsCoordinateTransform,
     QgsVectorSimplifyMethod,
+    QgsTask,
     QgsMessageLog,
     QgsExpressionContextUtils,
     QgsLayoutItemMap,
@@ -60,7 +58,11 @@ from qgis.utils import showPluginHelp
 
 from .ui.maindialog import MainDialog
 from .logic import mask_filter
+from .logic.mask_engine import MaskEngine
+from .logic.membership_cache import MembershipCache
 from .logic.mask_parameters import MaskParameters
+from .logic.mask_precompute import layer_job, precompute_in_mask
+from .logic.mask_pyramid import build_levels, level_tolerances, read_scales
 from .logic import style_tools
 from functools import partial
 from .__about__ import DIR_PLUGIN_ROOT
@@ -145,7 +147,9 @@ in_mask(2154)"""
         return QCoreApplication.translate("InMaskFunction", message)
 
     def func(self, values, context, parent, node):
-        return self.mask.in_mask(context.feature(), values[0])
+        return self.mask.in_mask(
+            context.feature(), values[0], context.variable("layer_id")
+        )
 
 
 class aeag_mask(QObject):
@@ -204,6 +208,36 @@ class aeag_mask(QObject):
             for m in e.args:
                 QgsMessageLog.logMessage(m, "Extensions")
 
+        # prepared mask geometries and transforms, for in_mask
+        self.mask_engine = MaskEngine()
+        # in_mask answers by layer and feature, for the current mask generation
+        self.mask_generation = 0
+        self.membership_cache = MembershipCache(
+            int(QSettings().value("mask/membership_cache_size", 1000000))
+        )
+        # layer id -> signal connections of the layers whose edits invalidate
+        # the cache
+        self.watched_layers = {}
+        # layer id -> (srid, level, ids of the features in the mask), computed
+        # in the background for the current mask generation
+        self.in_mask_ids = {}
+        self.precompute_task = None
+        # (layer id, push down filter template) -> True if its provider
+        # compiles it
+        self.push_down_compiled = {}
+        # scale level of the last precomputation
+        self.precompute_level = None
+        # layers edited while the task runs
+        self.stale_in_mask_ids = set()
+        # scale denominators of the simplification levels of the mask
+        self.scales = read_scales(
+            QSettings().value(
+                "mask/scales_file",
+                str(DIR_PLUGIN_ROOT.parents[3] / "qgis-custom" / "WMTS_scales.xml"),
+            )
+        )
+        self.pyramid_task = None
+
         try:
             self.reset_mask_layer(False)
         except Exception as e:
@@ -223,7 +257,8 @@ class aeag_mask(QObject):
                 # remove mask filter from layer, if any
                 mask_filter.remove_mask_filter(layer)
 
-        self.simplified_geometries = {}
+        self.mask_engine.reset()
+        self.new_mask_generation()
 
     def initGui(self):
         self.mask_geometry_function = MaskGeometryFunction(self)
@@ -285,6 +320,9 @@ class aeag_mask(QObject):
         )
         self.on_current_layer_changed(None)
 
+        # filter the push down layers at the level of the new scale
+        self.canvas.scaleChanged.connect(self.on_scale_changed)
+
         # register to project reading
         # connect to QgisApp::projectRead to make sure MemoryLayerSaver has
         # been called before (it connects to QgsProject::readProject)
@@ -397,8 +435,14 @@ class aeag_mask(QObject):
         self.iface.mapCanvas().currentLayerChanged.disconnect(
             self.on_current_layer_changed
         )
+        self.canvas.scaleChanged.disconnect(self.on_scale_changed)
         self.iface.mainWindow().projectRead.disconnect(self.on_project_open)
 
+        for layer_id in list(self.watched_layers):
+            self.unwatch_layer(layer_id)
+        self.cancel_precompute()
+        self.cancel_pyramid()
+
     # force loading of parameters from a layer
     # for backward compatibility with older versions
     def load_from_layer(self, layer):
@@ -472,8 +516,8 @@ class aeag_mask(QObject):
         if parameters.do_buffer:
             geom = geom.buffer(parameters.buffer_units, parameters.buffer_segments)
 
-        # reset the simplified geometries dict
-        self.simplified_geometries = {}
+        # reset the simplified and prepared geometries
+        self.mask_engine.reset()
 
         return geom
 
@@ -500,6 +544,7 @@ class aeag_mask(QObject):
             poly=masked_atlas_geometry,
             name=self.layer.name(),
             cleanup_and_zoom=False,
+            precompute=False,
         )
 
         # update maps
@@ -533,7 +578,6 @@ class aeag_mask(QObject):
             name=self.layer.name(),
             cleanup_and_zoom=False,
         )
-        self.simplified_geometries = {}
 
         # process events to go out of the current rendering, if any
         QCoreApplication.processEvents()
@@ -551,6 +595,7 @@ class aeag_mask(QObject):
         name=None,
         cleanup_and_zoom=True,
         keep_layer=True,
+        precompute=True,
     ):
 
         # Apply given mask parameters to the given layer. Returns the new layer
@@ -594,6 +639,7 @@ class aeag_mask(QObject):
         # compute the geometry
         parameters.orig_geometry = [QgsGeometry(g) for g in poly]
         parameters.geometry = self.compute_mask_geometries(parameters, poly)
+        self.new_mask_generation()
 
         # disable rendering
         self.canvas.setRenderFlag(False)
@@ -660,6 +706,12 @@ class aeag_mask(QObject):
                 extent.scale(1.1)  # scales extent by 10% unzoomed
                 canvas.setExtent(extent)
 
+            self.watch_layers()
+            if precompute:
+                # not for atlas pages, rendered right away. Levels first, the
+                # precomputation is done at the level of the current scale
+                self.start_pyramid(parameters)
+                self.start_precompute(layer, parameters)
             self.update_menus()
 
             # refresh
@@ -727,6 +779,8 @@ class aeag_mask(QObject):
         self.on_current_layer_changed(self.iface.activeLayer())
 
     def on_remove_mask(self, layer_id):
+        self.unwatch_layer(layer_id)
+
         if self.disable_remove_mask_signal:
             return
 
@@ -861,47 +915,259 @@ class aeag_mask(QObject):
             self.iface.messageBar().pushMessage(self.tr("Mask plugin error"), self.tr(self.WRITE_ERRORS[error]) + ", " + self.tr("The mask remains in memory. Check file name, format and extension."), level=Qgis.Warning)
             return layer
 
+    def simplify_tolerance(self):
+        # mask simplification tolerance at the current scale, None if disabled
+        if not self.parameters.do_simplify:
+            return None
+
+        if hasattr(self.canvas, "mapSettings"):
+            return (
+                self.parameters.simplify_tolerance
+                * self.canvas.mapSettings().mapUnitsPerPixel()
+            )
+        else:
+            return (
+                self.parameters.simplify_tolerance
+                * self.canvas.mapRenderer().mapUnitsPerPixel()
+            )
+
+    def mask_level(self):
+        # simplification level of the mask at the current scale, None if not
+        # simplified
+        if not self.has_simplifier:
+            return None
+        return self.mask_engine.snap(self.simplify_tolerance())
+
     def mask_geometry(self):
         if not self.parameters.geometry:
             geom = QgsGeometry()
             return geom, QgsRectangle()
 
-        geom = QgsGeometry(self.parameters.geometry)  # COPY !!
+        self.mask_engine.bind(self.parameters.geometry)
+        geom, bbox = self.mask_engine.level(self.mask_level())
+
+        return QgsGeometry(geom), QgsRectangle(bbox)
+
+    def new_mask_generation(self):
+        # the mask changed: cached in_mask answers are stale
+        stats = self.membership_cache.stats()
+        if stats["hits"] or stats["misses"]:
+            QgsMessageLog.logMessage(
+                "Mask - in_mask cache: {hits} hits, {misses} misses, "
+                "{evictions} evictions, {entries} answers for {layers} "
+                "layers".format(**stats),
+                "Extensions",
+                level=Qgis.Info,
+            )
+        self.membership_cache.reset_stats()
+        self.membership_cache.clear()
+        self.cancel_precompute()
+        self.cancel_pyramid()
+        self.in_mask_ids = {}
+        self.mask_generation += 1
+
+    def watch_layers(self):
+        # forget the cached answers of features edited in the filtered layers
+        for layer_id, layer in self.project.mapLayers().items():
+            if layer_id in self.watched_layers:
+                continue
+            if not mask_filter.has_mask_filter(layer):
+                continue
+
+            connections = [
+                (
+                    layer.featuresDeleted,
+                    partial(self.on_filtered_features_changed, layer_id),
+                ),
+                (
+                    # not in the precomputed answers
+                    layer.featureAdded,
+                    partial(
+                        lambda lid, fid: self.on_filtered_features_changed(
+                            lid, [fid]
+                        ),
+                        layer_id,
+                    ),
+                ),
+                (
+                    layer.geometryChanged,
+                    partial(
+                        lambda lid, fid, geom: self.on_filtered_features_changed(
+                            lid, [fid]
+                        ),
+                        layer_id,
+                    ),
+                ),
+                (layer.dataChanged, partial(self.on_filtered_layer_changed, layer_id)),
+            ]
+            for signal, slot in connections:
+                signal.connect(slot)
+            self.watched_layers[layer_id] = connections
+
+    def unwatch_layer(self, layer_id):
+        self.push_down_compiled = {
+            key: compiled
+            for key, compiled in self.push_down_compiled.items()
+            if key[0] != layer_id
+        }
+        for signal, slot in self.watched_layers.pop(layer_id, []):
+            try:
+                signal.disconnect(slot)
+            except Exception:
+                # layer already deleted
+                pass
+        self.on_filtered_layer_changed(layer_id)
+
+    def on_filtered_features_changed(self, layer_id, fids):
+        self.membership_cache.remove(layer_id, fids)
+        self.forget_in_mask_ids(layer_id)
+
+    def on_filtered_layer_changed(self, layer_id):
+        self.membership_cache.clear(layer_id)
+        self.forget_in_mask_ids(layer_id)
+
+    def forget_in_mask_ids(self, layer_id):
+        # evaluate features of the layer on demand again
+        self.in_mask_ids.pop(layer_id, None)
+        if self.precompute_task is not None:
+            self.stale_in_mask_ids.add(layer_id)
+
+    def start_precompute(self, layer, parameters, push_down_only=False):
+        # compute the features in the mask of every filtered layer at once,
+        # in_mask evaluates them on demand until it is done
+        self.cancel_precompute()
+        if layer is None or not parameters.geometry:
+            return
 
-        if self.parameters.do_simplify:
-            if hasattr(self.canvas, "mapSettings"):
-                tol = (
-                    self.parameters.simplify_tolerance
-                    * self.canvas.mapSettings().mapUnitsPerPixel()
-                )
-            else:
-                tol = (
-                    self.parameters.simplify_tolerance
-                    * self.canvas.mapRenderer().mapUnitsPerPixel()
-                )
+        # the answers are the ones in_mask gives at the current scale level,
+        # and only used at this level
+        level = self.mask_level()
+        self.precompute_level = level
+        self.mask_engine.bind(parameters.geometry)
+
+        jobs = [
+            layer_job(l, parameters, self.push_down_compiled)
+            for l in self.project.mapLayers().values()
+            if mask_filter.has_mask_filter(l)
+            and (not push_down_only or mask_filter.can_push_down(l))
+        ]
+        if push_down_only:
+            # filters not compiled are tested on demand
+            jobs = [job for job in jobs if job[5] is not None]
+        if not jobs:
+            return
 
-            if tol in list(self.simplified_geometries.keys()):
-                geom, bbox = self.simplified_geometries[tol]
-            else:
-                if self.has_simplifier:
-                    simplifier = QgsMapToPixelSimplifier(
-                        QgsMapToPixelSimplifier.SimplifyGeometry, tol
-                    )
-                    geom = simplifier.simplify(geom)
-                    if not geom.isGeosValid():
-                        # make valid
-                        geom = geom.buffer(0.0, 1)
-                bbox = geom.boundingBox()
-                self.simplified_geometries[tol] = (
-                    QgsGeometry(geom),
-                    QgsRectangle(bbox),
-                )
-        else:
-            bbox = geom.boundingBox()
+        # the mask is simplified, serialized and the filters checked in the
+        # task. Transforms can't use the project there
+        self.stale_in_mask_ids = set()
+        self.precompute_task = QgsTask.fromFunction(
+            self.tr("Mask: features in the mask"),
+            precompute_in_mask,
+            jobs,
+            self.mask_engine,
+            self.mask_engine.snapshot(),
+            level,
+            layer.crs(),
+            self.project.transformContext(),
+            parameters.polygon_mask_method,
+            parameters.line_mask_method,
+            on_finished=partial(self.on_precomputed, self.mask_generation, level),
+        )
+        QgsApplication.taskManager().addTask(self.precompute_task)
+
+    def on_scale_changed(self, scale):
+        # in_mask answers of the push down layers are computed by their
+        # provider at every level, the other layers are evaluated on demand
+        if self.layer is None or not self.parameters.push_down:
+            return
+        if self.mask_level() == self.precompute_level:
+            return
+        self.start_precompute(self.layer, self.parameters, push_down_only=True)
 
-        return geom, bbox
+    def cancel_precompute(self):
+        if self.precompute_task is not None:
+            try:
+                self.precompute_task.cancel()
+            except RuntimeError:
+                # already deleted
+                pass
+            self.precompute_task = None
+
+    def on_precomputed(self, generation, level, exception, result=None):
+        if generation != self.mask_generation:
+            # the mask changed in the meantime
+            return
+
+        self.precompute_task = None
+        if exception is not None:
+            QgsMessageLog.logMessage(
+                "Mask - in_mask precomputation - {}".format(exception), "Extensions"
+            )
+            return
+        if result is None:
+            return
+
+        result, checks = result
+        # filters are checked once per layer and shape
+        self.push_down_compiled.update(checks)
+        for layer_id, (srid, ids) in result.items():
+            if layer_id not in self.stale_in_mask_ids:
+                self.in_mask_ids[layer_id] = (srid, level, ids)
+        self.stale_in_mask_ids = set()
+
+    def start_pyramid(self, parameters):
+        # simplify the mask for every scale level in the background, levels
+        # not done yet are simplified on demand
+        self.cancel_pyramid()
+        self.mask_engine.set_tolerances([])
+        if not parameters.geometry or not parameters.do_simplify:
+            return
+        if not self.has_simplifier or not self.scales:
+            return
+
+        settings = self.canvas.mapSettings()
+        tolerances = level_tolerances(
+            parameters.simplify_tolerance,
+            settings.mapUnitsPerPixel(),
+            settings.scale(),
+            self.scales,
+        )
+        if not tolerances:
+            return
+
+        self.mask_engine.bind(parameters.geometry)
+        self.mask_engine.set_tolerances(tolerances)
+        self.pyramid_task = QgsTask.fromFunction(
+            self.tr("Mask: simplification levels"),
+            build_levels,
+            self.mask_engine,
+            self.mask_engine.snapshot(),
+            self.mask_engine.tolerances,
+            on_finished=partial(self.on_pyramid_built, self.mask_generation),
+        )
+        QgsApplication.taskManager().addTask(self.pyramid_task)
+
+    def cancel_pyramid(self):
+        if self.pyramid_task is not None:
+            try:
+                self.pyramid_task.cancel()
+            except RuntimeError:
+                # already deleted
+                pass
+            self.pyramid_task = None
+
+    def on_pyramid_built(self, generation, exception, result=None):
+        if generation != self.mask_generation:
+            # the mask changed in the meantime
+            return
+
+        self.pyramid_task = None
+        if exception is not None:
+            QgsMessageLog.logMessage(
+                "Mask - simplification levels - {}".format(exception), "Extensions"
+            )
 
-    def in_mask(self, feature, srid=None):
+    def in_mask(self, feature, srid=None, layer_id=None):
         if feature is None:  # expression overview
             return False
 
@@ -919,62 +1185,47 @@ class aeag_mask(QObject):
         if self.layer.featureCount() == 0:
             return True
 
-        mask_geom, bbox = self.mask_geometry()
-        geom = QgsGeometry(feature.geometry())
-        if not geom.isGeosValid():
-            geom = geom.buffer(0.0, 1)
-
-        if geom is None:
+        if not self.parameters.geometry:
             return False
 
-        if srid is not None and self.layer.crs().postgisSrid() != srid:
-            src_crs = QgsCoordinateReferenceSystem(srid)
-            dest_crs = self.layer.crs()
-            xform = QgsCoordinateTransform(src_crs, dest_crs, QgsProject.instance())
-            try:
-                geom.transform(xform)
+        if self.parameters.polygon_mask_method == 2 and not self.has_point_on_surface:
+            self.parameters.polygon_mask_method = 1
+
+        tol = self.mask_level()
+        if layer_id:
+            # computed in the background for the whole layer, at a scale level
+            in_mask_ids = self.in_mask_ids.get(layer_id)
+            if in_mask_ids is not None and in_mask_ids[:2] == (srid, tol):
+                return feature.id() in in_mask_ids[2]
+
+        # everything the answer depends on, besides the feature geometry
+        stamp = (
+            self.mask_generation,
+            tol,
+            self.parameters.polygon_mask_method,
+            self.parameters.line_mask_method,
+            srid,
+        )
+        if layer_id:
+            answer = self.membership_cache.get(layer_id, feature.id(), stamp)
+            if answer is not None:
+                return answer
+
+        # prepared geometries are rebuilt only if the mask changed
+        self.mask_engine.bind(self.parameters.geometry)
+        answer = self.mask_engine.in_mask(
+            feature.geometry(),
+            srid,
+            self.layer.crs(),
+            tol,
+            self.parameters.polygon_mask_method,
+            self.parameters.line_mask_method,
+        )
 
-            except Exception as e:
-                for m in e.args:
-                    QgsMessageLog.logMessage("in_mask - {}".format(m), "Extensions")
-                    # transformation error. Check layer projection.
-                    pass
+        if layer_id:
+            self.membership_cache.put(layer_id, feature.id(), stamp, answer)
 
-        if geom.type() == QgsWkbTypes.PolygonGeometry:
-            if (
-                self.parameters.polygon_mask_method == 2
-                and not self.has_point_on_surface
-            ):
-                self.parameters.polygon_mask_method = 1
-
-            if self.parameters.polygon_mask_method == 0:
-                # this method can only work when no geometry simplification is involved
-                return mask_geom.overlaps(geom) or mask_geom.contains(geom)
-            elif self.parameters.polygon_mask_method == 1:
-                # the fastest method, but with possible inaccuracies
-                pt = geom.vertexAt(0)
-                return bbox.contains(QgsPointXY(pt)) and mask_geom.contains(
-                    geom.centroid()
-                )
-            elif self.parameters.polygon_mask_method == 2:
-                # will always work
-                pt = geom.vertexAt(0)
-                return bbox.contains(QgsPointXY(pt)) and mask_geom.contains(
-                    geom.pointOnSurface()
-                )
-            else:
-                return False
-        elif geom.type() == QgsWkbTypes.LineGeometry:
-            if self.parameters.line_mask_method == 0:
-                return mask_geom.intersects(geom)
-            elif self.parameters.line_mask_method == 1:
-                return mask_geom.contains(geom)
-            else:
-                return False
-        elif geom.type() == QgsWkbTypes.PointGeometry:
-            return mask_geom.intersects(geom)
-        else:
-            return False
+        return answer
 
     def do_test(self):
         # This test is hard to run without a full QGIS app running
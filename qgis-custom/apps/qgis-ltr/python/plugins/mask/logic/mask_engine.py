@@ -0,0 +1,235 @@
+"""
+Evaluation of features against the mask geometry, behind in_mask()
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+import threading
+from bisect import bisect_right
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsGeometry,
+    QgsMapToPixelSimplifier,
+    QgsMessageLog,
+    QgsProject,
+    QgsRectangle,
+    QgsWkbTypes,
+)
+
+# polygon mask methods
+POLYGON_EXACT = 0
+POLYGON_CENTROID = 1
+POLYGON_POINT_ON_SURFACE = 2
+
+# line mask methods
+LINE_INTERSECTS = 0
+LINE_CONTAINS = 1
+
+
+class MaskEngine:
+    """Answer in_mask() for each label candidate, on every redraw.
+
+    The mask geometry is simplified once per tolerance and prepared once per
+    tolerance and rendering thread (GEOS prepared geometries are not shared
+    between threads). Coordinate transforms are built once per feature srid.
+    Everything is rebuilt when the mask geometry changes, or on reset().
+
+    Tolerances are snapped to a bounded set of levels (see snap), so zooming
+    reuses the simplified geometries.
+
+    Transforms use the given transform context, the one of the current project
+    if None. Engines used outside of the main thread must be given one.
+    """
+
+    def __init__(self, transform_context=None):
+        self.generation = 0
+        self.transform_context = transform_context
+        # simplification tolerance of each level, ascending
+        self.tolerances = []
+        self.reset()
+
+    def reset(self, geometry=None):
+        """Forget everything computed from the mask geometry and CRS, and use
+        this geometry"""
+        self.generation += 1
+        # (feature srid, mask srid) -> transform, None if not needed
+        self.transforms = {}
+        # published at once: (geometry, tolerance (None: not simplified) ->
+        # (geometry, bbox), prepared geometries of each thread). A level built
+        # for a previous geometry never lands in the levels of the new one
+        self.state = (geometry, {}, threading.local())
+
+    @property
+    def geometry(self):
+        return self.state[0]
+
+    def bind(self, geometry):
+        """Use this mask geometry, reset if it is not the current one"""
+        if geometry is not self.geometry:
+            self.reset(geometry)
+
+    def snapshot(self):
+        """Return the current mask geometry and its levels, for a task that
+        must keep building the levels of this geometry (see level)"""
+        return self.state
+
+    def set_tolerances(self, tolerances):
+        """Simplify the mask only with these tolerances, e.g. one per map scale"""
+        self.tolerances = sorted(tolerances)
+
+    def snap(self, tolerance):
+        """Return the level of a tolerance: the nearest finer one, None (not
+        simplified) if there is none. Without levels, tolerances are rounded
+        down to a power of two."""
+        if tolerance is None or tolerance <= 0:
+            return None
+
+        if self.tolerances:
+            i = bisect_right(self.tolerances, tolerance)
+            return self.tolerances[i - 1] if i else None
+
+        return 2.0 ** math.floor(math.log2(tolerance))
+
+    def level(self, tolerance=None, state=None):
+        """Return the mask geometry simplified with the given tolerance, and
+        its bounding box
+
+        Of the geometry of a snapshot if one is given, of the current one
+        otherwise.
+        """
+        # a reset while it is built must not mix geometries
+        geometry, levels, _ = self.state if state is None else state
+        if tolerance not in levels:
+            geom = QgsGeometry(geometry)
+            if tolerance is not None:
+                simplifier = QgsMapToPixelSimplifier(
+                    QgsMapToPixelSimplifier.SimplifyGeometry, tolerance
+                )
+                geom = simplifier.simplify(geom)
+                if not geom.isGeosValid():
+                    # make valid
+                    geom = geom.buffer(0.0, 1)
+            levels[tolerance] = (geom, QgsRectangle(geom.boundingBox()))
+
+        return levels[tolerance]
+
+    def prepared(self, tolerance=None):
+        """Return the GEOS prepared mask geometry of the current thread and its
+        bounding box"""
+        state = self.state
+        local = state[2]
+        if not hasattr(local, "engines"):
+            local.engines = {}
+
+        if tolerance not in local.engines:
+            geom, bbox = self.level(tolerance, state)
+            engine = QgsGeometry.createGeometryEngine(geom.constGet())
+            engine.prepareGeometry()
+            # the engine must not outlive its geometry
+            local.engines[tolerance] = (engine, bbox, geom)
+
+        return local.engines[tolerance][:2]
+
+    def transform(self, srid, mask_crs):
+        """Return the transform from the feature srid to the mask CRS, None if
+        they are the same"""
+        key = (srid, mask_crs.postgisSrid())
+        if key not in self.transforms:
+            xform = None
+            if srid is not None and srid != key[1]:
+                context = self.transform_context
+                if context is None:
+                    context = QgsProject.instance().transformContext()
+                xform = QgsCoordinateTransform(
+                    QgsCoordinateReferenceSystem(srid), mask_crs, context
+                )
+            self.transforms[key] = xform
+
+        return self.transforms[key]
+
+    def in_mask(self, geometry, srid, mask_crs, tolerance, polygon_method, line_method):
+        """Return True if a feature geometry is in the mask
+
+        Polygons are only made valid for the exact method, the others test a
+        single point.
+        """
+        if geometry is None or geometry.isNull():
+            return False
+
+        engine, bbox = self.prepared(tolerance)
+        xform = self.transform(srid, mask_crs)
+        geom_type = geometry.type()
+
+        if geom_type == QgsWkbTypes.PolygonGeometry:
+            if polygon_method == POLYGON_EXACT:
+                # this method can only work when no geometry simplification is involved
+                geom = geometry
+                if not geom.isGeosValid():
+                    geom = geom.buffer(0.0, 1)
+                geom = self._transformed(geom, xform)
+                if not bbox.intersects(geom.boundingBox()):
+                    return False
+                return engine.overlaps(geom.constGet()) or engine.contains(
+                    geom.constGet()
+                )
+
+            if polygon_method == POLYGON_CENTROID:
+                # the fastest method, but with possible inaccuracies
+                point = geometry.centroid()
+            elif polygon_method == POLYGON_POINT_ON_SURFACE:
+                # will always work
+                point = geometry.pointOnSurface()
+                if point.isNull():
+                    # invalid polygon
+                    point = geometry.buffer(0.0, 1).pointOnSurface()
+            else:
+                return False
+
+            point = self._transformed(point, xform)
+            if point.isNull() or not bbox.contains(point.asPoint()):
+                return False
+            return engine.contains(point.constGet())
+
+        if geom_type == QgsWkbTypes.LineGeometry:
+            geom = self._transformed(geometry, xform)
+            if not bbox.intersects(geom.boundingBox()):
+                return False
+            if line_method == LINE_INTERSECTS:
+                return engine.intersects(geom.constGet())
+            if line_method == LINE_CONTAINS:
+                return engine.contains(geom.constGet())
+            return False
+
+        if geom_type == QgsWkbTypes.PointGeometry:
+            geom = self._transformed(geometry, xform)
+            if not bbox.intersects(geom.boundingBox()):
+                return False
+            return engine.intersects(geom.constGet())
+
+        return False
+
+    @staticmethod
+    def _transformed(geometry, xform):
+        if xform is None:
+            return geometry
+
+        geom = QgsGeometry(geometry)
+        try:
+            geom.transform(xform)
+        except QgsCsException as e:
+            # transformation error. Check layer projection.
+            for m in e.args:
+                QgsMessageLog.logMessage("in_mask - {}".format(m), "Extensions")
+
+        return geom
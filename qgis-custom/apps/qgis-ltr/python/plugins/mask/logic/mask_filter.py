@@ -1,15 +1,24 @@
 #! python3  # noqa: E265
 
 from qgis.core import (
+    QgsAbstractFeatureIterator,
+    QgsExpression,
+    QgsFeature,
+    QgsFeatureRequest,
     QgsVectorLayer,
     QgsPalLayerSettings,
     QgsProperty,
     QgsMessageLog,
     QgsVectorLayerSimpleLabeling,
+    QgsWkbTypes,
 )
 
 SPATIAL_FILTER = "in_mask"
 
+# providers compiling the spatial functions of the mask filter to SQL (the OGR
+# compiler of GeoPackage layers doesn't)
+PUSH_DOWN_PROVIDERS = ("postgres",)
+
 
 def has_mask_filter(layer):
     if not isinstance(layer, QgsVectorLayer):
@@ -77,3 +86,87 @@ def add_mask_filter(layer):
     except Exception as e:
         for m in e.args:
             QgsMessageLog.logMessage(m, "Extensions")
+
+
+def can_push_down(layer):
+    # PostGIS layers
+    if not isinstance(layer, QgsVectorLayer) or not layer.isSpatial():
+        return False
+
+    provider = layer.dataProvider()
+    return provider is not None and provider.name() in PUSH_DOWN_PROVIDERS
+
+
+def mask_filter_template(geometry_type, polygon_mask_method, line_mask_method):
+    """Return the filter expression of the features in the mask, with the same
+    semantics as in_mask, {mask} standing for the mask geometry. None if there
+    is none for this geometry type.
+
+    It only uses functions the provider compiles to SQL (ST_Intersects,
+    ST_Contains...).
+    """
+    if geometry_type == QgsWkbTypes.PolygonGeometry:
+        if polygon_mask_method == 0:
+            return "overlaps({mask}, $geometry) OR contains({mask}, $geometry)"
+        elif polygon_mask_method == 1:
+            return "contains({mask}, centroid($geometry))"
+        elif polygon_mask_method == 2:
+            return "contains({mask}, point_on_surface($geometry))"
+    elif geometry_type == QgsWkbTypes.LineGeometry:
+        if line_mask_method == 0:
+            return "intersects({mask}, $geometry)"
+        elif line_mask_method == 1:
+            return "contains({mask}, $geometry)"
+    elif geometry_type == QgsWkbTypes.PointGeometry:
+        return "intersects({mask}, $geometry)"
+
+    return None
+
+
+def push_down_template(layer, polygon_mask_method, line_mask_method):
+    # filter of the layer features in the mask, None if it can't be pushed down
+    if not can_push_down(layer):
+        return None
+
+    return mask_filter_template(
+        layer.geometryType(), polygon_mask_method, line_mask_method
+    )
+
+
+def push_down_expression(template, mask_wkt):
+    """Return the filter expression of a template, the mask geometry (in the
+    layer CRS) being a literal"""
+    return template.format(
+        mask="geom_from_wkt({})".format(QgsExpression.quotedString(mask_wkt))
+    )
+
+
+def push_down_compiles(source, expression, rect=None):
+    """Return True if a provider feature source compiles the whole expression
+    (to SQL). It reads a feature, call it from a task.
+
+    Expressions not compiled are evaluated on the client, reading every
+    geometry: the mask is then better tested against the prepared geometry.
+    """
+    request = QgsFeatureRequest().setFilterExpression(expression)
+    request.setNoAttributes()
+    request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+    request.setLimit(1)
+    if rect is not None:
+        request.setFilterRect(rect)
+
+    try:
+        iterator = source.getFeatures(request)
+        compiled = iterator.compileStatus() == QgsAbstractFeatureIterator.Compiled
+        # the query is sent on the first fetch
+        iterator.nextFeature(QgsFeature())
+        compiled = compiled and not iterator.compileFailed()
+        iterator.close()
+    except Exception as e:
+        for m in e.args:
+            QgsMessageLog.logMessage(
+                "push_down_compiles - {}".format(m), "Extensions"
+            )
+        return False
+
+    return compiled
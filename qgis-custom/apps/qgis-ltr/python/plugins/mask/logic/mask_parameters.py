@@ -37,6 +37,8 @@ class MaskParameters:
         self.orig_geometry = []
         self.geometry = None
         self.do_atlas_interaction = True
+        # filter PostGIS layers in the database, when possible
+        self.push_down = True
 
     def serialize(self, with_style=True):
         if with_style:
@@ -63,6 +65,7 @@ class MaskParameters:
                 else None,
                 self.geometry.asWkb() if self.geometry is not None else None,
                 self.do_atlas_interaction,
+                self.push_down,
             ],
             protocol=0,
             fix_imports=True,
@@ -109,6 +112,9 @@ class MaskParameters:
         if len(t) >= 15:
             self.do_atlas_interaction = t[14]
 
+        if len(t) >= 16:
+            self.push_down = t[15]
+
         self.style = None
         self.geometry = None
         if style is not None:
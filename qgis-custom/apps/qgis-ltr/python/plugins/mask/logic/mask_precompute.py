@@ -0,0 +1,179 @@
+"""
+Precomputation of the features in the mask, in a background task
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsMessageLog,
+    QgsVectorLayerFeatureSource,
+)
+
+from .mask_engine import MaskEngine
+from .mask_filter import push_down_compiles, push_down_expression, push_down_template
+
+# features tested between two progress updates (and cancel checks)
+BATCH_SIZE = 1024
+
+
+def layer_job(layer, parameters, compiled):
+    """Return what the task needs to read a layer, to be called from the main
+    thread: (layer id, layer name, feature source, CRS, feature count, push down
+    filter template or None, provider feature source or None, True if the
+    template is known to compile, None if it must be checked)
+
+    Compile checks of the previous tasks are given by (layer id, template).
+    """
+    template = None
+    if parameters.push_down:
+        template = push_down_template(
+            layer, parameters.polygon_mask_method, parameters.line_mask_method
+        )
+    if compiled.get((layer.id(), template)) is False:
+        # tested on the client
+        template = None
+
+    return (
+        layer.id(),
+        layer.name(),
+        QgsVectorLayerFeatureSource(layer),
+        layer.crs(),
+        max(layer.featureCount(), 1),
+        template,
+        layer.dataProvider().featureSource() if template is not None else None,
+        compiled.get((layer.id(), template)),
+    )
+
+
+def precompute_in_mask(
+    task,
+    jobs,
+    mask_engine,
+    state,
+    level,
+    mask_crs,
+    transform_context,
+    polygon_method,
+    line_method,
+):
+    """Return the ids of the features in the mask of each layer
+
+    Function run by a QgsTask. Only the features in the mask bounding box are
+    read, without their attributes, and tested against the prepared mask
+    geometry. It is the mask of the engine snapshot simplified for the scale
+    level the answers are computed for, so they are the ones in_mask gives at
+    this level. Layers with a push down template compiled by their provider are
+    filtered in SQL, only the feature ids are read.
+
+    :return: (srid, feature ids) by layer id and the compile checks done, by
+    (layer id, template), None if canceled
+    """
+    geometry, _ = mask_engine.level(level, state)
+    engine = MaskEngine(transform_context)
+    engine.bind(QgsGeometry(geometry))
+
+    total = sum(job[4] for job in jobs)
+    base = 0
+    results = {}
+    checks = {}
+    for job in jobs:
+        layer_id, name, source, crs, count, template, provider_source, compiled = job
+        srid = crs.postgisSrid()
+        mask = QgsGeometry(geometry)
+        if crs != mask_crs:
+            try:
+                mask.transform(QgsCoordinateTransform(mask_crs, crs, transform_context))
+            except QgsCsException:
+                # read and test every feature
+                mask = None
+
+        request = QgsFeatureRequest().setNoAttributes()
+        expression = None
+        if mask is not None:
+            request.setFilterRect(mask.boundingBox())
+            if template is not None:
+                expression = push_down_expression(template, mask.asWkt())
+        if expression is not None and compiled is None:
+            compiled = push_down_compiles(
+                provider_source, expression, request.filterRect()
+            )
+            checks[(layer_id, template)] = compiled
+            if not compiled:
+                QgsMessageLog.logMessage(
+                    "Mask - filter not compiled by the provider of {}, features "
+                    "tested on the client".format(name),
+                    "Extensions",
+                )
+                expression = None
+
+        ids = set()
+        read = 0
+        if expression is not None:
+            # filtered in the database: only the ids are read
+            request.setFilterExpression(expression)
+            request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+            for feature in source.getFeatures(request):
+                ids.add(feature.id())
+                read += 1
+                if read % BATCH_SIZE == 0:
+                    task.setProgress(100.0 * (base + min(read, count)) / total)
+                    if task.isCanceled():
+                        return None
+        else:
+            batch = []
+            for feature in source.getFeatures(request):
+                batch.append(feature)
+                if len(batch) < BATCH_SIZE:
+                    continue
+
+                ids.update(
+                    _in_mask_ids(
+                        engine, batch, srid, mask_crs, polygon_method, line_method
+                    )
+                )
+                read += len(batch)
+                batch = []
+                task.setProgress(100.0 * (base + min(read, count)) / total)
+                if task.isCanceled():
+                    return None
+
+            ids.update(
+                _in_mask_ids(engine, batch, srid, mask_crs, polygon_method, line_method)
+            )
+        results[layer_id] = (srid, ids)
+
+        # features out of the bounding box are done too
+        base += count
+        task.setProgress(100.0 * base / total)
+        if task.isCanceled():
+            return None
+
+    return results, checks
+
+
+def _in_mask_ids(engine, features, srid, mask_crs, polygon_method, line_method):
+    ids = []
+    for feature in features:
+        try:
+            if engine.in_mask(
+                feature.geometry(), srid, mask_crs, None, polygon_method, line_method
+            ):
+                ids.append(feature.id())
+        except Exception as e:
+            for m in e.args:
+                QgsMessageLog.logMessage(
+                    "precompute_in_mask - {}".format(m), "Extensions"
+                )
+
+    return ids
@@ -0,0 +1,64 @@
+"""
+Pyramid of simplified mask geometries, one level per map scale
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from xml.etree import ElementTree
+
+from qgis.core import QgsMessageLog
+
+
+def read_scales(path):
+    """Return the scale denominators of a QGIS scales file (<qgsScales>), from
+    the finest to the coarsest, empty if it can't be read"""
+    try:
+        root = ElementTree.parse(str(path)).getroot()
+    except (OSError, ElementTree.ParseError) as e:
+        QgsMessageLog.logMessage(
+            "Mask - scales not read from {} - {}".format(path, e), "Extensions"
+        )
+        return []
+
+    scales = set()
+    for scale in root.iter("scale"):
+        try:
+            scales.add(float(scale.get("value", "").split(":")[-1]))
+        except ValueError:
+            continue
+
+    return sorted(s for s in scales if s > 0)
+
+
+def level_tolerances(simplify_tolerance, map_units_per_pixel, scale, scales):
+    """Return the simplification tolerance of each scale level, from the current
+    map units per pixel at the current scale"""
+    if not scale or not scales:
+        return []
+
+    units_per_pixel_per_scale = map_units_per_pixel / scale
+    return [simplify_tolerance * units_per_pixel_per_scale * s for s in scales]
+
+
+def build_levels(task, engine, state, tolerances):
+    """Simplify and validate the mask for every level, coarsest first
+
+    Function run by a QgsTask, on the engine snapshot taken when it started: if
+    the mask changes meanwhile, the levels are built for the previous one and
+    dropped with it. Levels not built yet are built on demand, when a label is
+    evaluated at their scale.
+    """
+    for i, tolerance in enumerate(reversed(tolerances)):
+        if task.isCanceled():
+            return False
+        engine.level(tolerance, state)
+        task.setProgress(100.0 * (i + 1) / len(tolerances))
+
+    return True
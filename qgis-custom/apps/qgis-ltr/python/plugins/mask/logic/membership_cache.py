@@ -0,0 +1,108 @@
+"""
+Cache of the in_mask() answers, by layer and feature
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class MembershipCache:
+    """Remember if features are in the mask, so pans, zooms and atlas pages
+    don't evaluate the same features again.
+
+    Answers are stored by layer and stamp: everything the answer depends on
+    besides the feature geometry (mask generation, simplification tolerance,
+    methods and srid). Edits of a layer must be reported with remove() or
+    clear().
+
+    At most max_entries answers are kept, the least recently used (layer,
+    stamp) entries are evicted first. It is safe to use from the rendering
+    threads.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Return hits, misses, evictions and the number of cached answers"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": self.size,
+                "layers": len({layer_id for layer_id, _ in self._entries}),
+            }
+
+    def get(self, layer_id, fid, stamp):
+        """Return the cached answer, None if unknown"""
+        with self._lock:
+            members = self._entries.get((layer_id, stamp))
+            if members is not None:
+                self._entries.move_to_end((layer_id, stamp))
+                answer = members.get(fid)
+                if answer is not None:
+                    self.hits += 1
+                    return answer
+
+            self.misses += 1
+            return None
+
+    def put(self, layer_id, fid, stamp, answer):
+        with self._lock:
+            key = (layer_id, stamp)
+            members = self._entries.setdefault(key, {})
+            if fid not in members:
+                self.size += 1
+            members[fid] = answer
+            self._entries.move_to_end(key)
+
+            while self.size > self.max_entries and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += len(evicted)
+
+            if self.size > self.max_entries:
+                # a single entry over the limit: start it again
+                self.evictions += self.size
+                members.clear()
+                self.size = 0
+
+    def remove(self, layer_id, fids):
+        """Forget some features of a layer (deleted or moved)"""
+        with self._lock:
+            for key, members in self._entries.items():
+                if key[0] != layer_id:
+                    continue
+                for fid in fids:
+                    if members.pop(fid, None) is not None:
+                        self.size -= 1
+
+    def clear(self, layer_id=None):
+        """Forget a layer, or every layer"""
+        with self._lock:
+            if layer_id is None:
+                self._entries = OrderedDict()
+                self.size = 0
+                return
+
+            for key in [key for key in self._entries if key[0] == layer_id]:
+                self.size -= len(self._entries.pop(key))
@@ -0,0 +1,7 @@
+"""
+Tests of the mask logic
+
+Run them with the QGIS Python interpreter, from the plugins folder:
+
+    python -m unittest discover -s mask/test -t .
+"""
@@ -0,0 +1,292 @@
+"""
+Mask filter pushed down to PostGIS layers: the filter selects the features
+in_mask selects, it is only pushed down to the providers compiling it, and
+the precomputed answers are the ones tested on the client
+
+The PostGIS tests need a test database, given as a connection string by the
+QGIS_PGTEST_DB environment variable (as for the QGIS provider tests), e.g.
+"service=qgis_test" or "dbname=qgis_test host=localhost user=qgis"
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransformContext,
+    QgsDataSourceUri,
+    QgsExpression,
+    QgsExpressionContext,
+    QgsFeature,
+    QgsGeometry,
+    QgsProviderRegistry,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+    QgsVectorLayerExporter,
+)
+from qgis.testing import start_app
+
+from mask.logic.mask_engine import (
+    LINE_CONTAINS,
+    LINE_INTERSECTS,
+    POLYGON_CENTROID,
+    POLYGON_EXACT,
+    POLYGON_POINT_ON_SURFACE,
+    MaskEngine,
+)
+from mask.logic.mask_filter import (
+    can_push_down,
+    mask_filter_template,
+    push_down_expression,
+)
+from mask.logic.mask_parameters import MaskParameters
+from mask.logic.mask_precompute import layer_job, precompute_in_mask
+
+CRS = "EPSG:2154"
+
+# concave, so that centroids and points on surface differ from the bounding box
+MASK_WKT = (
+    "Polygon ((0 0, 1000 0, 1000 1000, 600 1000, 600 400, 400 400, 400 1000, "
+    "0 1000, 0 0))"
+)
+
+# functions QgsPostgresExpressionCompiler translates to PostGIS ones
+POSTGIS_FUNCTIONS = {
+    "$geometry",
+    "centroid",
+    "contains",
+    "geom_from_wkt",
+    "intersects",
+    "overlaps",
+    "point_on_surface",
+}
+
+# geometry type, (polygon method, line method) of each filter
+METHODS = {
+    "Point": [(POLYGON_EXACT, LINE_INTERSECTS)],
+    "LineString": [(POLYGON_EXACT, LINE_INTERSECTS), (POLYGON_EXACT, LINE_CONTAINS)],
+    "Polygon": [
+        (POLYGON_EXACT, LINE_INTERSECTS),
+        (POLYGON_CENTROID, LINE_INTERSECTS),
+        (POLYGON_POINT_ON_SURFACE, LINE_INTERSECTS),
+    ],
+}
+
+
+class Task:
+    # what precompute_in_mask uses of a QgsTask
+    def isCanceled(self):
+        return False
+
+    def setProgress(self, progress):
+        pass
+
+
+def grid_geometries(geometry_type):
+    # features inside, outside and across the mask edges
+    for x in range(-100, 1200, 130):
+        for y in range(-100, 1200, 130):
+            if geometry_type == "Point":
+                wkt = "Point ({} {})".format(x, y)
+            elif geometry_type == "LineString":
+                wkt = "LineString ({} {}, {} {})".format(x, y, x + 90, y + 40)
+            else:
+                wkt = "Polygon (({0} {1}, {2} {1}, {2} {3}, {0} {3}, {0} {1}))".format(
+                    x, y, x + 90, y + 90
+                )
+            yield QgsGeometry.fromWkt(wkt)
+
+
+def memory_layer(geometry_type):
+    layer = QgsVectorLayer(
+        "{}?crs={}".format(geometry_type, CRS), geometry_type, "memory"
+    )
+    features = []
+    for geometry in grid_geometries(geometry_type):
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(geometry)
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+class PushDownTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        start_app()
+
+    def setUp(self):
+        self.crs = QgsCoordinateReferenceSystem(CRS)
+        self.context = QgsCoordinateTransformContext()
+        self.mask = QgsGeometry.fromWkt(MASK_WKT)
+
+    def client_ids(self, layer, polygon_method, line_method):
+        engine = MaskEngine(self.context)
+        engine.bind(self.mask)
+        ids = {
+            feature.id()
+            for feature in layer.getFeatures()
+            if engine.in_mask(
+                feature.geometry(),
+                layer.crs().postgisSrid(),
+                self.crs,
+                None,
+                polygon_method,
+                line_method,
+            )
+        }
+        # features on both sides of the mask edges
+        self.assertTrue(ids)
+        self.assertLess(len(ids), layer.featureCount())
+        return ids
+
+    def precompute(self, layer, polygon_method, line_method, compiled=None):
+        # (srid, ids) of the layer and the compile checks
+        parameters = MaskParameters()
+        parameters.polygon_mask_method = polygon_method
+        parameters.line_mask_method = line_method
+        job = layer_job(layer, parameters, compiled or {})
+
+        engine = MaskEngine()
+        engine.bind(self.mask)
+        results, checks = precompute_in_mask(
+            Task(),
+            [job],
+            engine,
+            engine.snapshot(),
+            None,
+            self.crs,
+            self.context,
+            polygon_method,
+            line_method,
+        )
+        return results[layer.id()], checks
+
+
+class TestMaskFilter(PushDownTestCase):
+    # the filter sent to PostGIS, evaluated by QGIS
+    def test_filter(self):
+        for geometry_type, methods in METHODS.items():
+            layer = memory_layer(geometry_type)
+            for polygon_method, line_method in methods:
+                with self.subTest(
+                    geometry_type=geometry_type,
+                    polygon_method=polygon_method,
+                    line_method=line_method,
+                ):
+                    template = mask_filter_template(
+                        layer.geometryType(), polygon_method, line_method
+                    )
+                    expression = QgsExpression(
+                        push_down_expression(template, self.mask.asWkt())
+                    )
+                    self.assertFalse(expression.hasParserError())
+                    self.assertLessEqual(
+                        set(expression.referencedFunctions()), POSTGIS_FUNCTIONS
+                    )
+
+                    context = QgsExpressionContext()
+                    selected = set()
+                    for feature in layer.getFeatures():
+                        context.setFeature(feature)
+                        if expression.evaluate(context):
+                            selected.add(feature.id())
+                    self.assertFalse(expression.hasEvalError())
+                    self.assertEqual(
+                        selected, self.client_ids(layer, polygon_method, line_method)
+                    )
+
+    def test_not_pushed_down(self):
+        # memory and GeoPackage layers: their filters aren't compiled
+        with tempfile.TemporaryDirectory() as folder:
+            for geometry_type, methods in METHODS.items():
+                memory = memory_layer(geometry_type)
+                path = str(Path(folder) / "{}.gpkg".format(geometry_type))
+                options = QgsVectorFileWriter.SaveVectorOptions()
+                options.driverName = "GPKG"
+                error = QgsVectorFileWriter.writeAsVectorFormatV2(
+                    memory, path, self.context, options
+                )[0]
+                self.assertEqual(error, QgsVectorFileWriter.NoError)
+                gpkg = QgsVectorLayer(path, geometry_type, "ogr")
+                self.assertTrue(gpkg.isValid())
+
+                for layer in (memory, gpkg):
+                    self.assertFalse(can_push_down(layer))
+                    for polygon_method, line_method in methods:
+                        (srid, ids), checks = self.precompute(
+                            layer, polygon_method, line_method
+                        )
+                        self.assertEqual(srid, layer.crs().postgisSrid())
+                        self.assertEqual(checks, {})
+                        self.assertEqual(
+                            ids, self.client_ids(layer, polygon_method, line_method)
+                        )
+
+
+@unittest.skipUnless(os.environ.get("QGIS_PGTEST_DB"), "no PostGIS test database")
+class TestPostgisPushDown(PushDownTestCase):
+    def postgis_layer(self, geometry_type):
+        connection = os.environ["QGIS_PGTEST_DB"]
+        table = "mask_push_down_{}".format(geometry_type.lower())
+        uri = QgsDataSourceUri(connection)
+        uri.setDataSource("public", table, "geom", "", "id")
+        error, message = QgsVectorLayerExporter.exportLayer(
+            memory_layer(geometry_type),
+            uri.uri(False),
+            "postgres",
+            self.crs,
+            False,
+            {"overwrite": True},
+        )
+        self.assertEqual(error, QgsVectorLayerExporter.NoError, message)
+        self.addCleanup(
+            lambda: QgsProviderRegistry.instance()
+            .providerMetadata("postgres")
+            .createConnection(connection, {})
+            .dropVectorTable("public", table)
+        )
+
+        layer = QgsVectorLayer(uri.uri(False), geometry_type, "postgres")
+        self.assertTrue(layer.isValid())
+        self.assertTrue(can_push_down(layer))
+        return layer
+
+    def test_push_down(self):
+        for geometry_type, methods in METHODS.items():
+            layer = self.postgis_layer(geometry_type)
+            for polygon_method, line_method in methods:
+                with self.subTest(
+                    geometry_type=geometry_type,
+                    polygon_method=polygon_method,
+                    line_method=line_method,
+                ):
+                    expected = self.client_ids(layer, polygon_method, line_method)
+                    (_, ids), checks = self.precompute(
+                        layer, polygon_method, line_method
+                    )
+                    # compiled to SQL, checked once
+                    self.assertEqual(list(checks.values()), [True])
+                    self.assertEqual(ids, expected)
+
+                    (_, ids), checks = self.precompute(
+                        layer, polygon_method, line_method, checks
+                    )
+                    self.assertEqual(checks, {})
+                    self.assertEqual(ids, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
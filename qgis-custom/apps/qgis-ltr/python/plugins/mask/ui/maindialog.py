@@ -151,6 +151,7 @@ class MainDialog(QDialog):
             parameters.line_mask_method
         )
         self.ui.atlasInteraction.setChecked(parameters.do_atlas_interaction)
+        self.ui.layer_list.ui.pushDownCheck.setChecked(parameters.push_down)
 
     def update_parameters_from_ui(self, parameters):
         self.update_parameters_from_style(parameters)
@@ -183,6 +184,7 @@ class MainDialog(QDialog):
             self.ui.layer_list.ui.lineOperatorCombo.currentIndex()
         )
         parameters.do_atlas_interaction = self.ui.atlasInteraction.isChecked()
+        parameters.push_down = self.ui.layer_list.ui.pushDownCheck.isChecked()
 
     def load_defaults(self):
         settings = QSettings()
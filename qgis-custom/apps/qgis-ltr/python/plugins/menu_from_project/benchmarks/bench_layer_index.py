@@ -0,0 +1,143 @@
+#! python3  # noqa: E265
+
+"""
+    Benchmark of the layer lookups done to build menus and load layers.
+
+    For each project size, the plugin reads the project summary, builds the menu
+    with addMenuItem, then looks every layer up the way the menus do: its
+    decoration (tooltip and icon, from the summary) and its maplayer XML (to
+    load it).
+
+    Every size should show a constant time per layer: menu build and layer
+    lookups grow linearly with the number of layers.
+
+    Run it with the QGIS Python interpreter, from the plugins folder:
+
+        python -m menu_from_project.benchmarks.bench_layer_index
+"""
+
+# Standard library
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# PyQGIS
+from qgis.core import QgsApplication, QgsSettings
+from qgis.PyQt.QtWidgets import QMenu
+
+# project
+from menu_from_project.benchmarks.qgis_interface import BenchInterface
+from menu_from_project.benchmarks.synthetic_project import project_xml, write_project
+from menu_from_project.menu_from_project import MenuFromProject
+
+# ############################################################################
+# ########## Functions #############
+# ##################################
+
+
+def bench_size(plugin, folder: Path, layer_count: int) -> dict:
+    """Time summary read, menu build and lookups of every layer for one project \
+    size.
+
+    :param plugin: plugin instance, its caches are cleared first
+    :type plugin: MenuFromProject
+    :param folder: folder where the synthetic project is written
+    :type folder: Path
+    :param layer_count: number of layers
+    :type layer_count: int
+
+    :return: timings, in seconds
+    :rtype: dict
+    """
+    project = str(
+        write_project(
+            folder / "layers_{}.qgs".format(layer_count),
+            project_xml(layer_count, group_count=10, depth=1),
+        )
+    )
+    plugin.summaries = dict()
+    plugin.layerDecorations = dict()
+    plugin.embeddedResolver.clear()
+    plugin.layerFragments.clear()
+
+    start = time.perf_counter()
+    summary = plugin.getProjectSummary(project)
+    summary_time = time.perf_counter() - start
+
+    menu = QMenu()
+    start = time.perf_counter()
+    assert plugin.addMenuItem(project, summary, summary["tree"], menu)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for layer_id in summary["layers"]:
+        plugin.layerDecoration(project, layer_id)
+    decoration_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for layer_id in summary["layers"]:
+        assert plugin.getMapLayerDomFromQgs(project, layer_id) is not None
+    lookup_time = time.perf_counter() - start
+
+    return {
+        "layers": layer_count,
+        "summary": summary_time,
+        "build": build_time,
+        "decorations": decoration_time,
+        "lookups": lookup_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "sizes",
+        nargs="*",
+        type=int,
+        default=[500, 1000, 2000, 4000, 8000],
+        help="numbers of layers to benchmark",
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+
+        # a throw-away profile, so the user settings are left untouched
+        app = QgsApplication([], True, str(folder / "profile"))
+        app.initQgis()
+        QgsSettings().setValue("locale/userLocale", "en_US")
+
+        plugin = MenuFromProject(BenchInterface())
+        plugin.optionTooltip = True
+
+        print(
+            "{:>8} {:>12} {:>10} {:>16} {:>12} {:>16}".format(
+                "layers",
+                "summary (s)",
+                "menu (s)",
+                "decorations (s)",
+                "lookups (s)",
+                "lookups/layer (µs)",
+            )
+        )
+        for size in args.sizes:
+            result = bench_size(plugin, folder, size)
+            print(
+                "{layers:>8} {summary:>12.3f} {build:>10.3f} {decorations:>16.3f} "
+                "{lookups:>12.3f} {per_layer:>16.2f}".format(
+                    per_layer=(result["decorations"] + result["lookups"])
+                    / size
+                    * 1e6,
+                    **result
+                )
+            )
+
+        plugin.unload()
+        app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#! python3  # noqa: E265
+
+"""
+    Benchmark and check of the menu builder on very wide and very deep layer trees.
+
+    - a flat group of 20,000 layers: every layer gets its menu item
+    - groups nested deeper than the Python recursion limit allows for a
+      recursive builder: the deepest layer is reached
+
+    Run it with the QGIS Python interpreter, from the plugins folder:
+
+        python -m menu_from_project.benchmarks.bench_menu_builder
+"""
+
+# Standard library
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# PyQGIS
+from qgis.core import QgsApplication, QgsSettings
+from qgis.PyQt.QtWidgets import QMenu
+
+# project
+from menu_from_project.benchmarks.qgis_interface import BenchInterface
+from menu_from_project.benchmarks.synthetic_project import (
+    deep_project_xml,
+    project_xml,
+    write_project,
+)
+from menu_from_project.logic.qgs_manager import extract_project_summary
+from menu_from_project.menu_from_project import MenuFromProject
+
+# ############################################################################
+# ########## Functions #############
+# ##################################
+
+
+def bench_flat(plugin, folder: Path, layer_count: int) -> dict:
+    """Build the menu of a single group holding layer_count layers."""
+    project = write_project(
+        folder / "flat_{}.qgs".format(layer_count),
+        project_xml(layer_count, group_count=1, depth=1, style_symbols=0),
+    )
+
+    start = time.perf_counter()
+    summary = extract_project_summary(str(project), str(project))
+    extract_time = time.perf_counter() - start
+
+    menu = QMenu()
+    start = time.perf_counter()
+    has_layer = plugin.addMenuItem(str(project), summary, summary["tree"], menu)
+    build_time = time.perf_counter() - start
+
+    group_menu = menu.actions()[0].menu()
+    layer_actions = [a for a in group_menu.actions() if a.text().startswith("Layer ")]
+    assert has_layer, "no layer found"
+    assert len(layer_actions) == layer_count, "{} items for {} layers".format(
+        len(layer_actions), layer_count
+    )
+
+    return {"layers": layer_count, "extract": extract_time, "build": build_time}
+
+
+def bench_deep(plugin, folder: Path, depth: int) -> dict:
+    """Extract the summary and build the menu of depth nested groups."""
+    project = write_project(
+        folder / "deep_{}.qgs".format(depth), deep_project_xml(depth)
+    )
+
+    start = time.perf_counter()
+    summary = extract_project_summary(str(project), str(project))
+    extract_time = time.perf_counter() - start
+
+    root = QMenu()
+    start = time.perf_counter()
+    has_layer = plugin.addMenuItem(str(project), summary, summary["tree"], root)
+    build_time = time.perf_counter() - start
+
+    # sub-menus are owned by their parent: keep the root alive
+    menu = root
+    for _ in range(depth):
+        menu = menu.actions()[0].menu()
+    assert has_layer, "no layer found"
+    assert menu.actions()[0].text() == "Layer 0", "deepest layer not reached"
+
+    return {"depth": depth, "extract": extract_time, "build": build_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--layers", type=int, default=20000, help="flat group size")
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=2 * sys.getrecursionlimit(),
+        help="number of nested groups",
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+
+        # a throw-away profile, so the user settings are left untouched
+        app = QgsApplication([], True, str(folder / "profile"))
+        app.initQgis()
+        QgsSettings().setValue("locale/userLocale", "en_US")
+
+        plugin = MenuFromProject(BenchInterface())
+        plugin.optionTooltip = True
+        plugin.optionLoadAll = True
+
+        flat = bench_flat(plugin, folder, args.layers)
+        print(
+            "flat group of {layers} layers: summary {extract:.3f}s, "
+            "menu {build:.3f}s".format(**flat)
+        )
+        deep = bench_deep(plugin, folder, args.depth)
+        print(
+            "{depth} nested groups: summary {extract:.3f}s, "
+            "menu {build:.3f}s".format(**deep)
+        )
+
+        plugin.unload()
+        app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
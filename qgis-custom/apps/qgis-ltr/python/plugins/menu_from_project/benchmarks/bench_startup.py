@@ -0,0 +1,286 @@
+#! python3  # noqa: E265
+
+"""
+    Benchmark of menu construction and layer loading on synthetic projects.
+
+    For each scenario, a project (and the projects it embeds groups from) is
+    generated, then the plugin runs against a stub interface, offscreen:
+
+    - initMenus, with an empty then a filled menu cache
+    - addMenuItem, then the decoration of its menus when they are shown (icons)
+      and of their layer items when they are hovered (tooltips)
+    - loadLayer of a single layer
+    - "Load all" of the first group, sequential and parallel
+
+    Times are in seconds, peak memory (Python allocations) in bytes. Layer data
+    sources do not exist: loading measures the plugin overhead, not the providers.
+
+    Run it with the QGIS Python interpreter, from the plugins folder:
+
+        python -m menu_from_project.benchmarks.bench_startup --output results.json
+"""
+
+# Standard library
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# PyQGIS
+from qgis.core import Qgis, QgsApplication, QgsProject, QgsSettings
+from qgis.PyQt.QtWidgets import QMenu
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+# project
+from menu_from_project.benchmarks.qgis_interface import BenchInterface
+from menu_from_project.benchmarks.synthetic_project import write_project_set
+from menu_from_project.logic.cache_manager import MenuCache
+from menu_from_project.menu_from_project import MenuFromProject
+
+# ############################################################################
+# ########## Globals ###############
+# ##################################
+
+# (layers, groups per level, group levels, embedded projects)
+DEFAULT_SCENARIOS = [
+    (100, 5, 1, 0),
+    (1000, 10, 2, 0),
+    (1000, 10, 2, 5),
+    (5000, 10, 3, 10),
+]
+
+# ############################################################################
+# ########## Functions #############
+# ##################################
+
+
+def measure(function, *args, **kwargs) -> dict:
+    """Call a function, return its duration and the peak of Python allocations.
+
+    :param function: function to call
+    :type function: callable
+
+    :return: "time" in seconds, "peak_memory" in bytes and "result" of the call
+    :rtype: dict
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        duration = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {"time": duration, "peak_memory": peak, "result": result}
+
+
+def wait_for(condition, timeout: float = 600):
+    """Process events until condition() is false, to wait for background tasks."""
+    start = time.perf_counter()
+    while condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("Background tasks did not finish")
+        QgsApplication.processEvents()
+        time.sleep(0.001)
+
+
+def all_menus(menu: QMenu) -> list:
+    """Return a menu and all its submenus."""
+    menus = []
+    stack = [menu]
+    while stack:
+        current = stack.pop()
+        menus.append(current)
+        stack.extend(
+            action.menu()
+            for action in current.actions()
+            if action.menu() is not None
+        )
+
+    return menus
+
+
+def first_group(nodes: list) -> dict:
+    """Return the first group of a menu tree, holding layers."""
+    for node in nodes:
+        if node["type"] == "group":
+            if any(child["type"] == "layer" for child in node["children"]):
+                return node
+            group = first_group(node["children"])
+            if group:
+                return group
+
+    return None
+
+
+def bench_scenario(plugin, folder: Path, scenario: tuple, suffix: str) -> dict:
+    """Run every measure on one synthetic project.
+
+    :param plugin: plugin instance, bound to the stub interface
+    :type plugin: MenuFromProject
+    :param folder: folder where the synthetic projects are written
+    :type folder: Path
+    :param scenario: (layers, groups per level, group levels, embedded projects)
+    :type scenario: tuple
+    :param suffix: project file extension
+    :type suffix: str
+
+    :return: measures of the scenario
+    :rtype: dict
+    """
+    layer_count, group_count, depth, embedded_count = scenario
+    project = write_project_set(
+        folder / "{}_{}_{}_{}".format(*scenario),
+        layer_count,
+        group_count=group_count,
+        depth=depth,
+        embedded_count=embedded_count,
+        suffix=suffix,
+    )
+    uri = str(project)
+    plugin.menu_cache = MenuCache(folder / "cache_{}_{}_{}_{}".format(*scenario))
+    plugin.projects = [
+        {"file": uri, "name": "Benchmark", "location": "new", "type_storage": "file"}
+    ]
+
+    def init_menus():
+        plugin.initMenus()
+        wait_for(lambda: plugin.projectTasks or plugin.pendingProjects)
+
+    results = {
+        "layers": layer_count,
+        "groups": group_count,
+        "depth": depth,
+        "embedded_projects": embedded_count,
+        "format": suffix,
+        "file_size": project.stat().st_size,
+    }
+    for name in ("init_menus_cold", "init_menus_warm"):
+        results[name] = measure(init_menus)
+
+    summary = plugin.getProjectSummary(uri)
+    plugin.optionTooltip = True
+    menu = QMenu()
+    results["add_menu_item"] = measure(
+        plugin.addMenuItem, uri, summary, summary["tree"], menu
+    )
+    menus = all_menus(menu)
+
+    # every menu shown, then every layer item hovered, decorations not cached
+    def decorate_menus():
+        for submenu in menus:
+            plugin.decorateMenu(submenu)
+
+    def tooltips():
+        for submenu in menus:
+            for action in submenu.actions():
+                plugin.onMenuHovered(action)
+
+    plugin.layerDecorations = dict()
+    results["decorate_menus"] = measure(decorate_menus)
+    plugin.layerDecorations = dict()
+    results["tooltips"] = measure(tooltips)
+
+    layer_id = next(iter(summary["layers"]))
+    results["load_layer"] = measure(plugin.loadLayer, uri, uri, layer_id, QMenu())
+    QgsProject.instance().removeAllMapLayers()
+
+    group = first_group(summary["tree"])
+    if group is not None:
+        results["load_all_layer_count"] = len(
+            [child for child in group["children"] if child["type"] == "layer"]
+        )
+        for parallel in (False, True):
+            plugin.optionParallelLoad = parallel
+
+            def load_all():
+                plugin.loadAllLayers(uri, summary, group, QMenu())
+                wait_for(lambda: plugin.layerTasks)
+
+            results["load_all_parallel" if parallel else "load_all"] = measure(
+                load_all
+            )
+            QgsProject.instance().removeAllMapLayers()
+
+    for measures in results.values():
+        if isinstance(measures, dict):
+            measures.pop("result")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        nargs=4,
+        type=int,
+        metavar=("LAYERS", "GROUPS", "DEPTH", "EMBEDDED"),
+        help="project to benchmark, can be repeated",
+    )
+    parser.add_argument(
+        "--format", choices=(".qgs", ".qgz"), default=".qgs", help="project format"
+    )
+    parser.add_argument("--output", type=Path, help="JSON file to write results to")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+
+        # a throw-away profile, so the user settings are left untouched
+        app = QgsApplication([], True, str(folder / "profile"))
+        app.initQgis()
+        QgsSettings().setValue("locale/userLocale", "en_US")
+
+        iface = BenchInterface()
+        plugin = MenuFromProject(iface)
+
+        results = []
+        for scenario in args.scenario or DEFAULT_SCENARIOS:
+            result = bench_scenario(plugin, folder, tuple(scenario), args.format)
+            results.append(result)
+            print(
+                "{layers:>6} layers {groups:>3}x{depth} groups {embedded_projects:>3} "
+                "embedded: init {cold:.3f}s (cached {warm:.3f}s), "
+                "menu {menu:.3f}s (shown {shown:.3f}s), load all {load_all:.3f}s".format(
+                    cold=result["init_menus_cold"]["time"],
+                    warm=result["init_menus_warm"]["time"],
+                    menu=result["add_menu_item"]["time"],
+                    shown=result["decorate_menus"]["time"],
+                    load_all=result.get("load_all", {}).get("time", 0),
+                    **result
+                )
+            )
+
+        plugin.unload()
+        app.exitQgis()
+
+    report = {
+        "qgis_version": Qgis.QGIS_VERSION,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if resource
+        else None,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#! python3  # noqa: E265
+
+"""
+    Minimal QGIS interface, to run the plugin without the QGIS desktop.
+
+    Only what the plugin uses to build its menus and load layers is provided, see
+    coordinator/test/qgis_interface.py for a more complete stub.
+"""
+
+# PyQGIS
+from qgis.gui import QgsLayerTreeMapCanvasBridge, QgsMapCanvas
+from qgis.core import QgsProject
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+from qgis.PyQt.QtWidgets import QMainWindow
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class BenchInterface(QObject):
+    """Stub of QgisInterface: a main window with the menus the plugin fills, and a
+    map canvas bound to the project layer tree."""
+
+    initializationCompleted = pyqtSignal()
+
+    def __init__(self):
+        QObject.__init__(self)
+        self._mainWindow = QMainWindow()
+        menuBar = self._mainWindow.menuBar()
+        self._editMenu = menuBar.addMenu("&Edit")
+        self._layerMenu = menuBar.addMenu("&Layer")
+        self._addLayerMenu = self._layerMenu.addMenu("Add Layer")
+        menuBar.addMenu("&Help")
+
+        self._canvas = QgsMapCanvas(self._mainWindow)
+        self._bridge = QgsLayerTreeMapCanvasBridge(
+            QgsProject.instance().layerTreeRoot(), self._canvas
+        )
+
+    def mainWindow(self):
+        return self._mainWindow
+
+    def mapCanvas(self):
+        return self._canvas
+
+    def editMenu(self):
+        return self._editMenu
+
+    def addLayerMenu(self):
+        return self._addLayerMenu
+
+    def addPluginToMenu(self, name, action):
+        pass
+
+    def removePluginMenu(self, name, action):
+        pass
@@ -0,0 +1,260 @@
+#! python3  # noqa: E265
+
+"""
+    Generate synthetic QGIS projects, to measure how the plugin scales.
+"""
+
+# Standard library
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+
+# ############################################################################
+# ########## Globals ###############
+# ##################################
+
+GEOMETRY_TYPES = ("Point", "Line", "Polygon")
+
+# ############################################################################
+# ########## Functions #############
+# ##################################
+
+
+def _layer_id(index: int) -> str:
+    return "layer_{:06d}".format(index)
+
+
+def _maplayer_xml(index: int, style_symbols: int) -> str:
+    """Return a maplayer element, with a renderer of the given number of symbols
+    to mimic the size of real projects."""
+    symbols = "".join(
+        '<symbol name="{0}" type="marker"><layer class="SimpleMarker">'
+        '<prop k="color" v="255,0,0,255"/><prop k="size" v="2"/></layer>'
+        "</symbol>".format(i)
+        for i in range(style_symbols)
+    )
+    return (
+        '<maplayer type="vector" geometry="{geometry}">'
+        "<id>{layer_id}</id>"
+        "<datasource>./data/layer_{index}.gpkg|layername=layer_{index}</datasource>"
+        "<title>Layer {index}</title>"
+        "<abstract>Synthetic layer {index}\nfor benchmarks</abstract>"
+        '<provider encoding="UTF-8">ogr</provider>'
+        '<renderer-v2 type="singleSymbol"><symbols>{symbols}</symbols></renderer-v2>'
+        "</maplayer>"
+    ).format(
+        geometry=GEOMETRY_TYPES[index % len(GEOMETRY_TYPES)],
+        layer_id=_layer_id(index),
+        index=index,
+        symbols=symbols,
+    )
+
+
+def _tree_layer_xml(index: int) -> str:
+    return (
+        '<layer-tree-layer name="Layer {0}" id="{1}" checked="Qt::Checked" '
+        'expanded="0"><customproperties/></layer-tree-layer>'
+    ).format(index, _layer_id(index))
+
+
+def _tree_xml(layer_indexes: list, group_count: int, depth: int, prefix: str) -> str:
+    """Spread layers among group_count groups, nested depth levels deep."""
+    if depth <= 0 or group_count <= 0 or not layer_indexes:
+        return "".join(_tree_layer_xml(i) for i in layer_indexes)
+
+    xml = []
+    chunk = -(-len(layer_indexes) // group_count)
+    for group in range(group_count):
+        name = "{}{}".format(prefix, group)
+        xml.append(
+            '<layer-tree-group name={} checked="Qt::Checked" expanded="0">'
+            "<customproperties/>{}</layer-tree-group>".format(
+                quoteattr("Group " + name),
+                _tree_xml(
+                    layer_indexes[group * chunk : (group + 1) * chunk],
+                    group_count,
+                    depth - 1,
+                    name + ".",
+                ),
+            )
+        )
+
+    return "".join(xml)
+
+
+def _embedded_group_xml(name: str, project: str) -> str:
+    return (
+        '<layer-tree-group name={} checked="Qt::Checked" expanded="0">'
+        '<customproperties><property key="embedded" value="1"/>'
+        '<property key="embedded_project" value={}/></customproperties>'
+        "</layer-tree-group>"
+    ).format(quoteattr(name), quoteattr(project))
+
+
+def project_xml(
+    layer_count: int,
+    group_count: int = 0,
+    depth: int = 1,
+    style_symbols: int = 10,
+    title: str = "Synthetic project",
+    embedded_groups: list = None,
+) -> str:
+    """Return the XML of a synthetic QGIS project.
+
+    :param layer_count: number of layers
+    :type layer_count: int
+    :param group_count: number of groups per level, 0 for a flat layer tree
+    :type group_count: int
+    :param depth: number of nested group levels
+    :type depth: int
+    :param style_symbols: number of symbols in each layer renderer
+    :type style_symbols: int
+    :param title: project title
+    :type title: str
+    :param embedded_groups: (group name, relative project path) of the groups \
+    embedded from other projects, added after the project groups
+    :type embedded_groups: list
+
+    :return: project XML
+    :rtype: str
+    """
+    layer_indexes = list(range(layer_count))
+    return _document_xml(
+        title,
+        _tree_xml(layer_indexes, group_count, depth, "")
+        + "".join(
+            _embedded_group_xml(name, project)
+            for name, project in (embedded_groups or [])
+        ),
+        "".join(_maplayer_xml(i, style_symbols) for i in layer_indexes),
+    )
+
+
+def deep_project_xml(depth: int, title: str = "Deep project") -> str:
+    """Return the XML of a synthetic QGIS project with a single layer, nested in \
+    depth groups.
+
+    It is built without recursion, so depth can exceed the recursion limit.
+
+    :param depth: number of nested groups
+    :type depth: int
+    :param title: project title
+    :type title: str
+
+    :return: project XML
+    :rtype: str
+    """
+    return _document_xml(
+        title,
+        "".join(
+            '<layer-tree-group name="Level {}" checked="Qt::Checked" expanded="0">'
+            "<customproperties/>".format(level)
+            for level in range(depth)
+        )
+        + _tree_layer_xml(0)
+        + "</layer-tree-group>" * depth,
+        _maplayer_xml(0, 0),
+    )
+
+
+def _document_xml(title: str, tree: str, layers: str) -> str:
+    return (
+        "<!DOCTYPE qgis PUBLIC 'http://mrcc.com/qgis.dtd' 'SYSTEM'>\n"
+        '<qgis projectname="" version="3.16.0-Hannover">'
+        "<title>{title}</title>"
+        "<layer-tree-group><customproperties/>{tree}</layer-tree-group>"
+        "<projectlayers>{layers}</projectlayers>"
+        "<layouts/>"
+        '<properties><Paths><Absolute type="bool">false</Absolute></Paths>'
+        "</properties>"
+        '<trust active="0"/>'
+        "</qgis>\n"
+    ).format(title=title, tree=tree, layers=layers)
+
+
+def write_project(path: Path, xml: str) -> Path:
+    """Write a project XML as a .qgs file, or zipped if path ends with .qgz.
+
+    :param path: project filepath
+    :type path: Path
+    :param xml: project XML
+    :type xml: str
+
+    :return: project filepath
+    :rtype: Path
+    """
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    if path.suffix == ".qgz":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+            zip_ref.writestr(path.stem + ".qgs", xml)
+    else:
+        path.write_text(xml, encoding="utf-8")
+
+    return path
+
+
+def write_project_set(
+    folder: Path,
+    layer_count: int,
+    group_count: int = 0,
+    depth: int = 1,
+    embedded_count: int = 0,
+    embedded_layer_count: int = 10,
+    style_symbols: int = 10,
+    suffix: str = ".qgs",
+) -> Path:
+    """Write a synthetic project and the projects its groups are embedded from.
+
+    Each embedded project holds one group of embedded_layer_count layers, which \
+    the main project embeds.
+
+    :param folder: folder where the projects are written
+    :type folder: Path
+    :param layer_count: number of layers of the main project
+    :type layer_count: int
+    :param group_count: number of groups per level, 0 for a flat layer tree
+    :type group_count: int
+    :param depth: number of nested group levels
+    :type depth: int
+    :param embedded_count: number of embedded projects
+    :type embedded_count: int
+    :param embedded_layer_count: number of layers of each embedded project
+    :type embedded_layer_count: int
+    :param style_symbols: number of symbols in each layer renderer
+    :type style_symbols: int
+    :param suffix: ".qgs" or ".qgz"
+    :type suffix: str
+
+    :return: main project filepath
+    :rtype: Path
+    """
+    folder = Path(folder)
+    embedded_groups = []
+    for index in range(embedded_count):
+        name = "embedded_{}{}".format(index, suffix)
+        write_project(
+            folder / name,
+            project_xml(
+                embedded_layer_count,
+                group_count=1,
+                depth=1,
+                style_symbols=style_symbols,
+                title="Embedded project {}".format(index),
+            ),
+        )
+        embedded_groups.append(("Group 0", "./" + name))
+
+    return write_project(
+        folder
+        / "project_{}_{}_{}_{}{}".format(
+            layer_count, group_count, depth, embedded_count, suffix
+        ),
+        project_xml(
+            layer_count,
+            group_count=group_count,
+            depth=depth,
+            style_symbols=style_symbols,
+            embedded_groups=embedded_groups,
+        ),
+    )
@@ -0,0 +1,286 @@
+#! python3  # noqa: E265
+
+"""
+    Persistent cache of the menus extracted from QGIS projects.
+"""
+
+# Standard library
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+# ############################################################################
+# ########## Globals ###############
+# ##################################
+
+logger = logging.getLogger(__name__)
+
+# bump it when the structure of the project summary changes
+CACHE_VERSION = 3
+
+# ############################################################################
+# ########## Functions #############
+# ##################################
+
+
+def project_fingerprint(local_path: str, type_storage: str) -> str:
+    """Return a fingerprint of a project, which changes when the project changes.
+
+    Files are identified by their path, modification time and size. Projects \
+    downloaded from a database or a web server are identified by a hash of their \
+    content.
+
+    :param local_path: path to the project (or its local copy)
+    :type local_path: str
+    :param type_storage: project storage type: "database", "file" or "http"
+    :type type_storage: str
+
+    :return: fingerprint
+    :rtype: str
+    """
+    if type_storage == "file":
+        stat = os.stat(local_path)
+        return "{}:{}:{}".format(local_path, stat.st_mtime_ns, stat.st_size)
+
+    content_hash = hashlib.sha256()
+    with open(local_path, "rb") as project_file:
+        for chunk in iter(lambda: project_file.read(1024 * 1024), b""):
+            content_hash.update(chunk)
+
+    return "sha256:{}".format(content_hash.hexdigest())
+
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class MenuCache:
+    """Store the project summaries on disk, one JSON file per project URI.
+
+    The maplayer XML of the projects, ready to be loaded, is stored beside them.
+    """
+
+    def __init__(self, cache_folder: Path):
+        self.folder = cache_folder / "menus"
+        self.folder.mkdir(exist_ok=True, parents=True)
+        self.layers_folder = cache_folder / "layers"
+        self.layers_folder.mkdir(exist_ok=True, parents=True)
+
+    def path(self, uri: str, folder: Path = None) -> Path:
+        """Return the cache file of a project.
+
+        :param uri: project URI
+        :type uri: str
+        :param folder: cache folder, defaults to the summaries one
+        :type folder: Path
+
+        :return: cache filepath
+        :rtype: Path
+        """
+        return (folder or self.folder) / "{}.json".format(
+            hashlib.sha1(uri.encode("utf-8")).hexdigest()
+        )
+
+    def get(self, uri: str, fingerprint: str) -> dict:
+        """Return the cached summary of a project if it is still up to date.
+
+        :param uri: project URI
+        :type uri: str
+        :param fingerprint: current project fingerprint
+        :type fingerprint: str
+
+        :return: project summary or None if missing or stale
+        :rtype: dict
+        """
+        try:
+            with self.path(uri).open("r", encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+        if (
+            entry.get("version") != CACHE_VERSION
+            or entry.get("uri") != uri
+            or entry.get("fingerprint") != fingerprint
+        ):
+            return None
+
+        return entry.get("summary")
+
+    def last(self, uri: str) -> dict:
+        """Return the last stored summary of a project, even if it is stale. \
+        It is the menu snapshot used when the project can't be reached.
+
+        :param uri: project URI
+        :type uri: str
+
+        :return: project summary or None if missing
+        :rtype: dict
+        """
+        try:
+            with self.path(uri).open("r", encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("version") != CACHE_VERSION or entry.get("uri") != uri:
+            return None
+
+        return entry.get("summary")
+
+    def put(self, uri: str, fingerprint: str, summary: dict):
+        """Store the summary of a project.
+
+        :param uri: project URI
+        :type uri: str
+        :param fingerprint: project fingerprint
+        :type fingerprint: str
+        :param summary: project summary
+        :type summary: dict
+        """
+        self._write(
+            self.path(uri),
+            {
+                "version": CACHE_VERSION,
+                "uri": uri,
+                "fingerprint": fingerprint,
+                "summary": summary,
+            },
+        )
+
+    def get_layers(self, uri: str, fingerprint: str) -> dict:
+        """Return the stored maplayer XML of a project, if it is still up to date.
+
+        :param uri: project URI
+        :type uri: str
+        :param fingerprint: project fingerprint the menu was built from
+        :type fingerprint: str
+
+        :return: maplayer XML by layer id, None if missing or stale
+        :rtype: dict
+        """
+        try:
+            with self.path(uri, self.layers_folder).open(
+                "r", encoding="utf-8"
+            ) as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+        if (
+            entry.get("version") != CACHE_VERSION
+            or entry.get("uri") != uri
+            or entry.get("fingerprint") != fingerprint
+        ):
+            return None
+
+        return entry.get("layers")
+
+    def put_layers(self, uri: str, fingerprint: str, fragments: dict):
+        """Store the maplayer XML of a project.
+
+        :param uri: project URI
+        :type uri: str
+        :param fingerprint: project fingerprint
+        :type fingerprint: str
+        :param fragments: maplayer XML by layer id
+        :type fragments: dict
+        """
+        self._write(
+            self.path(uri, self.layers_folder),
+            {
+                "version": CACHE_VERSION,
+                "uri": uri,
+                "fingerprint": fingerprint,
+                "layers": fragments,
+            },
+        )
+
+    @staticmethod
+    def _write(path: Path, entry: dict):
+        # projects are read in parallel tasks: write to a unique temporary file
+        # then swap it, so a cache file is never read half-written
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=str(path.parent))
+            with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+                json.dump(entry, cache_file)
+            os.replace(tmp_path, path)
+        except (OSError, RecursionError) as err:
+            # RecursionError: layer tree too deep for the JSON encoder, the
+            # project is parsed each time
+            logger.error("Cache can't be written for {}: {}".format(entry["uri"], err))
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class LayerFragmentCache:
+    """Keep the maplayer XML fragments of the projects in memory, within a budget.
+
+    Fragments are stored by project URI. When the budget is exceeded, the least \
+    recently used projects are evicted: they are read again on next use.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._projects = OrderedDict()
+
+    def clear(self):
+        """Forget every project."""
+        self._projects.clear()
+        self.size = 0
+
+    def remove(self, uri: str):
+        """Forget a project, if it is in memory.
+
+        :param uri: project URI
+        :type uri: str
+        """
+        fragments = self._projects.pop(uri, None)
+        if fragments is not None:
+            self.size -= self._fragments_size(fragments)
+
+    def get(self, uri: str) -> dict:
+        """Return the fragments of a project.
+
+        :param uri: project URI
+        :type uri: str
+
+        :return: maplayer XML by layer id, None if the project is not in memory
+        :rtype: dict
+        """
+        fragments = self._projects.get(uri)
+        if fragments is not None:
+            self._projects.move_to_end(uri)
+
+        return fragments
+
+    def put(self, uri: str, fragments: dict):
+        """Store the fragments of a project, evicting older projects if needed. \
+        The last stored project is always kept, even if it exceeds the budget.
+
+        :param uri: project URI
+        :type uri: str
+        :param fragments: maplayer XML by layer id
+        :type fragments: dict
+        """
+        if uri in self._projects:
+            self.size -= self._fragments_size(self._projects.pop(uri))
+
+        self._projects[uri] = fragments
+        self.size += self._fragments_size(fragments)
+
+        while self.size > self.max_bytes and len(self._projects) > 1:
+            evicted_uri, evicted = self._projects.popitem(last=False)
+            self.size -= self._fragments_size(evicted)
+            logger.debug("Layers of {} evicted from memory".format(evicted_uri))
+
+    @staticmethod
+    def _fragments_size(fragments: dict) -> int:
+        return sum(len(fragment) for fragment in fragments.values())
@@ -2,6 +2,7 @@
 
 # Standard library
 from collections import namedtuple
+from dataclasses import dataclass, field
 
 # Constants
 REGISTERED_PROJECT = namedtuple(
@@ -11,3 +12,19 @@ REGISTERED_PROJECT = namedtuple(
 TABLE_COLUMNS_ORDER = namedtuple(
     "ColumnsIndex", ["edit", "name", "type_menu_location", "type_storage", "uri"]
 )
+
+
+@dataclass
+class LayerBatch:
+    """Layers of a "Load all" created by parallel tasks, added to the project
+    together once the last task is finished."""
+
+    # group name and load start (time.perf_counter), for the timing report
+    name: str
+    started: float
+    # running tasks, by index in the batch
+    tasks: dict = field(default_factory=dict)
+    # number of tasks not finished yet
+    pending: int = 0
+    # tuples (index, layer or None, error message or None), see buildLayers
+    results: list = field(default_factory=list)
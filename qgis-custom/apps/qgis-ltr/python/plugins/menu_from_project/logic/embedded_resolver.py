@@ -0,0 +1,186 @@
+#! python3  # noqa: E265
+
+"""
+    Resolve the groups and layers that projects embed from other projects.
+"""
+
+# Standard library
+import logging
+
+# ############################################################################
+# ########## Globals ###############
+# ##################################
+
+logger = logging.getLogger(__name__)
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class EmbeddedResolver:
+    """Index the embedded projects by group name and layer id, once per version \
+    of each project, and share the indexes between all the projects embedding them.
+
+    Projects which can't be read, missing groups or layers and embedding cycles \
+    are reported once, until ``clear``.
+    """
+
+    def __init__(self, read_summary, report):
+        """
+        :param read_summary: function returning the summary of a project from \
+        its URI, see extract_project_summary
+        :type read_summary: callable
+        :param report: function called with the message of each problem
+        :type report: callable
+        """
+        self.read_summary = read_summary
+        self.report = report
+        self._indexes = dict()
+        self._failures = dict()
+        self._reported = set()
+
+    def clear(self, uris: set = None):
+        """Forget the indexes and the reported problems.
+
+        :param uris: only forget these projects, e.g. the ones which changed
+        :type uris: set
+        """
+        if uris is None:
+            self._indexes = dict()
+            self._failures = dict()
+            self._reported = set()
+            return
+
+        for uri in uris:
+            self._indexes.pop(uri, None)
+            self._failures.pop(uri, None)
+        self._reported = {key for key in self._reported if key[1] not in uris}
+
+    def fail(self, uri: str, error: str):
+        """Record that a project can't be read, so it is not read again.
+
+        :param uri: project URI
+        :type uri: str
+        :param error: why it can't be read
+        :type error: str
+        """
+        self._failures[uri] = error
+        self._indexes.pop(uri, None)
+        self.report_once(
+            ("project", uri), "Embedded project {} can't be read: {}".format(uri, error)
+        )
+
+    def report_once(self, key: tuple, message: str):
+        """Report a problem, unless it already has been.
+
+        :param key: identifies the problem, its second item is the project URI
+        :type key: tuple
+        :param message: problem description
+        :type message: str
+        """
+        if key not in self._reported:
+            self._reported.add(key)
+            self.report(message)
+
+    def report_cycle(self, uri: str, name: str):
+        """Report a group embedded (maybe indirectly) in itself.
+
+        :param uri: URI of the project holding the group
+        :type uri: str
+        :param name: group name
+        :type name: str
+        """
+        self.report_once(
+            ("cycle", uri, name),
+            "Group {} of project {} is embedded in itself".format(name, uri),
+        )
+
+    def index(self, uri: str) -> dict:
+        """Return the index of a project.
+
+        :param uri: project URI
+        :type uri: str
+
+        :return: ``summary``, ``groups`` (first group node in document order, by \
+        name) and ``layers`` (layer summary by id), None if it can't be read
+        :rtype: dict
+        """
+        if uri in self._failures:
+            return None
+
+        try:
+            summary = self.read_summary(uri)
+        except Exception as err:
+            self.fail(uri, str(err))
+            return None
+
+        fingerprint = summary.get("fingerprint", summary["uri"])
+        index = self._indexes.get(uri)
+        if index is None or index["fingerprint"] != fingerprint:
+            groups = dict()
+            stack = list(reversed(summary["tree"]))
+            while stack:
+                node = stack.pop()
+                if node["type"] != "layer":
+                    groups.setdefault(node["name"], node)
+                stack.extend(reversed(node.get("children", [])))
+
+            index = {
+                "fingerprint": fingerprint,
+                "summary": summary,
+                "groups": groups,
+                "layers": summary["layers"],
+            }
+            self._indexes[uri] = index
+
+        return index
+
+    def group(self, uri: str, name: str) -> tuple:
+        """Return an embedded group.
+
+        :param uri: URI of the project holding the group
+        :type uri: str
+        :param name: group name
+        :type name: str
+
+        :return: project summary and group node, (None, None) if not found
+        :rtype: tuple
+        """
+        index = self.index(uri)
+        if index is None:
+            return None, None
+
+        node = index["groups"].get(name)
+        if node is None:
+            self.report_once(
+                ("group", uri, name),
+                "Group {} not found in project {}".format(name, uri),
+            )
+            return None, None
+
+        return index["summary"], node
+
+    def layer(self, uri: str, layer_id: str) -> dict:
+        """Return the summary of an embedded layer.
+
+        :param uri: URI of the project holding the layer
+        :type uri: str
+        :param layer_id: layer id
+        :type layer_id: str
+
+        :return: layer summary, None if not found
+        :rtype: dict
+        """
+        index = self.index(uri)
+        if index is None:
+            return None
+
+        layer_summary = index["layers"].get(layer_id)
+        if layer_summary is None:
+            self.report_once(
+                ("layer", uri, layer_id),
+                "Layer {} not found in project {}".format(layer_id, uri),
+            )
+
+        return layer_summary
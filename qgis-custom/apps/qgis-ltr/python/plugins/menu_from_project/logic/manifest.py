@@ -0,0 +1,218 @@
+#! python3  # noqa: E265
+
+"""
+    Menu manifest: the summaries of a set of projects, built once on the server
+    side so clients don't have to parse the projects to build their menus.
+
+    Build it with the QGIS Python interpreter, from the plugins folder:
+
+        python -m menu_from_project.logic.manifest -o manifest.json project.qgz ...
+
+    Projects are referenced by their URI, the ones configured in the plugin must
+    be the same (e.g. same share path) to be read from the manifest.
+"""
+
+# Standard library
+import argparse
+import copy
+import gzip
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+# PyQGIS
+from qgis.core import QgsApplication
+
+# project
+from .cache_manager import project_fingerprint
+from .qgs_manager import (
+    download_from_database,
+    download_from_http,
+    extract_project_summary,
+    get_embedded_projects,
+    resolve_layer_datasource,
+)
+from .tools import guess_type_from_uri
+
+# ############################################################################
+# ########## Globals ###############
+# ##################################
+
+logger = logging.getLogger(__name__)
+
+# bump it when the structure of the manifest (or of the summaries) changes
+MANIFEST_VERSION = 2
+
+# ############################################################################
+# ########## Functions #############
+# ##################################
+
+
+def resolve_summary_datasources(summary: dict) -> dict:
+    """Return a copy of a project summary, relative layer datasources resolved \
+    against the project path.
+
+    :param summary: project summary, see extract_project_summary
+    :type summary: dict
+
+    :return: project summary
+    :rtype: dict
+    """
+    summary = copy.deepcopy(summary)
+    for layer_summary in summary["layers"].values():
+        layer_summary["datasource"] = resolve_layer_datasource(
+            layer_summary["datasource"],
+            layer_summary["provider"],
+            summary["absolute"],
+            summary["uri"],
+        )
+
+    return summary
+
+
+def read_project_summaries(uri: str, cache_folder: Path) -> dict:
+    """Read the summary of a project and of the projects it embeds.
+
+    Each summary holds the ``fingerprint`` of the project it was read from, so \
+    clients can reuse the layers XML they stored from the same version.
+
+    :param uri: project URI
+    :type uri: str
+    :param cache_folder: folder where remote projects are downloaded
+    :type cache_folder: Path
+
+    :return: project summaries, by URI
+    :rtype: dict
+    """
+    summaries = dict()
+    to_read = [uri]
+    while to_read:
+        current = to_read.pop()
+        if current in summaries:
+            continue
+
+        storage_type = guess_type_from_uri(current)
+        if storage_type == "database":
+            local_path = str(
+                download_from_database(
+                    current, QgsApplication.projectStorageRegistry(), cache_folder
+                )
+            )
+        elif storage_type == "http":
+            local_path = str(download_from_http(current, cache_folder))
+        else:
+            local_path = current
+
+        summary = extract_project_summary(
+            local_path, current, current if storage_type == "file" else None
+        )
+        summary["fingerprint"] = project_fingerprint(local_path, storage_type)
+        summaries[current] = resolve_summary_datasources(summary)
+        to_read.extend(get_embedded_projects(summaries[current]["tree"]))
+
+    return summaries
+
+
+def build_manifest(uris: list, cache_folder: Path) -> dict:
+    """Build the manifest of a list of projects.
+
+    A project which can't be read is left out of the manifest: clients read it \
+    themselves.
+
+    :param uris: project URIs
+    :type uris: list
+    :param cache_folder: folder where remote projects are downloaded
+    :type cache_folder: Path
+
+    :return: manifest
+    :rtype: dict
+    """
+    projects = dict()
+    for uri in uris:
+        try:
+            for current, summary in read_project_summaries(uri, cache_folder).items():
+                projects.setdefault(current, summary)
+        except Exception as err:
+            logger.error("Project {} not added to the manifest: {}".format(uri, err))
+
+    return {
+        "version": MANIFEST_VERSION,
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "projects": projects,
+    }
+
+
+def write_manifest(manifest: dict, path: Path):
+    """Write a manifest as compact JSON, gzipped if path ends with .gz.
+
+    The file is replaced atomically, so clients never read it half-written.
+
+    :param manifest: manifest
+    :type manifest: dict
+    :param path: manifest filepath
+    :type path: Path
+    """
+    path = Path(path)
+    content = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+    if path.suffix == ".gz":
+        content = gzip.compress(content)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=str(path.parent))
+    with os.fdopen(fd, "wb") as manifest_file:
+        manifest_file.write(content)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path: Path) -> dict:
+    """Read a manifest.
+
+    :param path: manifest filepath, gzipped if it ends with .gz
+    :type path: Path
+
+    :raises ValueError: if the manifest version is not supported
+
+    :return: project summaries, by URI
+    :rtype: dict
+    """
+    path = Path(path)
+    content = path.read_bytes()
+    if path.suffix == ".gz":
+        content = gzip.decompress(content)
+
+    manifest = json.loads(content.decode("utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(
+            "Manifest version {} not supported (expected {})".format(
+                manifest.get("version"), MANIFEST_VERSION
+            )
+        )
+
+    return manifest["projects"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("uris", nargs="+", help="project URIs")
+    parser.add_argument(
+        "-o", "--output", type=Path, required=True, help="manifest filepath"
+    )
+    args = parser.parse_args()
+
+    app = QgsApplication([], False)
+    app.initQgis()
+
+    with tempfile.TemporaryDirectory() as cache_folder:
+        manifest = build_manifest(args.uris, Path(cache_folder))
+    write_manifest(manifest, args.output)
+    print(
+        "{} projects written to {}".format(len(manifest["projects"]), args.output)
+    )
+
+    app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,27 +5,21 @@
 """
 
 # Standard library
+import hashlib
+import json
 import logging
 import os
+import tempfile
 import zipfile
-from functools import lru_cache
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Tuple
 from urllib.parse import urlparse
+from xml.etree import ElementTree
 
 # PyQGIS
-from qgis.core import QgsFileDownloader, QgsReadWriteContext
-from qgis.PyQt import QtXml
-from qgis.PyQt.QtCore import (
-    QDir,
-    QEventLoop,
-    QFile,
-    QFileInfo,
-    QIODevice,
-    QTemporaryDir,
-    QTemporaryFile,
-    QUrl,
-)
+from qgis.core import QgsNetworkAccessManager, QgsReadWriteContext
+from qgis.PyQt.QtCore import QFile, QFileInfo, QIODevice, QUrl
+from qgis.PyQt.QtNetwork import QNetworkReply, QNetworkRequest
 
 # ############################################################################
 # ########## Globals ###############
@@ -39,138 +33,625 @@ logger = logging.getLogger(__name__)
 # ##################################
 
 
-def is_absolute(doc: QtXml.QDomDocument) -> bool:
-    """Return true if the given XML document is using absolute path.
+@contextmanager
+def open_project_xml(local_path: str):
+    """Open the XML content of a local QGIS project (.qgs and .qgz) as a binary \
+    stream. Zipped projects are read straight from the archive, nothing is \
+    extracted on disk.
 
-    :param doc: The QGIS project as XML document.
-    :type doc: QDomDocument
+    :param local_path: path to the project (or its local copy)
+    :type local_path: str
+
+    :return: a tuple with the binary stream and the path of the .qgs file (inside \
+    the archive folder for zipped projects).
+    :rtype: Tuple[BinaryIO, str]
     """
-    absolute = False
+    if zipfile.is_zipfile(local_path):
+        with zipfile.ZipFile(local_path, "r") as zip_ref:
+            project_filename = sorted(
+                name
+                for name in zip_ref.namelist()
+                if name.endswith(".qgs") and "/" not in name
+            )[0]
+            with zip_ref.open(project_filename) as xml_file:
+                yield xml_file, os.path.join(
+                    os.path.dirname(local_path), project_filename
+                )
+    else:
+        with open(local_path, "rb") as xml_file:
+            yield xml_file, local_path
+
+
+def download_from_database(
+    uri: str, project_registry, cache_folder: Path, last_modified: str = None
+) -> Path:
+    """Download a QGIS project stored into a (PostgreSQL) database as a local zip.
+
+    When the last modification time of the project is given and matches the one \
+    of the local copy, the project is not downloaded again. The project is \
+    downloaded into a temporary file which replaces the local copy only once \
+    complete: when the download fails, the previous local copy is used.
+
+    :param uri: connection string to QGIS project stored into a database.
+    :type uri: str
+    :param cache_folder: folder where the downloaded project is stored.
+    :type cache_folder: Path
+    :param last_modified: last modification time of the project in the database.
+    :type last_modified: str
+
+    :raises IOError: if the project can't be downloaded and has no local copy.
+
+    :return: path to the local copy of the zipped project.
+    :rtype: Path
+    """
+    db_folder = cache_folder / "database"
+    db_folder.mkdir(exist_ok=True, parents=True)
+    uri_hash = hashlib.sha1(uri.encode("utf-8")).hexdigest()
+    zip_project = db_folder / "{}.qgz".format(uri_hash)
+    metadata_path = db_folder / "{}.json".format(uri_hash)
+
+    if last_modified is not None and zip_project.is_file():
+        try:
+            with metadata_path.open("r", encoding="utf-8") as metadata_file:
+                metadata = json.load(metadata_file)
+            if (
+                metadata.get("uri") == uri
+                and metadata.get("last_modified_time") == last_modified
+            ):
+                return zip_project
+        except (OSError, ValueError):
+            pass
+
+    error = None
+    fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=str(db_folder))
+    os.close(fd)
     try:
-        props = doc.elementsByTagName("properties")
-        if props.count() == 1:
-            node = props.at(0)
-            pathNode = node.namedItem("Paths")
-            absNode = pathNode.namedItem("Absolute")
-            absolute = "true" == absNode.firstChild().toText().data()
-    except Exception:
-        pass
+        project_storage = project_registry.projectStorageFromUri(uri)
+        zip_file = QFile(tmp_path)
+        if project_storage is None:
+            error = "no project storage"
+        elif not zip_file.open(QIODevice.WriteOnly):
+            error = zip_file.errorString()
+        else:
+            try:
+                if not project_storage.readProject(
+                    uri, zip_file, QgsReadWriteContext()
+                ):
+                    error = "project not read from the storage"
+            except Exception as err:
+                error = str(err)
+            finally:
+                zip_file.close()
+
+        if error is None:
+            os.replace(tmp_path, zip_project)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    if error is not None:
+        if zip_project.is_file():
+            logger.warning(
+                "{} can't be downloaded ({}), using the local copy.".format(
+                    uri, error
+                )
+            )
+            return zip_project
+        raise IOError("{} can't be downloaded: {}".format(uri, error))
+
+    with metadata_path.open("w", encoding="utf-8") as metadata_file:
+        json.dump({"uri": uri, "last_modified_time": last_modified}, metadata_file)
+
+    return zip_project
+
+
+def download_from_http(uri: str, cache_folder: Path) -> Path:
+    """Download a QGIS project stored on a remote web server accessible through HTTP.
+
+    The request is conditional (If-None-Match / If-Modified-Since) when the \
+    project has already been downloaded: validators sent by the server are \
+    stored next to the local copy. The local copy is also used when the server \
+    can't be reached. It runs a blocking request, so it is meant to be called \
+    from a background task.
+
+    :param uri: web URL to the QGIS project
+    :type uri: str
+
+    :return: path to the local copy of the project.
+    :rtype: Path
+    """
+    # get filename from URL parts
+    parsed = urlparse(uri)
+    if not parsed.path.rpartition("/")[2].endswith((".qgs", ".qgz")):
+        raise ValueError(
+            "URI doesn't ends with QGIS project extension (.qgs or .qgz): {}".format(
+                uri
+            )
+        )
+    http_folder = (
+        cache_folder / "http" / hashlib.sha1(uri.encode("utf-8")).hexdigest()
+    )
+    http_folder.mkdir(exist_ok=True, parents=True)
+    cached_filepath = http_folder / parsed.path.rpartition("/")[2]
+    validators_path = http_folder / "validators.json"
+
+    validators = dict()
+    if cached_filepath.is_file():
+        try:
+            with validators_path.open("r", encoding="utf-8") as validators_file:
+                validators = json.load(validators_file)
+        except (OSError, ValueError):
+            pass
+
+    request = QNetworkRequest(QUrl(uri))
+    request.setAttribute(
+        QNetworkRequest.CacheLoadControlAttribute, QNetworkRequest.AlwaysNetwork
+    )
+    request.setAttribute(QNetworkRequest.CacheSaveControlAttribute, False)
+    if validators.get("etag"):
+        request.setRawHeader(b"If-None-Match", validators["etag"].encode("utf-8"))
+    if validators.get("last_modified"):
+        request.setRawHeader(
+            b"If-Modified-Since", validators["last_modified"].encode("utf-8")
+        )
+
+    reply = QgsNetworkAccessManager.blockingGet(request)
+    status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
 
-    return absolute
+    if reply.error() != QNetworkReply.NoError or status not in (200, 304):
+        if cached_filepath.is_file():
+            logger.warning(
+                "{} can't be downloaded ({}), using the local copy.".format(
+                    uri, reply.errorString()
+                )
+            )
+            return cached_filepath
+        raise IOError("{} can't be downloaded: {}".format(uri, reply.errorString()))
+
+    if status == 304:
+        return cached_filepath
+
+    tmp_filepath = cached_filepath.with_name(cached_filepath.name + ".part")
+    tmp_filepath.write_bytes(bytes(reply.content()))
+    os.replace(tmp_filepath, cached_filepath)
+
+    with validators_path.open("w", encoding="utf-8") as validators_file:
+        json.dump(
+            {
+                "uri": uri,
+                "etag": bytes(reply.rawHeader(b"ETag")).decode("utf-8"),
+                "last_modified": bytes(reply.rawHeader(b"Last-Modified")).decode(
+                    "utf-8"
+                ),
+            },
+            validators_file,
+        )
 
+    return cached_filepath
 
-def get_project_title(doc: QtXml.QDomDocument) -> str:
-    """Return the project title defined in the XML document.
 
-    :param doc: The QGIS project as XML document. Default to None.
-    :type doc: QDomDocument
+def resolve_embedded_path(embedded_file: str, absolute: bool, base_path: str) -> str:
+    """Return the path of an embedded project, as read by the menu.
 
-    :return: The title or None.
-    :rtype: string
+    Only relative embedded projects are supported, they are resolved against the
+    folder of the embedding project.
+
+    :param embedded_file: value of the ``embedded_project`` custom property
+    :type embedded_file: str
+    :param absolute: True if the embedding project is using absolute paths
+    :type absolute: bool
+    :param base_path: path of the embedding project
+    :type base_path: str
+
+    :return: path to the embedded project or None if it can't be resolved.
+    :rtype: str
     """
-    tags = doc.elementsByTagName("qgis")
-    if tags.count():
-        node = tags.at(0)
-        title_node = node.namedItem("title")
-        return title_node.firstChild().toText().data()
+    if not absolute and (embedded_file.find(".") == 0):
+        return QFileInfo(base_path).path() + "/" + embedded_file
 
     return None
 
 
-def read_from_file(uri: str) -> Tuple[QtXml.QDomDocument, str]:
-    """Read a QGIS project (.qgs and .qgz) from a file path and returns d
+def resolve_layer_datasource(
+    datasource: str, provider: str, absolute: bool, base_path: str
+) -> str:
+    """Return the datasource of a layer, relative file paths resolved.
 
-    :param uri: path to the file
-    :type uri: str
+    Only relative paths of ogr and gdal layers are resolved, against the folder \
+    of the project.
+
+    :param datasource: layer datasource, as stored in the project
+    :type datasource: str
+    :param provider: layer data provider key
+    :type provider: str
+    :param absolute: True if the project is using absolute paths
+    :type absolute: bool
+    :param base_path: path of the project
+    :type base_path: str
 
-    :return: a tuple with XML document and the filepath.
-    :rtype: Tuple[QtXml.QDomDocument, str]
+    :return: the datasource to use
+    :rtype: str
     """
-    doc = QtXml.QDomDocument()
-    file = QFile(uri)
-    if (
-        file.exists()
-        and file.open(QIODevice.ReadOnly | QIODevice.Text)
-        and QFileInfo(file).suffix() == "qgs"
-    ):
-        doc.setContent(file)
-        project_path = uri
-
-    elif file.exists() and (QFileInfo(file).suffix() == "qgz"):
-        temporary_unzip = QTemporaryDir()
-        temporary_unzip.setAutoRemove(False)
-        with zipfile.ZipFile(uri, "r") as zip_ref:
-            zip_ref.extractall(temporary_unzip.path())
-
-        project_filename = QDir(temporary_unzip.path()).entryList(["*.qgs"])[0]
-        project_path = os.path.join(temporary_unzip.path(), project_filename)
-        xml = QFile(project_path)
-        if xml.open(QIODevice.ReadOnly | QIODevice.Text):
-            doc.setContent(xml)
-
-    return doc, project_path
-
-
-def read_from_database(uri: str, project_registry) -> Tuple[QtXml.QDomDocument, str]:
-    """Read a QGIS project stored into a (PostgreSQL) database.
+    if not absolute and provider in ("ogr", "gdal") and (datasource.find(".") == 0):
+        return QFileInfo(base_path).path() + "/" + datasource
+
+    return datasource
 
-    :param uri: connection string to QGIS project stored into a database.
-    :type uri: str
 
-    :return: a tuple with XML document and the filepath.
-    :rtype: Tuple[QtXml.QDomDocument, str]
+def _get_custom_properties(element: ElementTree.Element) -> dict:
+    """Return the custom properties of a layer tree node, in one pass over its \
+    ``customproperties`` child. The first property wins for a duplicated key.
     """
-    doc = QtXml.QDomDocument()
-    # uri PG
-    project_storage = project_registry.projectStorageFromUri(uri)
+    properties = dict()
+    custom_properties = element.find("customproperties")
+    if custom_properties is None:
+        return properties
 
-    temporary_zip = QTemporaryFile()
-    temporary_zip.open()
-    zip_project = temporary_zip.fileName()
+    for prop in custom_properties.iter("property"):
+        properties.setdefault(prop.get("key"), prop.get("value"))
 
-    project_storage.readProject(uri, temporary_zip, QgsReadWriteContext())
+    return properties
 
-    temporary_unzip = QTemporaryDir()
-    temporary_unzip.setAutoRemove(False)
-    with zipfile.ZipFile(zip_project, "r") as zip_ref:
-        zip_ref.extractall(temporary_unzip.path())
 
-    project_filename = QDir(temporary_unzip.path()).entryList(["*.qgs"])[0]
-    project_path = os.path.join(temporary_unzip.path(), project_filename)
-    xml = QFile(project_path)
-    if xml.open(QIODevice.ReadOnly | QIODevice.Text):
-        doc.setContent(xml)
+def _get_child_text(element: ElementTree.Element, tag: str) -> str:
+    child = element.find(tag)
+    if child is None:
+        return ""
 
-    return doc, project_path
+    return child.text or ""
 
 
-@lru_cache()
-def read_from_http(uri: str, cache_folder: Path):
-    """Read a QGIS project stored into on a remote web server accessible through HTTP.
+def _get_layer_summary(maplayer: ElementTree.Element) -> dict:
+    """Return what the menu needs to know about a maplayer."""
+    geometry_type = maplayer.get("geometry", "")
+    if geometry_type == "":
+        # A TMS has not a geometry attribute.
+        # Let's read the "type"
+        geometry_type = maplayer.get("type", "")
 
-    :param uri: web URL to the QGIS project
-    :type uri: str
+    return {
+        "type": maplayer.get("type", "vector"),
+        "geometry": geometry_type,
+        "provider": _get_child_text(maplayer, "provider"),
+        "datasource": _get_child_text(maplayer, "datasource"),
+        "title": _get_child_text(maplayer, "title"),
+        "abstract": _get_child_text(maplayer, "abstract"),
+    }
 
-    :return: a tuple with XML document and the filepath.
-    :rtype: Tuple[QtXml.QDomDocument, str]
+
+def _extract_tree_nodes(
+    parent: ElementTree.Element, absolute: bool, base_path: str
+) -> list:
+    """Return the menu nodes for the children of a layer tree group.
+
+    The layer tree is walked with an explicit stack of (children left to read, \
+    nodes list to fill), so its depth is not limited by the recursion limit.
     """
-    # get filename from URL parts
-    parsed = urlparse(uri)
-    if not parsed.path.rpartition("/")[2].endswith((".qgs", ".qgz")):
-        raise ValueError(
-            "URI doesn't ends with QGIS project extension (.qgs or .qgz): {}".format(
-                uri
+    nodes = []
+    stack = [(iter(parent), nodes)]
+    while stack:
+        children, siblings = stack[-1]
+        element = next(children, None)
+        if element is None:
+            stack.pop()
+            continue
+
+        if element.tag == "layer-tree-layer":
+            custom_properties = _get_custom_properties(element)
+            embedded = custom_properties.get("embedded") == "1"
+            embedded_project = None
+            if embedded:
+                embedded_file = custom_properties.get("embedded_project")
+                if embedded_file is not None:
+                    embedded_project = resolve_embedded_path(
+                        embedded_file, absolute, base_path
+                    )
+
+            siblings.append(
+                {
+                    "type": "layer",
+                    "name": element.get("name", ""),
+                    "id": element.get("id", ""),
+                    "visible": element.get("checked", "") == "Qt::Checked",
+                    "expanded": element.get("expanded", "0") == "1",
+                    "embedded": embedded,
+                    "embedded_project": embedded_project,
+                }
             )
+
+        elif element.tag == "layer-tree-group":
+            name = element.get("name", "")
+            custom_properties = _get_custom_properties(element)
+            if custom_properties.get("embedded") == "1":
+                embedded_project = None
+                embedded_file = custom_properties.get("embedded_project")
+                if embedded_file is not None:
+                    embedded_project = resolve_embedded_path(
+                        embedded_file, absolute, base_path
+                    )
+                siblings.append(
+                    {
+                        "type": "embedded_group",
+                        "name": name,
+                        "embedded_project": embedded_project,
+                    }
+                )
+            elif name == "-":
+                siblings.append({"type": "separator", "name": name})
+            elif name.startswith("-"):
+                siblings.append({"type": "label", "name": name})
+            else:
+                group = {"type": "group", "name": name, "children": []}
+                siblings.append(group)
+                # its children are read before the next siblings
+                stack.append((iter(element), group["children"]))
+
+    return nodes
+
+
+def extract_project_summary(
+    local_path: str, uri: str, base_path: str = None, fragments: dict = None
+) -> dict:
+    """Extract from a QGIS project everything needed to build its menu.
+
+    The project is read in one streaming pass: only the layer tree and the \
+    maplayer summaries are kept in memory, other subtrees (symbology, labeling, \
+    layouts...) are dropped as soon as they are parsed. When a fragments dict is \
+    given, the XML of each maplayer is collected in the same pass.
+
+    The summary is a JSON serializable dict, so it can be stored in the plugin cache:
+
+    - ``uri``: project URI, used to read the project again when a layer is loaded
+    - ``path``: project local filepath
+    - ``title``, ``absolute`` and ``trusted`` project properties
+    - ``layers``: summary of each maplayer (type, geometry, provider, datasource, \
+    title and abstract), by layer id
+    - ``tree``: the layer tree as nested nodes with a ``type`` in \
+    (layer, group, embedded_group, separator, label)
+
+    :param local_path: path to the project (or its local copy)
+    :type local_path: str
+    :param uri: The project URI.
+    :type uri: str
+    :param base_path: path used to resolve relative embedded projects. Defaults \
+    to the project local filepath.
+    :type base_path: str
+    :param fragments: if given, filled with the maplayer elements serialized as \
+    UTF-8 XML, by layer id (see resolve_layer_fragments)
+    :type fragments: dict
+
+    :return: the project summary
+    :rtype: dict
+    """
+    summary = {
+        "uri": uri,
+        "path": local_path,
+        "title": None,
+        "absolute": False,
+        "trusted": False,
+        "layers": {},
+        "tree": [],
+    }
+    tree_element = None
+    tree_depth = None
+    maplayer_depth = None
+    stack = []
+
+    with open_project_xml(local_path) as (xml_file, project_path):
+        summary["path"] = project_path
+
+        for event, element in ElementTree.iterparse(xml_file, ("start", "end")):
+            if event == "start":
+                if element.tag == "maplayer" and maplayer_depth is None:
+                    maplayer_depth = len(stack)
+                elif (
+                    element.tag == "layer-tree-group"
+                    and tree_element is None
+                    and tree_depth is None
+                ):
+                    tree_depth = len(stack)
+                stack.append(element)
+                continue
+
+            stack.pop()
+            depth = len(stack)
+            if not depth:
+                # end of document
+                break
+            parent = stack[-1]
+
+            # the layer tree is small: keep it whole until the end of the document
+            if tree_depth is not None:
+                if depth == tree_depth:
+                    tree_element = element
+                    tree_depth = None
+                    parent.remove(element)
+                continue
+
+            if maplayer_depth is not None:
+                if depth == maplayer_depth:
+                    layer_id = _get_child_text(element, "id")
+                    if layer_id:
+                        summary["layers"][layer_id] = _get_layer_summary(element)
+                        if fragments is not None:
+                            element.tail = None
+                            fragments[layer_id] = ElementTree.tostring(
+                                element, encoding="utf-8"
+                            )
+                    maplayer_depth = None
+                elif fragments is not None:
+                    # part of the maplayer fragment
+                    continue
+                elif depth == maplayer_depth + 1 and element.tag in (
+                    "id",
+                    "datasource",
+                    "provider",
+                    "title",
+                    "abstract",
+                ):
+                    continue
+                elif depth > maplayer_depth + 1:
+                    # parent is dropped anyway
+                    element.clear()
+                    continue
+
+            elif depth == 1 and element.tag == "title":
+                summary["title"] = element.text or ""
+            elif depth == 1 and element.tag == "trust":
+                summary["trusted"] = element.get("active") == "1"
+            elif (
+                depth == 3
+                and element.tag == "Absolute"
+                and parent.tag == "Paths"
+                and stack[-2].tag == "properties"
+            ):
+                summary["absolute"] = element.text == "true"
+
+            element.clear()
+            parent.remove(element)
+
+    if tree_element is not None:
+        summary["tree"] = _extract_tree_nodes(
+            tree_element, summary["absolute"], base_path or summary["path"]
         )
-    cached_filepath = cache_folder / parsed.path.rpartition("/")[2]
 
-    # download it
-    loop = QEventLoop()
-    project_download = QgsFileDownloader(
-        url=QUrl(uri), outputFileName=str(cached_filepath), delayStart=True
-    )
-    project_download.downloadExited.connect(loop.quit)
-    project_download.startDownload()
-    loop.exec_()
+    return summary
+
 
-    return read_from_file(str(cached_filepath))
+def extract_layer_fragments(local_path: str) -> dict:
+    """Extract the XML of every maplayer of a QGIS project, by layer id.
+
+    The project is read in one streaming pass, everything but the maplayers is \
+    dropped as soon as it is parsed.
+
+    :param local_path: path to the project (or its local copy)
+    :type local_path: str
+
+    :return: maplayer elements serialized as UTF-8 XML, by layer id
+    :rtype: dict
+    """
+    fragments = dict()
+    maplayer_depth = None
+    stack = []
+
+    with open_project_xml(local_path) as (xml_file, _):
+        for event, element in ElementTree.iterparse(xml_file, ("start", "end")):
+            if event == "start":
+                if element.tag == "maplayer" and maplayer_depth is None:
+                    maplayer_depth = len(stack)
+                stack.append(element)
+                continue
+
+            stack.pop()
+            depth = len(stack)
+            if not depth:
+                # end of document
+                break
+
+            if maplayer_depth is not None:
+                if depth > maplayer_depth:
+                    # part of the maplayer fragment
+                    continue
+
+                layer_id = _get_child_text(element, "id")
+                if layer_id:
+                    element.tail = None
+                    fragments[layer_id] = ElementTree.tostring(
+                        element, encoding="utf-8"
+                    )
+                maplayer_depth = None
+
+            element.clear()
+            stack[-1].remove(element)
+
+    return fragments
+
+
+def prepare_layer_fragments(local_path: str, summary: dict) -> dict:
+    """Extract the maplayer XML of a project, ready to be read by QGIS, see \
+    resolve_layer_fragments.
+
+    :param local_path: path to the project (or its local copy)
+    :type local_path: str
+    :param summary: project summary, see extract_project_summary
+    :type summary: dict
+
+    :return: maplayer elements serialized as XML strings, by layer id
+    :rtype: dict
+    """
+    return resolve_layer_fragments(extract_layer_fragments(local_path), summary)
+
+
+def resolve_layer_fragments(fragments: dict, summary: dict) -> dict:
+    """Return the maplayer XML of a project ready to be read by QGIS: relative \
+    datasources resolved against the project URI.
+
+    Layers are then loaded without reading the project again.
+
+    :param fragments: maplayer elements serialized as UTF-8 XML, by layer id
+    :type fragments: dict
+    :param summary: project summary, see extract_project_summary
+    :type summary: dict
+
+    :return: maplayer elements serialized as XML strings, by layer id
+    :rtype: dict
+    """
+    prepared = dict()
+    for layer_id, fragment in fragments.items():
+        layer_summary = summary["layers"].get(layer_id)
+        if layer_summary is not None and not summary["absolute"]:
+            maplayer = ElementTree.fromstring(fragment)
+            datasource = maplayer.find("datasource")
+            if datasource is not None and datasource.text:
+                resolved = resolve_layer_datasource(
+                    datasource.text,
+                    layer_summary["provider"],
+                    False,
+                    summary["uri"],
+                )
+                if resolved != datasource.text:
+                    datasource.text = resolved
+                    fragment = ElementTree.tostring(maplayer, encoding="utf-8")
+
+        prepared[layer_id] = fragment.decode("utf-8")
+
+    return prepared
+
+
+def get_embedded_projects(nodes: list) -> set:
+    """Return the paths of the projects embedded in a layer tree summary.
+
+    :param nodes: layer tree nodes of a project summary
+    :type nodes: list
+
+    :return: embedded projects paths
+    :rtype: set
+    """
+    projects = set()
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if node.get("embedded_project"):
+            projects.add(node["embedded_project"])
+        stack.extend(node.get("children", []))
+
+    return projects
+
+
+def count_tree_nodes(nodes: list) -> dict:
+    """Count the nodes of a layer tree summary by type, embedded projects excluded.
+
+    :param nodes: layer tree nodes of a project summary
+    :type nodes: list
+
+    :return: number of nodes by type ("layer", "group"...)
+    :rtype: dict
+    """
+    counts = dict()
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        counts[node["type"]] = counts.get(node["type"], 0) + 1
+        stack.extend(node.get("children", []))
+
+    return counts
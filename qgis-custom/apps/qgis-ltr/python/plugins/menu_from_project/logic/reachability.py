@@ -0,0 +1,156 @@
+#! python3  # noqa: E265
+
+"""
+    Check that the sources of the projects (file shares, database and web servers)
+    can be reached, with a short timeout, before reading the projects.
+"""
+
+# Standard library
+import logging
+import os
+import re
+import socket
+import threading
+from pathlib import PureWindowsPath
+from urllib.parse import urlparse
+
+# project
+from .tools import guess_type_from_uri
+
+# ############################################################################
+# ########## Globals ###############
+# ##################################
+
+logger = logging.getLogger(__name__)
+
+UNC_PATH = re.compile(r"^(\\\\|//)(?P<host>[^\\/]+)[\\/]")
+
+# ############################################################################
+# ########## Functions #############
+# ##################################
+
+
+def source_key(uri: str) -> tuple:
+    """Return the source a project is read from.
+
+    :param uri: project URI
+    :type uri: str
+
+    :return: ("tcp", host, port) for servers, ("path", root) for files which \
+    are not on a UNC share, None if the source can't be guessed.
+    :rtype: tuple
+    """
+    storage_type = guess_type_from_uri(uri)
+    if storage_type == "database":
+        parsed = urlparse(uri)
+        if not parsed.hostname:
+            # service or local socket
+            return None
+        return ("tcp", parsed.hostname, parsed.port or 5432)
+
+    if storage_type == "http":
+        parsed = urlparse(uri)
+        if not parsed.hostname:
+            return None
+        return (
+            "tcp",
+            parsed.hostname,
+            parsed.port or (443 if parsed.scheme == "https" else 80),
+        )
+
+    match = UNC_PATH.match(uri)
+    if match:
+        # SMB
+        return ("tcp", match.group("host"), 445)
+
+    root = PureWindowsPath(uri).anchor if os.name == "nt" else "/"
+    return ("path", root or uri)
+
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class SourceProbe:
+    """Probe the sources of projects concurrently, each one once until ``clear``.
+
+    Each source is probed in its own daemon thread, so a probe stuck on an OS \
+    timeout never blocks the caller longer than the configured timeout. It is \
+    safe to use from the background tasks.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._probes = dict()
+
+    def clear(self):
+        """Forget the probe results, so sources are probed again."""
+        with self._lock:
+            self._probes = dict()
+
+    def clear_unreachable(self):
+        """Forget the sources found unreachable, so they are probed again. \
+        Reachable sources and running probes are kept."""
+        with self._lock:
+            self._probes = {
+                key: probe
+                for key, probe in self._probes.items()
+                if probe["reachable"] or not probe["done"].is_set()
+            }
+
+    def start(self, uris: list):
+        """Start probing the sources of some projects, without waiting.
+
+        :param uris: project URIs
+        :type uris: list
+        """
+        for uri in uris:
+            key = source_key(uri)
+            if key is not None:
+                self._probe(key)
+
+    def is_reachable(self, uri: str, wait: bool = True) -> bool:
+        """Return if the source of a project can be reached.
+
+        :param uri: project URI
+        :type uri: str
+        :param wait: wait for the probe result (up to the timeout), otherwise a \
+        source still being probed is considered unreachable
+        :type wait: bool
+
+        :return: True if the source answered within the timeout
+        :rtype: bool
+        """
+        key = source_key(uri)
+        if key is None:
+            return True
+
+        probe = self._probe(key)
+        if not probe["done"].wait(self.timeout if wait else 0):
+            return False
+
+        return probe["reachable"]
+
+    def _probe(self, key: tuple) -> dict:
+        with self._lock:
+            if key not in self._probes:
+                self._probes[key] = {"done": threading.Event(), "reachable": False}
+                threading.Thread(
+                    target=self._run, args=(key, self._probes[key]), daemon=True
+                ).start()
+
+            return self._probes[key]
+
+    def _run(self, key: tuple, probe: dict):
+        try:
+            if key[0] == "tcp":
+                socket.create_connection(key[1:], timeout=self.timeout).close()
+                probe["reachable"] = True
+            else:
+                probe["reachable"] = os.path.exists(key[1])
+        except OSError as err:
+            logger.info("{} is not reachable: {}".format(key[1], err))
+        finally:
+            probe["done"].set()
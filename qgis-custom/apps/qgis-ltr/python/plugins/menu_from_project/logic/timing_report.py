@@ -0,0 +1,125 @@
+#! python3  # noqa: E265
+
+"""
+    Timings of the menus build and of the layers loading, to find slow projects.
+"""
+
+# Standard library
+import json
+import logging
+import os
+import tempfile
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+# ############################################################################
+# ########## Globals ###############
+# ##################################
+
+logger = logging.getLogger(__name__)
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class TimingReport:
+    """Collect the timings of each configured project while menus are built, and \
+    of the last layer loads.
+
+    Durations are in seconds. The report is written as JSON, so timings of many \
+    workstations can be gathered and compared.
+    """
+
+    def __init__(self, report_path: Path, max_loads: int = 100):
+        self.report_path = Path(report_path)
+        self.started = None
+        self.projects = []
+        self.loads = deque(maxlen=max_loads)
+
+    def start(self):
+        """Forget the project timings, when menus are built again."""
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.projects = []
+
+    def add_project(self, uri: str, **record):
+        """Record the timings of a project.
+
+        :param uri: project URI
+        :type uri: str
+        :param record: "fetch", "parse" and "build" durations, node counts...
+        :type record: dict
+        """
+        record["uri"] = uri
+        self.projects.append(record)
+
+    def add_load(self, uri: str, layer: str, layer_count: int, duration: float):
+        """Record the duration of a layer load.
+
+        :param uri: project URI
+        :type uri: str
+        :param layer: layer id, or group name for "Load all"
+        :type layer: str
+        :param layer_count: number of layers loaded
+        :type layer_count: int
+        :param duration: load duration
+        :type duration: float
+        """
+        self.loads.append(
+            {
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "uri": uri,
+                "layer": layer,
+                "layers": layer_count,
+                "time": duration,
+            }
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "total": sum(project.get("total", 0) for project in self.projects),
+            "projects": self.projects,
+            "loads": list(self.loads),
+        }
+
+    def summary_lines(self) -> list:
+        """Return one line per project, the slowest first.
+
+        :return: lines describing the projects timings
+        :rtype: list
+        """
+        lines = []
+        for project in sorted(
+            self.projects, key=lambda p: p.get("total", 0), reverse=True
+        ):
+            lines.append(
+                "{total:.3f}s {uri} (fetch {fetch:.3f}s, parse {parse:.3f}s{cached}, "
+                "build {build:.3f}s, {layers} layers, {groups} groups){error}".format(
+                    total=project.get("total", 0),
+                    uri=project["uri"],
+                    fetch=project.get("fetch", 0),
+                    parse=project.get("parse", 0),
+                    cached=" from cache" if project.get("cached") else "",
+                    build=project.get("build", 0),
+                    layers=project.get("layers", 0),
+                    groups=project.get("groups", 0),
+                    error=": " + project["error"] if project.get("error") else "",
+                )
+            )
+
+        return lines
+
+    def write(self):
+        """Write the report as JSON."""
+        try:
+            self.report_path.parent.mkdir(exist_ok=True, parents=True)
+            fd, tmp_path = tempfile.mkstemp(
+                suffix=".tmp", dir=str(self.report_path.parent)
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as report_file:
+                json.dump(self.to_dict(), report_file, indent=2)
+            os.replace(tmp_path, self.report_path)
+        except OSError as err:
+            logger.error("Timing report can't be written: {}".format(err))
@@ -22,31 +22,55 @@ email                : xavier.culos@eau-adour-garonne.fr
 import logging
 import os
 import re
+import time
+from collections import deque
 from pathlib import Path
 
 # PyQGIS
 from qgis.core import (
+    Qgis,
     QgsApplication,
+    QgsLayerTreeLayer,
     QgsMessageLog,
     QgsProject,
     QgsRasterLayer,
     QgsReadWriteContext,
     QgsSettings,
+    QgsTask,
     QgsVectorLayer,
 )
-from qgis.PyQt.QtCore import QCoreApplication, QFileInfo, Qt, QTranslator, QUuid
-from qgis.PyQt.QtGui import QFont, QIcon
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QFileInfo,
+    QFileSystemWatcher,
+    Qt,
+    QTimer,
+    QTranslator,
+    QUrl,
+    QUuid,
+)
+from qgis.PyQt.QtGui import QDesktopServices, QFont, QIcon
 from qgis.PyQt.QtWidgets import QAction, QMenu, QWidget
+from qgis.PyQt.QtXml import QDomDocument
 from qgis.utils import plugins, showPluginHelp
 
 # project
 from .__about__ import DIR_PLUGIN_ROOT, __title__, __title_clean__
+from .logic.cache_manager import LayerFragmentCache, MenuCache, project_fingerprint
+from .logic.custom_datatypes import LayerBatch
+from .logic.embedded_resolver import EmbeddedResolver
+from .logic.manifest import read_manifest
+from .logic.pg_metadata import PgProjectsMetadata
+from .logic.reachability import SourceProbe
+from .logic.timing_report import TimingReport
 from .logic.qgs_manager import (
-    get_project_title,
-    is_absolute,
-    read_from_database,
-    read_from_file,
-    read_from_http,
+    download_from_database,
+    download_from_http,
+    count_tree_nodes,
+    extract_project_summary,
+    get_embedded_projects,
+    prepare_layer_fragments,
+    resolve_layer_fragments,
 )
 from .logic.tools import guess_type_from_uri, icon_per_geometry_type
 from .ui.menu_conf_dlg import MenuConfDialog  # noqa: F4 I001
@@ -59,64 +83,6 @@ logger = logging.getLogger(__name__)
 cache_folder = Path.home() / f".cache/QGIS/{__title_clean__}"
 cache_folder.mkdir(exist_ok=True, parents=True)
 
-# ############################################################################
-# ########## Functions #############
-# ##################################
-
-
-def getFirstChildByTagNameValue(elt, tagName, key, value):
-    nodes = elt.elementsByTagName(tagName)
-    for node in (nodes.at(i) for i in range(nodes.size())):
-        nd = node.namedItem(key)
-        if nd and value == nd.firstChild().toText().data():
-            # layer founds
-            return node
-
-    return None
-
-
-def getFirstChildByAttrValue(elt, tagName, key, value):
-    nodes = elt.elementsByTagName(tagName)
-    for node in (nodes.at(i) for i in range(nodes.size())):
-        if (
-            node.toElement().hasAttribute(key)
-            and node.toElement().attribute(key) == value
-        ):
-            # layer founds
-            return node
-
-    return None
-
-
-def getMapLayersDict(domdoc):
-    r = {}
-    nodes = domdoc.documentElement().elementsByTagName("maplayer")
-    for node in (nodes.at(i) for i in range(nodes.size())):
-        nd = node.namedItem("id")
-        if nd:
-            r[nd.firstChild().toText().data()] = node
-
-    return r
-
-
-def project_trusted(doc):
-    """Return if the project is trusted.
-
-    :param doc: The QGIS project as XML document. Default to None.
-    :type doc: QDomDocument
-
-    :return: True of False.
-    :rtype: bool
-    """
-    tags = doc.elementsByTagName("qgis")
-    if tags.count():
-        node = tags.at(0)
-        trust_node = node.namedItem("trust")
-        return trust_node.toElement().attribute("active") == "1"
-
-    return False
-
-
 # ############################################################################
 # ########## Classes ###############
 # ##################################
@@ -135,13 +101,37 @@ class MenuFromProject:
 
         # new multi projects var
         self.projects = []
-        self.docs = dict()
+        self.summaries = dict()
+        self.layerDecorations = dict()
+        self.embeddedResolver = EmbeddedResolver(self.getProjectSummary, self.log)
+        self.localPaths = dict()
+        self.menu_cache = MenuCache(cache_folder)
+        self.pg_metadata = PgProjectsMetadata()
+        # background project loading
+        self.menusGeneration = 0
+        self.pendingProjects = deque()
+        self.projectTasks = dict()
+        self.staleTasks = set()
+        self.layerTasks = []
+        # layers built after unload are not added to the project
+        self.unloaded = False
+        self.menuGroups = []
+        self.menuOptions = None
+        self.timingReport = TimingReport(
+            Path(QgsApplication.qgisSettingsDirPath())
+            / __title_clean__
+            / "timing_report.json"
+        )
         self.menubarActions = []
         self.layerMenubarActions = []
         self.canvas = self.iface.mapCanvas()
         self.optionTooltip = False
         self.optionCreateGroup = False
         self.optionLoadAll = False
+        self.optionLazyMenus = False
+        self.optionParallelLoad = False
+        self.manifestPath = ""
+        self.manifest = dict()
         self.read()
         settings = QgsSettings()
 
@@ -154,8 +144,48 @@ class MenuFromProject:
             "menu_from_project/is_setup_visible", True, bool
         )
 
+        # Number of projects read at the same time, in background tasks.
+        self.max_parallel_projects = max(
+            1, settings.value("menu_from_project/max_parallel_projects", 4, int)
+        )
+        # Number of tasks opening the layers of a "Load all", if optionParallelLoad.
+        self.max_parallel_layers = max(
+            1, settings.value("menu_from_project/max_parallel_layers", 4, int)
+        )
+        # Watch project files, and rebuild their menus when they are saved.
+        self.projectWatcher = None
+        self.changedFiles = set()
+        if settings.value("menu_from_project/watch_projects", True, bool):
+            self.projectWatcher = QFileSystemWatcher()
+            self.projectWatcher.fileChanged.connect(self.onProjectFileChanged)
+            self.watchTimer = QTimer()
+            self.watchTimer.setSingleShot(True)
+            self.watchTimer.setInterval(
+                settings.value("menu_from_project/watch_delay", 2000, int)
+            )
+            self.watchTimer.timeout.connect(self.onWatchTimeout)
+
+        # Sources of the projects are probed first, unreachable ones are shown
+        # from their last menu and probed again regularly.
+        self.sourceProbe = SourceProbe(
+            settings.value("menu_from_project/probe_timeout", 2.0, float)
+        )
+        self.offlineProjects = set()
+        self.retryTask = None
+        self.retryTimer = QTimer()
+        self.retryTimer.setInterval(
+            settings.value("menu_from_project/offline_retry_delay", 60, int) * 1000
+        )
+        self.retryTimer.timeout.connect(self.onRetryTimeout)
+
+        # Memory budget (MB) of the layers XML kept to load layers from the menus.
+        self.layerFragments = LayerFragmentCache(
+            settings.value("menu_from_project/layer_cache_size", 64, int) * 1024 * 1024
+        )
+
         self.action_project_configuration = None
         self.action_menu_help = None
+        self.action_timing_report = None
 
         # default lang
         locale = settings.value("locale/userLocale")
@@ -173,8 +203,10 @@ class MenuFromProject:
         return QCoreApplication.translate("MenuFromProject", message)
 
     @staticmethod
-    def log(message, application=__title__, log_level=1):
-        QgsMessageLog.logMessage(message, application, notifyUser=True)
+    def log(message, application=__title__, log_level=Qgis.Warning):
+        QgsMessageLog.logMessage(
+            message, application, log_level, notifyUser=log_level >= Qgis.Warning
+        )
 
     def store(self):
         """Store the configuration in the QSettings."""
@@ -185,6 +217,9 @@ class MenuFromProject:
             s.setValue("optionTooltip", self.optionTooltip)
             s.setValue("optionCreateGroup", self.optionCreateGroup)
             s.setValue("optionLoadAll", self.optionLoadAll)
+            s.setValue("optionLazyMenus", self.optionLazyMenus)
+            s.setValue("optionParallelLoad", self.optionParallelLoad)
+            s.setValue("manifest", self.manifestPath)
 
             s.beginWriteArray("projects", len(self.projects))
             try:
@@ -213,6 +248,11 @@ class MenuFromProject:
                 self.optionTooltip = s.value("optionTooltip", True, type=bool)
                 self.optionCreateGroup = s.value("optionCreateGroup", False, type=bool)
                 self.optionLoadAll = s.value("optionLoadAll", False, type=bool)
+                self.optionLazyMenus = s.value("optionLazyMenus", False, type=bool)
+                self.optionParallelLoad = s.value(
+                    "optionParallelLoad", False, type=bool
+                )
+                self.manifestPath = s.value("manifest", "", type=str)
 
                 size = s.beginReadArray("projects")
                 try:
@@ -242,374 +282,1200 @@ class MenuFromProject:
         except Exception:
             pass
 
-    def addToolTip(self, ml, action):
-        """Search and add a tooltip to a given action according to a maplayer.
+    @staticmethod
+    def layerToolTip(layer_summary):
+        """Return the tooltip of a layer according to its maplayer summary.
 
-        :param ml: The maplayer as XML definition.
-        :type ml: documentElement
+        :param layer_summary: The maplayer summary (title, abstract).
+        :type layer_summary: dict
 
-        :param action: The action.
-        :type action: QAction
+        :return: The tooltip, empty if the layer has no title nor abstract.
+        :rtype: basestring
         """
+        if layer_summary is None:
+            return ""
 
-        if ml is not None:
-            try:
-                title = ml.namedItem("title").firstChild().toText().data()
-                abstract = ml.namedItem("abstract").firstChild().toText().data()
+        title = layer_summary["title"]
+        abstract = layer_summary["abstract"]
 
-                if (abstract != "") and (title == ""):
-                    action.setToolTip(
-                        "<p>{}</p>".format("<br/>".join(abstract.split("\n")))
-                    )
-                else:
-                    if abstract != "" or title != "":
-                        action.setToolTip(
-                            "<b>{}</b><br/>{}".format(
-                                title, "<br/>".join(abstract.split("\n"))
-                            )
-                        )
-                    else:
-                        action.setToolTip("")
-            except Exception:
-                pass
+        if (abstract != "") and (title == ""):
+            return "<p>{}</p>".format("<br/>".join(abstract.split("\n")))
+        elif abstract != "" or title != "":
+            return "<b>{}</b><br/>{}".format(title, "<br/>".join(abstract.split("\n")))
 
-    def addMenuItem(self, uri, filename, node, menu, absolute, mapLayersDict):
-        """Add menu to an item."""
-        yaLayer = False
-        if node is None or node.nodeName() == "":
-            return yaLayer
+        return ""
 
-        element = node.toElement()
+    def layerDecoration(self, uri, layerId):
+        """Return the tooltip and the icon of a layer menu item.
 
-        # if legendlayer tag
-        if node.nodeName() == "layer-tree-layer":
-            try:
-                name = element.attribute("name")
-                layerId = element.attribute("id")
-                visible = element.attribute("checked", "") == "Qt::Checked"
-                expanded = element.attribute("expanded", "0") == "1"
-                action = QAction(name, self.iface.mainWindow())
-                embedNd = getFirstChildByAttrValue(
-                    element, "property", "key", "embedded"
-                )
+        They are memoized per project fingerprint and layer id, so they are \
+        computed once, and again only if the project changes.
 
-                # is layer embedded ?
-                if embedNd and embedNd.toElement().attribute("value") == "1":
-                    # layer is embeded
-                    efilename = None
-                    eFileNd = getFirstChildByAttrValue(
-                        element, "property", "key", "embedded_project"
-                    )
-
-                    if eFileNd:
-                        # get project file name
-                        embeddedFile = eFileNd.toElement().attribute("value")
-                        if not absolute and (embeddedFile.find(".") == 0):
-                            efilename = QFileInfo(filename).path() + "/" + embeddedFile
-
-                        # if ok
-                        if efilename:
-                            # add menu item
-                            action.triggered.connect(
-                                lambda checked, uri=uri, f=efilename, lid=layerId, m=menu, v=visible, x=expanded: self.loadLayer(
-                                    uri, f, lid, m, v, x
-                                )
-                            )
-
-                            menu.addAction(action)
-                            yaLayer = True
-
-                            if self.optionTooltip:
-                                # search embeded maplayer (for title, abstract)
-                                mapLayer = self.getMapLayerDomFromQgs(
-                                    efilename, layerId
-                                )
-                                if mapLayer is not None:
-                                    self.addToolTip(mapLayer, action)
-                    else:
-                        self.log(
-                            "Menu from layer: {} not found in project {}".format(
-                                layerId, efilename
-                            )
-                        )
+        :param uri: The URI of the project holding the layer.
+        :type uri: basestring
 
-                # layer is not embedded
-                else:
-                    efilename = filename
+        :param layerId: The layer ID.
+        :type layerId: basestring
 
-                    if self.optionTooltip:
-                        self.addToolTip(mapLayersDict[layerId], action)
+        :return: The tooltip and the geometry type icon (None if unknown).
+        :rtype: Tuple[basestring, QIcon]
+        """
+        index = self.embeddedResolver.index(uri)
+        if index is None:
+            return "", None
+
+        key = (index["fingerprint"], layerId)
+        if key not in self.layerDecorations:
+            layer_summary = index["layers"].get(layerId)
+            self.layerDecorations[key] = (
+                self.layerToolTip(layer_summary),
+                icon_per_geometry_type(layer_summary["geometry"])
+                if layer_summary is not None
+                else None,
+            )
 
-                    action.triggered.connect(
-                        lambda checked, uri=uri, f=filename, lid=layerId, m=menu, v=visible, x=expanded: self.loadLayer(
-                            uri, f, lid, m, v, x
-                        )
-                    )
+        return self.layerDecorations[key]
 
-                    menu.addAction(action)
-                    yaLayer = True
+    def watchMenuDecorations(self, menu):
+        """Decorate the layer items of a menu when it is shown (icons) and \
+        hovered (tooltips), instead of when it is built.
 
-                # Add geometry type icon
+        :param menu: The menu holding layer items.
+        :type menu: QMenu
+        """
+        if menu.property("layerDecorations"):
+            return
+
+        menu.setProperty("layerDecorations", True)
+        menu.aboutToShow.connect(lambda m=menu: self.decorateMenu(m))
+        menu.hovered.connect(self.onMenuHovered)
+
+    def decorateMenu(self, menu):
+        """Set the geometry type icons of the layer items of a menu."""
+        for action in menu.actions():
+            data = action.data()
+            if data and action.icon().isNull():
                 try:
-                    map_layer = self.getMapLayerDomFromQgs(
-                        efilename, layerId
-                    ).toElement()
-                    geometry_type = map_layer.attribute("geometry")
-                    if geometry_type == "":
-                        # A TMS has not a geometry attribute.
-                        # Let's read the "type"
-                        geometry_type = map_layer.attribute("type")
-
-                    action.setIcon(icon_per_geometry_type(geometry_type))
-                except Exception:
-                    pass
-
+                    _, icon = self.layerDecoration(*data)
+                    if icon is not None:
+                        action.setIcon(icon)
+                except Exception as e:
+                    for m in e.args:
+                        self.log(m)
+
+    def onMenuHovered(self, action):
+        """Set the tooltip of a layer item when it is hovered."""
+        data = action.data()
+        if data and self.optionTooltip:
+            try:
+                action.setToolTip(self.layerDecoration(*data)[0])
             except Exception as e:
                 for m in e.args:
                     self.log(m)
 
-        # / if element.tagName() == "layer-tree-layer":
+    def addMenuItem(self, uri, summary, nodes, menu, before=None):
+        """Add menu items for a list of layer tree nodes of a project summary.
 
-        # if legendgroup tag
-        if node.nodeName() == "layer-tree-group":
-            name = element.attribute("name")
-            propertiesNode = node.firstChild()
-            embedNd = getFirstChildByAttrValue(
-                propertiesNode.toElement(), "property", "key", "embedded"
-            )
+        The layer tree is walked with an explicit stack of frames (nodes left to \
+        add to a menu), so neither deep nor wide trees are limited by the Python \
+        recursion limit.
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :param summary: The project summary the nodes come from.
+        :type summary: dict
+
+        :param nodes: The layer tree nodes.
+        :type nodes: list
+
+        :param menu: The menu to fill.
+        :type menu: QMenu
+
+        :param before: The action before which items are inserted, None to append.
+        :type before: QAction
+
+        :return: True if at least one layer has been added.
+        :rtype: bool
+        """
+        root = {"hasLayer": False}
+        stack = [
+            {
+                "uri": uri,
+                "summary": summary,
+                "nodes": iter(nodes),
+                "menu": menu,
+                "before": before,
+                "result": root,
+                "group": None,
+                "embedded": frozenset(),
+            }
+        ]
+
+        while stack:
+            frame = stack[-1]
+            node = next(frame["nodes"], None)
+
+            if node is None:
+                stack.pop()
+                if frame["group"] is not None:
+                    # sub-menu complete
+                    groupNode, parentResult = frame["group"]
+                    self.finishGroupMenu(
+                        frame["uri"],
+                        frame["summary"],
+                        groupNode,
+                        frame["menu"],
+                        frame["result"]["hasLayer"],
+                    )
+                    parentResult["hasLayer"] |= frame["result"]["hasLayer"]
+                continue
+
+            # if legendlayer tag
+            if node["type"] == "layer":
+                if self.addLayerAction(
+                    frame["uri"], frame["summary"], node, frame["menu"], frame["before"]
+                ):
+                    frame["result"]["hasLayer"] = True
 
             # is group embedded ?
-            if embedNd and embedNd.toElement().attribute("value") == "1":
+            elif node["type"] == "embedded_group":
                 # group is embeded
-                efilename = None
-                eFileNd = getFirstChildByAttrValue(
-                    element, "property", "key", "embedded_project"
-                )
+                efilename = node["embedded_project"]
 
-                if eFileNd:
-                    # get project file name
-                    embeddedFile = eFileNd.toElement().attribute("value")
-                    if not absolute and (embeddedFile.find(".") == 0):
-                        efilename = QFileInfo(filename).path() + "/" + embeddedFile
-
-                    # if ok
-                    if efilename:
-                        # add menu group
-                        doc, _ = self.getQgsDoc(efilename)
+                if not efilename:
+                    self.embeddedResolver.report_once(
+                        ("group", frame["uri"], node["name"]),
+                        "Menu from layer: {} embedded from an unknown project".format(
+                            node["name"]
+                        ),
+                    )
+                elif (efilename, node["name"]) in frame["embedded"]:
+                    self.embeddedResolver.report_cycle(efilename, node["name"])
+                else:
+                    # add menu group, indexed once for all the projects embedding it
+                    esummary, groupNode = self.embeddedResolver.group(
+                        efilename, node["name"]
+                    )
 
-                        groupNode = getFirstChildByAttrValue(
-                            doc.documentElement(), "layer-tree-group", "name", name
+                    # and go through it, in the same menu
+                    if groupNode is not None:
+                        stack.append(
+                            dict(
+                                frame,
+                                uri=efilename,
+                                summary=esummary,
+                                nodes=iter([groupNode]),
+                                group=None,
+                                embedded=frame["embedded"]
+                                | {(efilename, node["name"])},
+                            )
                         )
 
-                        # and do recursion
-                        r = self.addMenuItem(
-                            efilename,
-                            efilename,
-                            groupNode,
-                            menu,
-                            absolute,
-                            getMapLayersDict(doc),
+            elif node["type"] == "separator":
+                frame["menu"].insertSeparator(frame["before"])
+
+            elif node["type"] == "label":
+                action = QAction(node["name"][1:], self.iface.mainWindow())
+                font = QFont()
+                font.setBold(True)
+                action.setFont(font)
+                frame["menu"].insertAction(frame["before"], action)
+
+            elif node["type"] == "group":
+                # sub-menu
+                sousmenu = QMenu("&" + node["name"], frame["menu"])
+                frame["menu"].insertMenu(frame["before"], sousmenu)
+                sousmenu.menuAction().setToolTip("")
+                sousmenu.setToolTipsVisible(self.optionTooltip)
+
+                if self.optionLazyMenus:
+                    # filled the first time it is shown
+                    sousmenu.aboutToShow.connect(
+                        lambda uri=frame["uri"], s=frame["summary"], n=node, m=sousmenu: self.onGroupMenuAboutToShow(
+                            uri, s, n, m
                         )
-
-                        yaLayer = yaLayer or r
-
+                    )
+                    if self.groupHasLayer(node):
+                        frame["result"]["hasLayer"] = True
                 else:
-                    self.log(
-                        "Menu from layer: {} not found in project {}".format(
-                            layerId, efilename
+                    stack.append(
+                        dict(
+                            frame,
+                            nodes=iter(node["children"]),
+                            menu=sousmenu,
+                            before=None,
+                            result={"hasLayer": False},
+                            group=(node, frame["result"]),
                         )
                     )
 
-            # group is not embedded
-            else:
+        return root["hasLayer"]
 
-                if name == "-":
-                    menu.addSeparator()
+    def addLayerAction(self, uri, summary, node, menu, before=None):
+        """Add the menu item of a layer node.
 
-                elif name.startswith("-"):
-                    action = QAction(name[1:], self.iface.mainWindow())
-                    font = QFont()
-                    font.setBold(True)
-                    action.setFont(font)
-                    menu.addAction(action)
+        :param uri: The project URI.
+        :type uri: basestring
 
-                else:
-                    # sub-menu
-                    sousmenu = menu.addMenu("&" + element.attribute("name"))
-                    sousmenu.menuAction().setToolTip("")
-                    sousmenu.setToolTipsVisible(self.optionTooltip)
+        :param summary: The project summary the node comes from.
+        :type summary: dict
+
+        :param node: The layer node.
+        :type node: dict
 
-                    childNode = node.firstChild()
+        :param menu: The menu to fill.
+        :type menu: QMenu
 
-                    #  ! recursion
-                    r = self.addMenuItem(
-                        uri, filename, childNode, sousmenu, absolute, mapLayersDict
+        :param before: The action before which the item is inserted, None to append.
+        :type before: QAction
+
+        :return: True if the item has been added.
+        :rtype: bool
+        """
+        try:
+            layerId = node["id"]
+            action = QAction(node["name"], self.iface.mainWindow())
+
+            # is layer embedded ?
+            if node["embedded"]:
+                # layer is embeded
+                efilename = node["embedded_project"]
+                if not efilename:
+                    self.embeddedResolver.report_once(
+                        ("layer", summary["uri"], layerId),
+                        "Menu from layer: {} embedded from an unknown project".format(
+                            layerId
+                        ),
                     )
+                    return False
+                # reported once, for all the projects embedding it
+                if self.embeddedResolver.layer(efilename, layerId) is None:
+                    return False
 
-                    if r and self.optionLoadAll and (len(sousmenu.actions()) > 1):
-                        action = QAction(self.tr("Load all"), self.iface.mainWindow())
-                        font = QFont()
-                        font.setBold(True)
-                        action.setFont(font)
-                        sousmenu.addAction(action)
-                        action.triggered.connect(
-                            lambda checked, f=None, w=None, m=sousmenu: self.loadLayer(
-                                uri, f, w, m
-                            )
-                        )
+            # layer is not embedded
+            else:
+                efilename = summary["uri"]
 
-        # / if element.tagName() == "legendgroup":
+            action.triggered.connect(
+                lambda checked, uri=uri, f=efilename, lid=layerId, m=menu, v=node["visible"], x=node["expanded"]: self.loadLayer(
+                    uri, f, lid, m, v, x
+                )
+            )
+
+            menu.insertAction(before, action)
+
+            # tooltip (title, abstract) and geometry type icon are set when the
+            # menu is shown, from the summary of the project holding the layer
+            action.setData((efilename, layerId))
+            self.watchMenuDecorations(menu)
 
-        nextNode = node.nextSibling()
-        if nextNode is not None:
-            # ! recursion
-            r = self.addMenuItem(uri, filename, nextNode, menu, absolute, mapLayersDict)
-            yaLayer = yaLayer or r
+        except Exception as e:
+            for m in e.args:
+                self.log(m)
+            return False
+
+        return True
+
+    def addGroupMenuItems(self, uri, summary, node, menu):
+        """Fill the sub-menu of a group, with a "Load all" item if needed.
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :param summary: The project summary the group comes from.
+        :type summary: dict
+
+        :param node: The group node.
+        :type node: dict
+
+        :param menu: The group sub-menu.
+        :type menu: QMenu
+
+        :return: True if at least one layer has been added.
+        :rtype: bool
+        """
+        r = self.addMenuItem(uri, summary, node["children"], menu)
+        self.finishGroupMenu(uri, summary, node, menu, r)
+
+        return r
+
+    def finishGroupMenu(self, uri, summary, node, menu, hasLayer):
+        """Add the "Load all" item at the end of a filled group sub-menu, if needed.
+
+        :param uri: The project URI.
+        :type uri: basestring
 
-        return yaLayer
+        :param summary: The project summary the group comes from.
+        :type summary: dict
 
-    def addMenu(self, name, uri, filepath, domdoc, location, previous=None):
-        """Add menu to the QGIS interface.
+        :param node: The group node.
+        :type node: dict
+
+        :param menu: The group sub-menu.
+        :type menu: QMenu
+
+        :param hasLayer: True if at least one layer has been added to the sub-menu.
+        :type hasLayer: bool
+        """
+        if hasLayer and self.optionLoadAll and (len(menu.actions()) > 1):
+            action = QAction(self.tr("Load all"), self.iface.mainWindow())
+            font = QFont()
+            font.setBold(True)
+            action.setFont(font)
+            menu.addAction(action)
+            action.triggered.connect(
+                lambda checked, uri=uri, s=summary, n=node, m=menu: self.loadAllLayers(
+                    uri, s, n, m
+                )
+            )
+
+    def onGroupMenuAboutToShow(self, uri, summary, node, menu):
+        """Fill a lazy group sub-menu, the first time it is shown."""
+        if menu.isEmpty():
+            self.addGroupMenuItems(uri, summary, node, menu)
+            # connected while the menu is being shown: not called this time
+            self.decorateMenu(menu)
+
+    @staticmethod
+    def groupHasLayer(node):
+        """Return True if a group node holds (maybe embedded) layers, without \
+        building its menu.
+
+        :param node: The group node.
+        :type node: dict
+
+        :rtype: bool
+        """
+        stack = [node]
+        while stack:
+            for child in stack.pop()["children"]:
+                if child["type"] in ("layer", "embedded_group"):
+                    return True
+                if child["type"] == "group":
+                    stack.append(child)
+
+        return False
+
+    def addMenu(self, name, uri, location, previous=None, before=None):
+        """Add menu to the QGIS interface, with a placeholder entry until the \
+        project is loaded.
 
         :param name: The name of the parent menu. It might be an empty string.
         :type name: basestring
 
-        :param filepath: The filepath of the project.
-        :type filepath: basestring
-
-        :param domdoc: The QGIS project as XML document.
-        :type domdoc: QDomDocument
+        :param uri: The project URI.
+        :type uri: basestring
 
         :param location: The menu location (new menu, or added in "layer - add layer" sub-menu).
         :type location: string
 
         :param previous: The previous added menu (for merging eventually)
         :type previous: QMenu
-        """
-        if not name:
-            name = get_project_title(domdoc)
 
-            if not name:
-                try:
-                    name = filepath.split("/")[-1]
-                    name = name.split(".")[0]
-                except IndexError:
-                    name = ""
+        :param before: The menu bar action to insert a new menu before, appended \
+        if None.
+        :type before: QAction
+
+        :return: The project menu and the placeholder actions (separator and \
+        "loading" entry) before which the project items are inserted.
+        :rtype: Tuple[QMenu, list]
+        """
+        placeholders = []
 
         # main project menu
         if location == "merge":
             projectMenu = previous
-            projectMenu.addSeparator()
+            placeholders.append(projectMenu.addSeparator())
         else:
             if location == "layer":
                 menuBar = self.iface.addLayerMenu()
             if location == "new":
                 menuBar = self.iface.editMenu().parentWidget()
 
-            projectMenu = QMenu("&" + name, menuBar)
+            projectMenu = QMenu("&" + (name or self.menuName(uri)), menuBar)
             projectMenu.setToolTipsVisible(self.optionTooltip)
-            projectAction = menuBar.addMenu(projectMenu)
+            if before is not None and before in menuBar.actions():
+                projectAction = menuBar.insertMenu(before, projectMenu)
+            else:
+                projectAction = menuBar.addMenu(projectMenu)
 
             if location == "layer":
                 self.layerMenubarActions.append(projectAction)
             if location == "new":
                 self.menubarActions.append(projectAction)
 
-        mapLayersDict = getMapLayersDict(domdoc)
+        loading = QAction(self.tr("Loading…"), projectMenu)
+        loading.setEnabled(False)
+        projectMenu.addAction(loading)
+        placeholders.append(loading)
+
+        return projectMenu, placeholders
+
+    @staticmethod
+    def menuName(path, title=None):
+        """Return the name of a project menu, when no name has been configured.
+
+        :param path: The project path.
+        :type path: basestring
+
+        :param title: The project title, used first if defined.
+        :type title: basestring
+
+        :return: The menu name.
+        :rtype: basestring
+        """
+        if title:
+            return title
+
+        try:
+            name = path.split("/")[-1]
+            return name.split(".")[0]
+        except IndexError:
+            return ""
+
+    def fillMenu(self, project, summary, menu, placeholders, offline=False):
+        """Fill a project menu, replacing its placeholder entry.
+
+        :param project: The configured project.
+        :type project: dict
+
+        :param summary: The project summary.
+        :type summary: dict
+
+        :param menu: The project menu.
+        :type menu: QMenu
+
+        :param placeholders: The placeholder actions returned by addMenu.
+        :type placeholders: list
+
+        :param offline: True if the summary is the snapshot of an unreachable \
+        project.
+        :type offline: bool
+        """
+        if not project["name"] and project["location"] != "merge":
+            menu.setTitle("&" + self.menuName(summary["path"], summary["title"]))
+
+        if offline:
+            marker = QAction(
+                QgsApplication.getThemeIcon("mIconWarning.svg"),
+                self.tr("Offline, last known menu"),
+                menu,
+            )
+            marker.setEnabled(False)
+            menu.insertAction(placeholders[-1], marker)
+            if project["location"] != "merge":
+                menu.setIcon(QgsApplication.getThemeIcon("mIconWarning.svg"))
 
         # build menu on legend schema
-        legends = domdoc.elementsByTagName("layer-tree-group")
-        if legends.length() > 0:
-            node = legends.item(0)
-            if node:
-                node = node.firstChild()
-                self.addMenuItem(
-                    uri, filepath, node, projectMenu, is_absolute(domdoc), mapLayersDict
-                )
+        self.addMenuItem(
+            project["file"], summary, summary["tree"], menu, placeholders[-1]
+        )
 
-        return projectMenu
+        menu.removeAction(placeholders[-1])
 
-    def getQgsDoc(self, uri):
-        """Return the XML document and the path from an URI.
+    def fetchProject(self, uri):
+        """Return a local path to the project, downloading it if needed.
 
-        The URI can be a filepath or stored in database.
+        Remote projects are fetched once per menus build. This is blocking for \
+        remote projects: it is run by the background tasks when menus are built.
 
         :param uri: The URI to fetch.
         :type uri: basestring
 
-        :return: Tuple with XML document and the filepath.
-        :rtype: (QDomDocument, basestring)
+        :return: The local filepath.
+        :rtype: basestring
         """
         # determine storage type: file, database or http
         qgs_storage_type = guess_type_from_uri(uri)
 
-        # check if docs is already here
-        if uri in self.docs:
-            return self.docs[uri], uri
-
         if qgs_storage_type == "file":
-            doc, project_path = read_from_file(uri)
-        elif qgs_storage_type == "database":
-            doc, project_path = read_from_database(uri, self.project_registry)
-        elif qgs_storage_type == "http":
-            doc, project_path = read_from_http(uri, cache_folder)
-        else:
-            self.log(f"Unrecognized project type: {uri}")
+            return uri
+
+        if uri not in self.localPaths:
+            if qgs_storage_type == "database":
+                local_path = download_from_database(
+                    uri,
+                    self.project_registry,
+                    cache_folder,
+                    self.pg_metadata.last_modified(uri, self.project_registry),
+                )
+            elif qgs_storage_type == "http":
+                local_path = download_from_http(uri, cache_folder)
+            else:
+                raise ValueError(f"Unrecognized project type: {uri}")
+
+            self.localPaths[uri] = str(local_path)
+
+        return self.localPaths[uri]
+
+    def readProjectSummary(self, uri, timings=None):
+        """Read the summary used to build the menu of a project.
+
+        The summary is read from the plugin cache when the project didn't change \
+        since it was stored, otherwise the project is parsed again. This doesn't \
+        change the plugin state, so it can run in a background task.
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :param timings: If given, fetch and parse durations are added to it.
+        :type timings: dict
+
+        :return: The project summary.
+        :rtype: dict
+        """
+        if uri in self.manifest:
+            if timings is not None:
+                timings.setdefault("cached", True)
+            return self.manifest[uri]
+
+        start = time.perf_counter()
+        qgs_storage_type = guess_type_from_uri(uri)
+        local_path = self.fetchProject(uri)
+        fetched = time.perf_counter()
+
+        fingerprint = project_fingerprint(local_path, qgs_storage_type)
+        summary = self.menu_cache.get(uri, fingerprint)
+        cached = summary is not None
+
+        if summary is None:
+            # maplayer XML collected in the same pass
+            fragments = dict()
+            summary = extract_project_summary(
+                local_path, uri, uri if qgs_storage_type == "file" else None, fragments
+            )
+            # identifies this version of the project, for memoized menu
+            # decorations and the stored maplayer XML (also when offline)
+            summary["fingerprint"] = fingerprint
+            self.menu_cache.put(uri, fingerprint, summary)
+            # layers are then loaded from the menus without reading the project
+            self.menu_cache.put_layers(
+                uri, fingerprint, resolve_layer_fragments(fragments, summary)
+            )
+
+        summary["fingerprint"] = fingerprint
+
+        if timings is not None:
+            timings["fetch"] = timings.get("fetch", 0) + fetched - start
+            timings["parse"] = timings.get("parse", 0) + time.perf_counter() - fetched
+            timings["cached"] = timings.get("cached", True) and cached
+
+        return summary
+
+    def checkProject(self, task, uri):
+        """Check that a project can be read, for the configuration dialog.
+
+        Neither the plugin state nor its caches are changed: a local project is \
+        parsed unless its cached summary is up to date, a remote project is not \
+        downloaded, only its source is probed. Function run by a background task.
+
+        :param task: The running task.
+        :type task: QgsTask
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :raises Exception: if the project can't be read.
+
+        :return: True
+        :rtype: bool
+        """
+        if uri in self.manifest:
+            return True
+
+        qgs_storage_type = guess_type_from_uri(uri)
+        if qgs_storage_type != "file":
+            if (
+                qgs_storage_type == "database"
+                and self.project_registry.projectStorageFromUri(uri) is None
+            ):
+                raise ValueError("No project storage for {}".format(uri))
+            if not self.sourceProbe.is_reachable(uri):
+                raise IOError("{} can't be reached".format(uri))
+            return True
+
+        fingerprint = project_fingerprint(uri, qgs_storage_type)
+        if self.menu_cache.get(uri, fingerprint) is None:
+            extract_project_summary(uri, uri, uri)
+
+        return True
+
+    def readProjectSummaries(self, task, uri):
+        """Read the summaries of a project and of the projects it embeds.
+
+        Function run by the background task of a project.
+
+        :param task: The running task.
+        :type task: QgsTask
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :return: Summaries read and errors of the embedded projects which can't \
+        be read, by URI, and fetch and parse durations.
+        :rtype: Tuple[dict, dict, dict]
+        """
+        summaries = dict()
+        failures = dict()
+        timings = dict()
+        to_read = [uri]
+        while to_read and not task.isCanceled():
+            current = to_read.pop()
+            if current in summaries or current in failures or current in self.summaries:
+                continue
+
+            if current not in self.manifest and not self.sourceProbe.is_reachable(
+                current
+            ):
+                # fail fast, with the menu built the last time
+                snapshot = self.menu_cache.last(current)
+                if snapshot is None:
+                    error = "{} can't be reached and has no menu snapshot".format(
+                        current
+                    )
+                    if current == uri:
+                        raise IOError(error)
+                    failures[current] = error
+                    continue
+                summaries[current] = snapshot
+                timings["offline"] = True
+            else:
+                try:
+                    summaries[current] = self.readProjectSummary(current, timings)
+                except Exception as e:
+                    if current == uri:
+                        raise
+                    # embedded project, reported once when the menus are built
+                    failures[current] = str(e)
+                    continue
+
+            to_read.extend(get_embedded_projects(summaries[current]["tree"]))
+
+        timings["embedded_projects"] = len(summaries) - 1
+        return summaries, failures, timings
+
+    def getProjectSummary(self, uri):
+        """Return the summary used to build the menu of a project.
+
+        :param uri: The project URI.
+        :type uri: basestring
 
-        # store doc into the plugin registry
-        self.docs[project_path] = doc
+        :return: The project summary.
+        :rtype: dict
+        """
+        if uri not in self.summaries:
+            self.summaries[uri] = self.readProjectSummary(uri)
 
-        return doc, project_path
+        return self.summaries[uri]
 
     def getMapLayerDomFromQgs(self, fileName, layerId):
-        """Return the maplayer node in a project filepath given a maplayer ID.
+        """Return the maplayer node in a project given a maplayer ID, with its \
+        relative datasource resolved.
 
-        :param fileName: The project filepath on the filesystem.
+        The maplayer XML of the project is kept in memory, see \
+        readLayerFragments.
+
+        :param fileName: The project URI.
         :type fileName: basestring
 
         :param layerId: The layer ID to look for in the project.
         :type layerId: basestring
 
-        :return: The XML node of the layer.
+        :return: The XML node of the layer, None if not found.
         :rtype: QDomNode
         """
-        doc, _ = self.getQgsDoc(fileName)
-        return getFirstChildByTagNameValue(
-            doc.documentElement(), "maplayer", "id", layerId
+        fragments = self.layerFragments.get(fileName)
+        if fragments is None:
+            fragments = self.readLayerFragments(fileName)
+            self.layerFragments.put(fileName, fragments)
+
+        fragment = fragments.get(layerId)
+        if fragment is None:
+            return None
+
+        doc = QDomDocument()
+        doc.setContent(fragment)
+        return doc.documentElement()
+
+    def readLayerFragments(self, fileName):
+        """Return the maplayer XML of a project, from the plugin cache if it was \
+        stored from the version of the project the menu was built from (which may \
+        come from the manifest) or from its current version, else from the project.
+
+        :param fileName: The project URI.
+        :type fileName: basestring
+
+        :return: The maplayer XML, by layer id.
+        :rtype: dict
+        """
+        fingerprint = self.getProjectSummary(fileName).get("fingerprint")
+        if fingerprint is not None:
+            fragments = self.menu_cache.get_layers(fileName, fingerprint)
+            if fragments is not None:
+                return fragments
+
+        local_path = self.fetchProject(fileName)
+        current = project_fingerprint(local_path, guess_type_from_uri(fileName))
+        if current != fingerprint:
+            fragments = self.menu_cache.get_layers(fileName, current)
+            if fragments is not None:
+                return fragments
+
+        fragments = prepare_layer_fragments(
+            local_path, self.getProjectSummary(fileName)
         )
+        self.menu_cache.put_layers(fileName, current, fragments)
+
+        return fragments
 
     def initMenus(self):
-        menuBar = self.iface.editMenu().parentWidget()
-        for action in self.menubarActions:
-            menuBar.removeAction(action)
-            del action
+        """Build every menu from scratch."""
+        for group in self.menuGroups:
+            self.removeMenuGroup(group)
+
+        # projects may have changed since the last build
+        self.cancelProjectTasks()
+        self.layerFragments.clear()
+        self.summaries = dict()
+        self.layerDecorations = dict()
+        self.embeddedResolver.clear()
+        self.localPaths = dict()
+        self.pg_metadata.clear()
+        self.timingReport.start()
+        self.readManifest()
+        self.menuOptions = self.currentMenuOptions()
+        self.offlineProjects = set()
+        self.retryTimer.stop()
+        self.sourceProbe.clear()
+        self.sourceProbe.start(
+            [p["file"] for p in self.projects if p["file"] not in self.manifest]
+        )
 
-        self.menubarActions = []
+        # menus are created right now, in the configured order, and filled
+        # as soon as their project is loaded
+        self.menuGroups = self.splitMenuGroups(self.projects)
+        for group in self.menuGroups:
+            self.addMenuGroup(group)
+
+        self.startProjectTasks()
+
+    def currentMenuOptions(self):
+        """Return the options used to build the menus: when one of them changes, \
+        every menu is built again."""
+        return (
+            self.optionTooltip,
+            self.optionCreateGroup,
+            self.optionLoadAll,
+            self.optionLazyMenus,
+            self.manifestPath,
+        )
 
-        menuBar = self.iface.addLayerMenu()
-        for action in self.layerMenubarActions:
-            menuBar.removeAction(action)
-            del action
+    @staticmethod
+    def splitMenuGroups(projects):
+        """Split the configured projects by menu: a project followed by the \
+        projects merged in its menu.
 
-        self.layerMenubarActions = []
+        :param projects: The configured projects.
+        :type projects: list
 
-        QgsApplication.setOverrideCursor(Qt.WaitCursor)
-        previous = None
-        for project in self.projects:
+        :return: The menu groups, with their projects, menu and placeholders.
+        :rtype: list
+        """
+        groups = []
+        for project in projects:
+            if project["location"] == "merge" and groups:
+                groups[-1]["projects"].append(project)
+            else:
+                groups.append({"projects": [project], "menu": None, "placeholders": []})
+
+        return groups
+
+    @staticmethod
+    def menuGroupKey(group):
+        return tuple(
+            (project["file"], project["name"], project["location"])
+            for project in group["projects"]
+        )
+
+    def menuGroupFiles(self, group):
+        """Return the projects of a menu group, embedded projects included.
+
+        :param group: The menu group.
+        :type group: dict
+
+        :return: The project URIs.
+        :rtype: set
+        """
+        files = set()
+        toRead = [project["file"] for project in group["projects"]]
+        while toRead:
+            uri = toRead.pop()
+            if uri in files:
+                continue
+            files.add(uri)
+            if uri in self.summaries:
+                toRead.extend(get_embedded_projects(self.summaries[uri]["tree"]))
+
+        return files
+
+    def addMenuGroup(self, group, before=None):
+        """Create the menu of a group of projects, and queue its projects.
+
+        :param group: The menu group.
+        :type group: dict
+
+        :param before: The menu bar action to insert the menu before.
+        :type before: QAction
+        """
+        menu = None
+        for project in group["projects"]:
             try:
                 project["valid"] = True
-                uri = project["file"]
-                doc, path = self.getQgsDoc(uri)
-                previous = self.addMenu(
-                    project["name"], uri, path, doc, project["location"], previous
+                menu, placeholders = self.addMenu(
+                    project["name"], project["file"], project["location"], menu, before
                 )
+                group["placeholders"].append(placeholders)
+                self.pendingProjects.append((project, menu, placeholders))
             except Exception as e:
                 project["valid"] = False
-                self.log("Menu from layer: Invalid {}".format(uri))
+                self.log("Menu from layer: Invalid {}".format(project["file"]))
                 for m in e.args:
                     self.log(m)
 
-        QgsApplication.restoreOverrideCursor()
+        group["menu"] = menu
+
+    def removeMenuGroup(self, group):
+        """Remove the menu of a group of projects, and forget its tasks.
+
+        :param group: The menu group.
+        :type group: dict
+        """
+        ids = {id(placeholders) for placeholders in group["placeholders"]}
+        self.pendingProjects = deque(
+            pending for pending in self.pendingProjects if id(pending[2]) not in ids
+        )
+        for key, task in self.projectTasks.items():
+            if key[2] in ids:
+                self.staleTasks.add(key)
+                task.cancel()
+
+        if group["menu"] is None:
+            return
+
+        action = group["menu"].menuAction()
+        for menuBar, actions in (
+            (self.iface.editMenu().parentWidget(), self.menubarActions),
+            (self.iface.addLayerMenu(), self.layerMenubarActions),
+        ):
+            if action in actions:
+                menuBar.removeAction(action)
+                actions.remove(action)
+
+    def updateMenus(self, changedFiles=None):
+        """Rebuild only the menus whose projects were added, removed, moved or \
+        changed. Other menus are left untouched.
+
+        :param changedFiles: The project files changed on disk.
+        :type changedFiles: set
+        """
+        changedFiles = changedFiles or set()
+        if self.currentMenuOptions() != self.menuOptions:
+            self.initMenus()
+            return
+
+        oldGroups = dict()
+        for group in self.menuGroups:
+            oldGroups.setdefault(self.menuGroupKey(group), []).append(group)
+
+        newGroups = self.splitMenuGroups(self.projects)
+        kept = []
+        keptGroups = set()
+        for group in newGroups:
+            candidates = oldGroups.get(self.menuGroupKey(group))
+            if candidates and not (self.menuGroupFiles(candidates[0]) & changedFiles):
+                old = candidates.pop(0)
+                for project, oldProject in zip(group["projects"], old["projects"]):
+                    project["valid"] = oldProject.get("valid", True)
+                group.update(menu=old["menu"], placeholders=old["placeholders"])
+                kept.append(self.menuGroups.index(old))
+                keptGroups.add(id(group))
+
+        # kept menus moved relative to each other: build everything again
+        if kept != sorted(kept):
+            self.initMenus()
+            return
+
+        keptIndexes = set(kept)
+        for i, group in enumerate(self.menuGroups):
+            if i not in keptIndexes:
+                self.removeMenuGroup(group)
+
+        self.offlineProjects -= changedFiles
+        for uri in changedFiles:
+            self.summaries.pop(uri, None)
+            self.localPaths.pop(uri, None)
+            self.layerFragments.remove(uri)
+        self.embeddedResolver.clear(changedFiles)
+
+        self.timingReport.start()
+        for i, group in enumerate(newGroups):
+            if id(group) in keptGroups:
+                continue
+
+            # insert it before the next kept menu of the same menu bar
+            before = None
+            for following in newGroups[i + 1 :]:
+                if (
+                    id(following) in keptGroups
+                    and following["menu"] is not None
+                    and following["projects"][0]["location"]
+                    == group["projects"][0]["location"]
+                ):
+                    before = following["menu"].menuAction()
+                    break
+            self.addMenuGroup(group, before)
+
+        self.menuGroups = newGroups
+        self.startProjectTasks()
+        self.watchProjects()
+
+    def watchProjects(self):
+        """Watch the project files the menus are built from, embedded projects \
+        included."""
+        if self.projectWatcher is None:
+            return
+
+        files = set()
+        for group in self.menuGroups:
+            files.update(
+                uri
+                for uri in self.menuGroupFiles(group)
+                if guess_type_from_uri(uri) == "file"
+                and uri not in self.manifest
+                and self.sourceProbe.is_reachable(uri, wait=False)
+            )
+
+        watched = set(self.projectWatcher.files())
+        if watched - files:
+            self.projectWatcher.removePaths(list(watched - files))
+        toWatch = [uri for uri in files - watched if os.path.isfile(uri)]
+        if toWatch:
+            self.projectWatcher.addPaths(toWatch)
+
+    def onProjectFileChanged(self, path):
+        """Rebuild the menus of a changed project once it is stable.
+
+        :param path: The project file.
+        :type path: basestring
+        """
+        self.changedFiles.add(path)
+        # files saved by replacement are no longer watched
+        if os.path.isfile(path) and path not in self.projectWatcher.files():
+            self.projectWatcher.addPath(path)
+        self.watchTimer.start()
+
+    def onWatchTimeout(self):
+        changedFiles = self.changedFiles
+        self.changedFiles = set()
+        self.log(
+            "Projects changed, menus updated: {}".format(
+                ", ".join(sorted(changedFiles))
+            ),
+            log_level=Qgis.Info,
+        )
+        self.updateMenus(changedFiles)
+
+    def readManifest(self):
+        """Read the menu manifest, if one is configured. Projects it holds are not \
+        read to build the menus, only when a layer is loaded."""
+        self.manifest = dict()
+        if not self.manifestPath:
+            return
+
+        try:
+            self.manifest = read_manifest(self.manifestPath)
+        except Exception as e:
+            self.log("Menu manifest {} not read: {}".format(self.manifestPath, e))
+
+    def startProjectTasks(self):
+        """Start the background tasks of the pending projects, keeping at most \
+        max_parallel_projects tasks running."""
+        while self.pendingProjects and (
+            len(self.projectTasks) < self.max_parallel_projects
+        ):
+            project, menu, placeholders = self.pendingProjects.popleft()
+            key = (self.menusGeneration, project["file"], id(placeholders))
+            task = QgsTask.fromFunction(
+                self.tr("Loading menu {}").format(project["file"]),
+                self.readProjectSummaries,
+                project["file"],
+                on_finished=lambda exception, result=None, key=key, p=project, m=menu, ph=placeholders, t=time.perf_counter(): self.onProjectLoaded(
+                    key, p, m, ph, exception, result, t
+                ),
+            )
+            self.projectTasks[key] = task
+            QgsApplication.taskManager().addTask(task)
+
+    def cancelProjectTasks(self):
+        """Forget the pending projects and cancel the running tasks."""
+        self.menusGeneration += 1
+        self.pendingProjects.clear()
+        self.staleTasks.clear()
+        for task in self.projectTasks.values():
+            task.cancel()
+
+    def onProjectLoaded(
+        self, key, project, menu, placeholders, exception, result, started
+    ):
+        """Fill the menu of a project once its background task is finished.
+
+        :param key: The task key in projectTasks.
+        :type key: tuple
+
+        :param project: The configured project.
+        :type project: dict
+
+        :param menu: The project menu.
+        :type menu: QMenu
+
+        :param placeholders: The placeholder actions returned by addMenu.
+        :type placeholders: list
+
+        :param exception: The exception raised by the task, if any.
+        :type exception: Exception
+
+        :param result: The summaries, failures and timings read by the task.
+        :type result: Tuple[dict, dict, dict]
+
+        :param started: When the task has been started (time.perf_counter).
+        :type started: float
+        """
+        del self.projectTasks[key]
+        stale = key in self.staleTasks
+        self.staleTasks.discard(key)
+
+        # menus have been rebuilt (or removed) in the meantime
+        if key[0] == self.menusGeneration and not stale:
+            timings = {"name": project["name"], "location": project["location"]}
+            try:
+                if exception is not None:
+                    raise exception
+                if result is None:
+                    raise Exception("Loading canceled")
+
+                summaries, failures, readTimings = result
+                timings.update(readTimings)
+                for uri, summary in summaries.items():
+                    self.summaries.setdefault(uri, summary)
+                for uri, error in failures.items():
+                    if uri not in self.summaries:
+                        self.embeddedResolver.fail(uri, error)
+
+                summary = self.summaries[project["file"]]
+                start = time.perf_counter()
+                self.fillMenu(
+                    project, summary, menu, placeholders, timings.get("offline")
+                )
+                timings["build"] = time.perf_counter() - start
+                if timings.get("offline"):
+                    self.offlineProjects.add(project["file"])
+
+                counts = count_tree_nodes(summary["tree"])
+                timings["layers"] = counts.get("layer", 0)
+                timings["groups"] = counts.get("group", 0)
+            except Exception as e:
+                project["valid"] = False
+                timings["error"] = str(e)
+                self.log("Menu from layer: Invalid {}".format(project["file"]))
+                for m in e.args:
+                    self.log(m)
+
+                for action in placeholders:
+                    menu.removeAction(action)
+
+                # never built, but it may come back
+                if not self.sourceProbe.is_reachable(project["file"], wait=False):
+                    self.offlineProjects.add(project["file"])
+
+            # an empty menu (the only project of the menu is invalid) is hidden
+            menu.menuAction().setVisible(not menu.isEmpty())
+
+            timings["total"] = time.perf_counter() - started
+            self.timingReport.add_project(project["file"], **timings)
+
+        self.startProjectTasks()
+
+        if key[0] == self.menusGeneration and not self.projectTasks:
+            self.publishTimingReport()
+            self.watchProjects()
+            if self.offlineProjects and not self.retryTimer.isActive():
+                self.retryTimer.start()
+
+    def onRetryTimeout(self):
+        """Probe the sources of the offline projects again, in a background task."""
+        if not self.offlineProjects or self.retryTask is not None:
+            return
+
+        # sources still reachable keep their projects watched
+        self.sourceProbe.clear_unreachable()
+        self.retryTask = QgsTask.fromFunction(
+            self.tr("Checking offline projects"),
+            self.probeProjects,
+            list(self.offlineProjects),
+            on_finished=self.onOfflineProbed,
+        )
+        QgsApplication.taskManager().addTask(self.retryTask)
+
+    def probeProjects(self, task, uris):
+        """Return the projects whose source can be reached.
+
+        :param task: The running task.
+        :type task: QgsTask
+
+        :param uris: The project URIs.
+        :type uris: list
+
+        :return: The reachable project URIs.
+        :rtype: set
+        """
+        self.sourceProbe.start(uris)
+        return {uri for uri in uris if self.sourceProbe.is_reachable(uri)}
+
+    def onOfflineProbed(self, exception, result=None):
+        """Rebuild the menus of the projects which are back online."""
+        self.retryTask = None
+        if not result:
+            return
+
+        result &= self.offlineProjects
+        self.offlineProjects -= result
+        if not self.offlineProjects:
+            self.retryTimer.stop()
+        if result:
+            self.log(
+                "Projects back online: {}".format(", ".join(sorted(result))),
+                log_level=Qgis.Info,
+            )
+            self.updateMenus(result)
+
+    def publishTimingReport(self):
+        """Log the timings of the projects, the slowest first. The report is \
+        written on unload, or from the "Timing report" menu item."""
+        report = self.timingReport.to_dict()
+        self.log(
+            "Menus built in {:.3f}s (sum of project times)".format(report["total"]),
+            log_level=Qgis.Info,
+        )
+        for line in self.timingReport.summary_lines():
+            self.log(line, log_level=Qgis.Info)
+
+    def openTimingReport(self):
+        """Write the timing report in the profile folder, and open it."""
+        self.timingReport.write()
+        QDesktopServices.openUrl(
+            QUrl.fromLocalFile(str(self.timingReport.report_path))
+        )
 
     def initGui(self):
         if self.is_setup_visible:
@@ -640,9 +1506,28 @@ class MenuFromProject:
                 lambda: showPluginHelp(filename="doc/index")
             )
 
+            # menu item - Timing report
+            self.action_timing_report = QAction(
+                self.tr("Timing report"), self.iface.mainWindow()
+            )
+            self.iface.addPluginToMenu("&" + __title__, self.action_timing_report)
+            self.action_timing_report.triggered.connect(self.openTimingReport)
+
         self.iface.initializationCompleted.connect(self.on_initializationCompleted)
 
     def unload(self):
+        self.unloaded = True
+        self.cancelProjectTasks()
+        self.retryTimer.stop()
+        if self.retryTask is not None:
+            self.retryTask.cancel()
+        if self.projectWatcher is not None:
+            self.watchTimer.stop()
+            self.projectWatcher.fileChanged.disconnect(self.onProjectFileChanged)
+            self.projectWatcher = None
+        for task in self.layerTasks:
+            task.cancel()
+
         menuBar = self.iface.editMenu().parentWidget()
         for action in self.menubarActions:
             menuBar.removeAction(action)
@@ -656,11 +1541,13 @@ class MenuFromProject:
                 "&" + __title__, self.action_project_configuration
             )
             self.iface.removePluginMenu("&" + __title__, self.action_menu_help)
+            self.iface.removePluginMenu("&" + __title__, self.action_timing_report)
             self.action_project_configuration.triggered.disconnect(
                 self.open_projects_config
             )
 
         self.store()
+        self.timingReport.write()
 
     def open_projects_config(self):
         dlg = MenuConfDialog(self.iface.mainWindow(), self)
@@ -671,70 +1558,112 @@ class MenuFromProject:
         del dlg
 
         if result != 0:
-            self.initMenus()
+            self.updateMenus()
 
-    def addLayer(self, uri, fileName, layerId, group=None, visible=False, expanded=False):
-        theLayer = None
+    def prepareLayerNode(self, fileName, layerId):
+        """Return a copy of a maplayer node, ready to be read: with a new id and \
+        its relative datasource resolved.
 
-        # read QGIS project
-        doc, _ = self.getQgsDoc(fileName)
+        :param fileName: The URI of the project holding the layer.
+        :type fileName: basestring
+
+        :param layerId: The layer ID to look for in the project.
+        :type layerId: basestring
 
-        # is project in relative path ?
-        absolute = is_absolute(doc)
-        trusted = project_trusted(doc)
+        :return: The maplayer node and its new id, (None, None) if not found.
+        :rtype: Tuple[QDomNode, basestring]
+        """
+        node = self.getMapLayerDomFromQgs(fileName, layerId)
+        if node is None:
+            return None, None
 
-        node = getFirstChildByTagNameValue(
-            doc.documentElement(), "maplayer", "id", layerId
-        )
         node = node.cloneNode()
-        if node:
-            idNode = node.namedItem("id")
-            layerType = node.toElement().attribute("type", "vector")
-            # give it a new id (for multiple import)
-            newLayerId = "L%s" % re.sub(
-                "[{}-]", "", QUuid.createUuid().toString()
-            )
+        idNode = node.namedItem("id")
+        # give it a new id (for multiple import)
+        newLayerId = "L%s" % re.sub("[{}-]", "", QUuid.createUuid().toString())
+        try:
+            idNode.firstChild().toText().setData(newLayerId)
+        except Exception:
+            pass
+
+        return node, newLayerId
+
+    def createLayer(self, node, trusted):
+        """Create a layer from a maplayer node, without adding it to the project.
+
+        :param node: The maplayer node, see prepareLayerNode.
+        :type node: QDomNode
+
+        :param trusted: True if the project is trusted (extent read from XML).
+        :type trusted: bool
+
+        :return: The layer.
+        :rtype: QgsMapLayer
+        """
+        if node.toElement().attribute("type", "vector") == "raster":
+            theLayer = QgsRasterLayer()
+        else:
+            theLayer = QgsVectorLayer()
+            theLayer.setReadExtentFromXml(trusted)
+
+        theLayer.readLayerXml(node.toElement(), QgsReadWriteContext())
+
+        return theLayer
+
+    def loadDbStyle(self, layer):
+        """Special process if the plugin "DB Style Manager" is installed.
+
+        :param layer: The layer to style.
+        :type layer: QgsMapLayer
+        """
+        flag = "use_db_style_manager_in_custom_menu" in os.environ
+        if flag and "db-style-manager" in plugins:
             try:
-                idNode.firstChild().toText().setData(newLayerId)
+                plugins["db-style-manager"].load_style_from_database(layer)
             except Exception:
-                pass
+                self.log("DB-Style-Manager failed to load the style.")
 
-            # if relative path, adapt datasource
-            if not absolute:
-                try:
-                    datasourceNode = node.namedItem("datasource")
-                    ds = datasourceNode.firstChild().toText().data()
-                    providerNode = node.namedItem("provider")
-                    provider = providerNode.firstChild().toText().data()
-
-                    if provider in ["ogr", "gdal"] and (ds.find(".") == 0):
-                        projectpath = QFileInfo(uri).path()
-                        newlayerpath = projectpath + "/" + ds
-                        datasourceNode.firstChild().toText().setData(
-                            newlayerpath
-                        )
-                except Exception:
-                    pass
+    def buildLayers(self, task, items):
+        """Create layers from serialized maplayer nodes, in a background task.
 
-            # read modified layer node
-            if self.optionCreateGroup and group is not None:
-                if layerType == "raster":
-                    theLayer = QgsRasterLayer()
-                else:
-                    theLayer = QgsVectorLayer()
-                    theLayer.setReadExtentFromXml(trusted)
+        Layers (and their data providers) are created in the task thread, then \
+        moved to the main thread so they can be added to the project.
 
-                theLayer.readLayerXml(node.toElement(), QgsReadWriteContext())
+        :param task: The running task.
+        :type task: QgsTask
 
-                # Special process if the plugin "DB Style Manager" is installed
-                flag = "use_db_style_manager_in_custom_menu" in os.environ
-                if flag and "db-style-manager" in plugins:
-                    try:
-                        plugins["db-style-manager"].load_style_from_database(
-                            theLayer
-                        )
-                    except Exception:
-                        self.log("DB-Style-Manager failed to load the style.")
+        :param items: Tuples (index, maplayer node XML, trusted).
+        :type items: list
+
+        :return: Tuples (index, layer or None, error message or None).
+        :rtype: list
+        """
+        mainThread = QgsApplication.instance().thread()
+        layers = []
+        for index, xml, trusted in items:
+            if task.isCanceled():
+                break
+
+            try:
+                doc = QDomDocument()
+                doc.setContent(xml)
+                layer = self.createLayer(doc.documentElement(), trusted)
+                layer.moveToThread(mainThread)
+                layers.append((index, layer, None))
+            except Exception as e:
+                layers.append((index, None, str(e)))
+
+        return layers
+
+    def addLayer(self, uri, fileName, layerId, group=None, visible=False, expanded=False):
+        node, newLayerId = self.prepareLayerNode(fileName, layerId)
+        if node:
+            # read modified layer node
+            if self.optionCreateGroup and group is not None:
+                theLayer = self.createLayer(
+                    node, self.getProjectSummary(fileName)["trusted"]
+                )
+                self.loadDbStyle(theLayer)
 
                 # needed
                 QgsProject.instance().addMapLayer(theLayer, False)
@@ -745,7 +1674,7 @@ class MenuFromProject:
                 treeNode.setItemVisibilityChecked(visible)
             else:
                 # create layer
-                theLayer = QgsProject.instance().readLayer(node)
+                QgsProject.instance().readLayer(node)
 
             return QgsProject.instance().mapLayer(newLayerId)
 
@@ -754,8 +1683,58 @@ class MenuFromProject:
 
         return None
 
+    def addJoinedLayers(self, uri, fileName, layer, group=None):
+        """Add the layers joined to a layer, and join them to it.
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :param fileName: The URI of the project holding the layer.
+        :type fileName: basestring
+
+        :param layer: The layer, whose joins refer to layer ids in the project.
+        :type layer: QgsMapLayer
+
+        :param group: The layer tree group to add joined layers to.
+        :type group: QgsLayerTreeGroup
+        """
+        if not isinstance(layer, QgsVectorLayer):
+            return
+
+        for j in layer.vectorJoins():
+            try:
+                joinLayer = self.addLayer(uri, fileName, j.joinLayerId(), group)
+                if joinLayer:
+                    j.setJoinLayerId(joinLayer.id())
+                    j.setJoinLayer(joinLayer)
+                    layer.addJoin(j)
+            except Exception:
+                self.log("Joined layer {} not added.".format(j.joinLayerId()))
+
+    def menuGroup(self, menu):
+        """Return the layer tree group matching a menu, when layers are loaded in \
+        groups. It is created if needed.
+
+        :param menu: The menu the layers are loaded from.
+        :type menu: QMenu
+
+        :return: The group, None if layers are not loaded in groups.
+        :rtype: QgsLayerTreeGroup
+        """
+        if not (
+            isinstance(menu.parentWidget(), (QMenu, QWidget)) and self.optionCreateGroup
+        ):
+            return None
+
+        groupName = menu.title().replace("&", "")
+        group = QgsProject.instance().layerTreeRoot().findGroup(groupName)
+        if group is None:
+            group = QgsProject.instance().layerTreeRoot().addGroup(groupName)
+
+        return group
+
     def loadLayer(self, uri, fileName, layerId, menu=None, visible=None, expanded=None):
-        """Load the chosen layer(s)
+        """Load the chosen layer
 
         :param uri: The layer URI (file path or PG URI)
         :type uri: basestring
@@ -764,49 +1743,249 @@ class MenuFromProject:
         :type layerId: basestring
 
         """
+        started = time.perf_counter()
         self.canvas.freeze(True)
         self.canvas.setRenderFlag(False)
-        group = None
         QgsApplication.setOverrideCursor(Qt.WaitCursor)
 
         try:
-            if (
-                isinstance(menu.parentWidget(), (QMenu, QWidget))
-                and self.optionCreateGroup
-            ):
-                groupName = menu.title().replace("&", "")
-                group = QgsProject.instance().layerTreeRoot().findGroup(groupName)
-                if group is None:
-                    group = QgsProject.instance().layerTreeRoot().addGroup(groupName)
-
-            # load all layers
-            if fileName is None and layerId is None and self.optionLoadAll:
-                for action in menu.actions():
-                    if (
-                        action.text() != self.tr("Load all")
-                        and action.text() != "Load all"
-                    ):
-                        action.trigger()
-            else:
-                layer = self.addLayer(uri, fileName, layerId, group, visible, expanded)
-
-                # is joined layers exists ?
-                if layer:
-                    for j in layer.vectorJoins():
-                        try:
-                            joinLayer = self.addLayer(uri, fileName, j.joinLayerId(), group)
-                            if joinLayer:
-                                j.setJoinLayerId(joinLayer.id())
-                                j.setJoinLayer(joinLayer)
-                                layer.addJoin(j)
-                        except Exception as e:
-                            self.log("Joined layer {} not added.".format(j.joinLayerId()))
-                            pass
+            group = self.menuGroup(menu)
+            layer = self.addLayer(uri, fileName, layerId, group, visible, expanded)
+
+            # is joined layers exists ?
+            if layer:
+                self.addJoinedLayers(uri, fileName, layer, group)
+
+        except Exception as e:
+            for m in e.args:
+                self.log(m)
+
+        self.canvas.freeze(False)
+        self.canvas.setRenderFlag(True)
+        self.canvas.refresh()
+        QgsApplication.restoreOverrideCursor()
+
+        self.addLoadTiming(uri, layerId, 1, started)
+
+    def addLoadTiming(self, uri, layer, layerCount, started):
+        """Log the duration of a layer load and add it to the timing report.
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :param layer: The layer ID, or the group name for "Load all".
+        :type layer: basestring
+
+        :param layerCount: The number of layers loaded.
+        :type layerCount: int
+
+        :param started: When the load has been started (time.perf_counter).
+        :type started: float
+        """
+        duration = time.perf_counter() - started
+        self.log(
+            "{} ({} layers) loaded from {} in {:.3f}s".format(
+                layer, layerCount, uri, duration
+            ),
+            log_level=Qgis.Info,
+        )
+        # kept in memory, written on unload or on demand
+        self.timingReport.add_load(uri, layer, layerCount, duration)
+
+    def loadAllLayers(self, uri, summary, node, menu):
+        """Load all the layers of a group at once ("Load all" item).
+
+        Layers are created first (in background tasks if optionParallelLoad is \
+        set), then registered with a single addMapLayers call and inserted in the \
+        layer tree group in one go. The canvas is only refreshed at the end.
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :param summary: The project summary the group comes from.
+        :type summary: dict
+
+        :param node: The group node.
+        :type node: dict
+
+        :param menu: The group sub-menu.
+        :type menu: QMenu
+        """
+        started = time.perf_counter()
+        self.canvas.freeze(True)
+        self.canvas.setRenderFlag(False)
+        QgsApplication.setOverrideCursor(Qt.WaitCursor)
+
+        group = None
+        prepared = []
+        try:
+            group = self.menuGroup(menu)
+            for child in node["children"]:
+                if child["type"] != "layer":
+                    continue
+
+                fileName = summary["uri"]
+                if child["embedded"]:
+                    fileName = child["embedded_project"]
+                    if not fileName:
+                        continue
+
+                try:
+                    layerNode, _ = self.prepareLayerNode(fileName, child["id"])
+                    if not layerNode:
+                        self.log("{} not found".format(child["id"]))
+                        continue
+
+                    layerType = layerNode.toElement().attribute("type", "vector")
+                    if group is None and layerType not in ("vector", "raster"):
+                        # let the project read other layer types (mesh...)
+                        QgsProject.instance().readLayer(layerNode)
+                        continue
+
+                    trusted = self.getProjectSummary(fileName)["trusted"]
+                    prepared.append((layerNode, fileName, child, trusted))
+                except Exception as e:
+                    for m in e.args:
+                        self.log(m)
+
+        except Exception as e:
+            for m in e.args:
+                self.log(m)
+
+        if self.optionParallelLoad and len(prepared) > 1:
+            self.startLayerTasks(uri, group, prepared, node["name"], started)
+            return
+
+        loaded = []
+        for layerNode, fileName, child, trusted in prepared:
+            try:
+                loaded.append((self.createLayer(layerNode, trusted), fileName, child))
+            except Exception as e:
+                for m in e.args:
+                    self.log(m)
+
+        self.addLoadedLayers(uri, group, loaded, node["name"], started)
+
+    def startLayerTasks(self, uri, group, prepared, name, started):
+        """Create the layers of a batch in at most max_parallel_layers background \
+        tasks, then add them to the project once all tasks are finished.
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :param group: The layer tree group, None to add layers to the root.
+        :type group: QgsLayerTreeGroup
+
+        :param prepared: Tuples (maplayer node, fileName, layer node, trusted).
+        :type prepared: list
+
+        :param name: The group name, for the timing report.
+        :type name: basestring
+
+        :param started: When the load has been started (time.perf_counter).
+        :type started: float
+        """
+        # DOM nodes are not thread safe: tasks get their own copy as text
+        items = []
+        for index, (layerNode, _, _, trusted) in enumerate(prepared):
+            doc = QDomDocument()
+            doc.appendChild(doc.importNode(layerNode, True))
+            items.append((index, doc.toString(), trusted))
+
+        taskCount = min(self.max_parallel_layers, len(items))
+        batch = LayerBatch(name, started, pending=taskCount)
+        for i in range(taskCount):
+            task = QgsTask.fromFunction(
+                self.tr("Loading layers"),
+                self.buildLayers,
+                items[i::taskCount],
+                on_finished=lambda exception, result=None, b=batch, i=i: self.onLayersBuilt(
+                    uri, group, prepared, b, i, exception, result
+                ),
+            )
+            batch.tasks[i] = task
+            self.layerTasks.append(task)
+            QgsApplication.taskManager().addTask(task)
+
+    def onLayersBuilt(self, uri, group, prepared, batch, i, exception, result):
+        """Collect the layers built by a task, and add the whole batch to the \
+        project when it is the last one.
+
+        :param batch: The batch state, shared by its tasks.
+        :type batch: LayerBatch
+
+        :param i: The task index in the batch.
+        :type i: int
+
+        :param exception: The exception raised by the task, if any.
+        :type exception: Exception
+
+        :param result: The layers built by the task, see buildLayers.
+        :type result: list
+        """
+        self.layerTasks.remove(batch.tasks.pop(i))
+        # the plugin has been unloaded in the meantime
+        if self.unloaded:
+            return
+
+        if exception is not None:
+            self.log("Layers not loaded: {}".format(exception))
+        batch.results.extend(result or [])
+
+        batch.pending -= 1
+        if batch.pending:
+            return
+
+        loaded = []
+        for index, layer, error in sorted(batch.results, key=lambda r: r[0]):
+            _, fileName, child, _ = prepared[index]
+            if layer is None:
+                self.log("{} not loaded: {}".format(child["name"], error))
+                continue
+            if not layer.isValid():
+                self.log("{} is not valid".format(child["name"]))
+            loaded.append((layer, fileName, child))
+
+        self.addLoadedLayers(uri, group, loaded, batch.name, batch.started)
+
+    def addLoadedLayers(self, uri, group, loaded, name, started):
+        """Add a batch of created layers to the project, then refresh the canvas.
+
+        :param uri: The project URI.
+        :type uri: basestring
+
+        :param group: The layer tree group, None to add layers to the root.
+        :type group: QgsLayerTreeGroup
+
+        :param loaded: Tuples (layer, fileName, layer node).
+        :type loaded: list
+
+        :param name: The group name, for the timing report.
+        :type name: basestring
+
+        :param started: When the load has been started (time.perf_counter).
+        :type started: float
+        """
+        try:
+            for layer, _, _ in loaded:
+                self.loadDbStyle(layer)
+
+            layers = [layer for layer, _, _ in loaded]
+            QgsProject.instance().addMapLayers(layers, group is None)
+
+            if group is not None:
+                treeNodes = []
+                for layer, _, child in loaded:
+                    treeNode = QgsLayerTreeLayer(layer)
+                    treeNode.setExpanded(child["expanded"])
+                    treeNode.setItemVisibilityChecked(child["visible"])
+                    treeNodes.append(treeNode)
+                group.insertChildNodes(-1, treeNodes)
+
+            for layer, fileName, _ in loaded:
+                self.addJoinedLayers(uri, fileName, layer, group)
 
         except Exception as e:
-            # fixme fileName is not defined
-            # self.log(
-            #     'Menu from layer: Invalid ' + (fileName if fileName is not None else ""))
             for m in e.args:
                 self.log(m)
 
@@ -814,3 +1993,5 @@ class MenuFromProject:
         self.canvas.setRenderFlag(True)
         self.canvas.refresh()
         QgsApplication.restoreOverrideCursor()
+
+        self.addLoadTiming(uri, name, len(loaded), started)
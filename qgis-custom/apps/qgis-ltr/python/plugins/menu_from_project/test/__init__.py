@@ -0,0 +1,9 @@
+#! python3  # noqa: E265
+
+"""
+    Tests of the plugin logic.
+
+    Run them with the QGIS Python interpreter, from the plugins folder:
+
+        python -m unittest discover -s menu_from_project/test -t .
+"""
@@ -0,0 +1,67 @@
+#! python3  # noqa: E265
+
+"""
+    HTTP server of the files of a folder, answering conditional requests (ETag and
+    Last-Modified) with 304. Used by the tests, in its own process.
+
+        python conditional_http_server.py folder
+
+    The port is printed on the first line of stdout, the status of each request
+    is appended to folder/requests.log.
+"""
+
+# Standard library
+import hashlib
+import sys
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class ConditionalHandler(BaseHTTPRequestHandler):
+    folder = None
+
+    def do_GET(self):
+        path = self.folder / self.path.lstrip("/")
+        if not path.is_file():
+            self.answer(404)
+            return
+
+        content = path.read_bytes()
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        last_modified = formatdate(path.stat().st_mtime, usegmt=True)
+        if self.headers.get("If-None-Match") == etag:
+            self.answer(304, etag=etag, last_modified=last_modified)
+            return
+
+        self.answer(200, content, etag, last_modified)
+
+    def answer(self, status, content=b"", etag=None, last_modified=None):
+        with (self.folder / "requests.log").open("a") as log:
+            log.write("{}\n".format(status))
+
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    ConditionalHandler.folder = Path(sys.argv[1])
+    server = HTTPServer(("127.0.0.1", 0), ConditionalHandler)
+    print(server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#! python3  # noqa: E265
+
+"""
+    Layer trees nested deeper than the Python recursion limit, or with a very
+    large flat group: their summary is extracted and counted, and their menu is
+    built down to the deepest layer.
+"""
+
+# Standard library
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# PyQGIS
+from qgis.core import QgsSettings
+from qgis.testing import start_app
+from qgis.PyQt.QtWidgets import QMenu
+
+# project
+from menu_from_project.benchmarks.qgis_interface import BenchInterface
+from menu_from_project.benchmarks.synthetic_project import (
+    deep_project_xml,
+    project_xml,
+    write_project,
+)
+from menu_from_project.logic.cache_manager import MenuCache
+from menu_from_project.logic.qgs_manager import (
+    count_tree_nodes,
+    extract_project_summary,
+    get_embedded_projects,
+)
+from menu_from_project.menu_from_project import MenuFromProject
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class TestDeepLayerTree(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        start_app()
+        QgsSettings().setValue("locale/userLocale", "en_US")
+        cls.interface = BenchInterface()
+        cls.plugin = MenuFromProject(cls.interface)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        self.depth = 2 * sys.getrecursionlimit()
+        self.project = str(
+            write_project(
+                self.folder / "deep.qgs", deep_project_xml(self.depth)
+            )
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_extract(self):
+        summary = extract_project_summary(self.project, self.project)
+
+        nodes = summary["tree"]
+        for level in range(self.depth):
+            self.assertEqual(len(nodes), 1)
+            self.assertEqual(nodes[0]["type"], "group")
+            self.assertEqual(nodes[0]["name"], "Level {}".format(level))
+            nodes = nodes[0]["children"]
+        self.assertEqual([node["id"] for node in nodes], ["layer_000000"])
+
+        self.assertEqual(
+            count_tree_nodes(summary["tree"]), {"group": self.depth, "layer": 1}
+        )
+        self.assertEqual(get_embedded_projects(summary["tree"]), set())
+
+    def test_cache(self):
+        summary = extract_project_summary(self.project, self.project)
+        # too deep to be stored as JSON: not cached, but no error
+        MenuCache(self.folder / "cache").put(self.project, "fingerprint", summary)
+
+    def test_build_menu(self):
+        summary = extract_project_summary(self.project, self.project)
+
+        root = QMenu()
+        self.assertTrue(
+            self.plugin.addMenuItem(self.project, summary, summary["tree"], root)
+        )
+        menu = root
+        for level in range(self.depth):
+            self.assertEqual(menu.actions()[0].text(), "&Level {}".format(level))
+            menu = menu.actions()[0].menu()
+        self.assertEqual(menu.actions()[0].text(), "Layer 0")
+
+
+class TestFlatLayerGroup(unittest.TestCase):
+    layer_count = 20000
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        self.project = str(
+            write_project(
+                self.folder / "flat.qgs",
+                project_xml(self.layer_count, group_count=1, style_symbols=0),
+            )
+        )
+
+        # any walk recursing on the nodes fails, well before the last layer
+        self.recursion_limit = sys.getrecursionlimit()
+        self.addCleanup(sys.setrecursionlimit, self.recursion_limit)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_extract_and_count(self):
+        sys.setrecursionlimit(200)
+        summary = extract_project_summary(self.project, self.project)
+        counts = count_tree_nodes(summary["tree"])
+        embedded = get_embedded_projects(summary["tree"])
+        sys.setrecursionlimit(self.recursion_limit)
+
+        self.assertEqual(counts, {"group": 1, "layer": self.layer_count})
+        self.assertEqual(len(summary["layers"]), self.layer_count)
+        self.assertEqual(len(summary["tree"][0]["children"]), self.layer_count)
+        self.assertEqual(embedded, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#! python3  # noqa: E265
+
+"""
+    Download of the projects stored in a database, with a stubbed project storage.
+"""
+
+# Standard library
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+# project
+from menu_from_project.logic.qgs_manager import download_from_database
+
+# ############################################################################
+# ########## Globals ###############
+# ##################################
+
+URI = (
+    "postgresql://user@localhost:5432?sslmode=disable&dbname=gis&schema=public"
+    "&project=test"
+)
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class StubStorage:
+    """QgsProjectStorage stub writing a given content, then returning a given \
+    result (or raising it if it is an exception)."""
+
+    def __init__(self, content: bytes, result=True):
+        self.content = content
+        self.result = result
+        self.reads = 0
+
+    def readProject(self, uri, device, context):
+        self.reads += 1
+        device.write(self.content)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class StubRegistry:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def projectStorageFromUri(self, uri):
+        return self.storage
+
+
+class TestDownloadFromDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_folder = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def download(self, storage, last_modified="2024-01-01T00:00:00"):
+        return download_from_database(
+            URI, StubRegistry(storage), self.cache_folder, last_modified
+        )
+
+    def metadata(self, path: Path) -> dict:
+        with path.with_suffix(".json").open("r", encoding="utf-8") as metadata_file:
+            return json.load(metadata_file)
+
+    def test_download(self):
+        path = self.download(StubStorage(b"first"))
+        self.assertEqual(path.read_bytes(), b"first")
+        self.assertEqual(
+            self.metadata(path)["last_modified_time"], "2024-01-01T00:00:00"
+        )
+
+    def test_unchanged_project_not_downloaded(self):
+        self.download(StubStorage(b"first"))
+        storage = StubStorage(b"second")
+        path = self.download(storage)
+        self.assertEqual(storage.reads, 0)
+        self.assertEqual(path.read_bytes(), b"first")
+
+    def test_changed_project_downloaded(self):
+        self.download(StubStorage(b"first"))
+        path = self.download(StubStorage(b"second"), "2024-02-01T00:00:00")
+        self.assertEqual(path.read_bytes(), b"second")
+        self.assertEqual(
+            self.metadata(path)["last_modified_time"], "2024-02-01T00:00:00"
+        )
+
+    def test_failed_download_keeps_previous_copy(self):
+        self.download(StubStorage(b"first"))
+        for result in (False, RuntimeError("connection lost")):
+            path = self.download(
+                StubStorage(b"partial", result), "2024-02-01T00:00:00"
+            )
+            self.assertEqual(path.read_bytes(), b"first")
+            # not up to date: downloaded again next time
+            self.assertEqual(
+                self.metadata(path)["last_modified_time"], "2024-01-01T00:00:00"
+            )
+
+        self.assertEqual(
+            sorted(p.name for p in (self.cache_folder / "database").iterdir()),
+            sorted([path.name, path.with_suffix(".json").name]),
+        )
+
+    def test_failed_first_download(self):
+        with self.assertRaises(IOError):
+            self.download(StubStorage(b"partial", False))
+        with self.assertRaises(IOError):
+            self.download(None)
+
+        self.assertEqual(list((self.cache_folder / "database").iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#! python3  # noqa: E265
+
+"""
+    Conditional downloads of the projects stored on a web server, against a local
+    HTTP server answering 200, 304, or not running at all.
+"""
+
+# Standard library
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# PyQGIS
+from qgis.testing import start_app
+
+# project
+from menu_from_project.logic.qgs_manager import download_from_http
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class TestDownloadFromHttp(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        start_app()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.served = Path(self.tmp.name) / "served"
+        self.served.mkdir()
+        self.cache_folder = Path(self.tmp.name) / "cache"
+        (self.served / "project.qgs").write_bytes(b"<qgis>first</qgis>")
+
+        self.server = subprocess.Popen(
+            [
+                sys.executable,
+                str(Path(__file__).parent / "conditional_http_server.py"),
+                str(self.served),
+            ],
+            stdout=subprocess.PIPE,
+        )
+        self.uri = "http://127.0.0.1:{}/project.qgs".format(
+            int(self.server.stdout.readline())
+        )
+
+    def tearDown(self):
+        self.stop_server()
+        self.tmp.cleanup()
+
+    def stop_server(self):
+        if self.server.poll() is None:
+            self.server.terminate()
+            self.server.wait()
+        self.server.stdout.close()
+
+    def statuses(self) -> list:
+        log = self.served / "requests.log"
+        return log.read_text().split() if log.is_file() else []
+
+    def test_download_then_not_modified(self):
+        path = download_from_http(self.uri, self.cache_folder)
+        self.assertEqual(path.read_bytes(), b"<qgis>first</qgis>")
+
+        again = download_from_http(self.uri, self.cache_folder)
+        self.assertEqual(again, path)
+        self.assertEqual(again.read_bytes(), b"<qgis>first</qgis>")
+        self.assertEqual(self.statuses(), ["200", "304"])
+
+    def test_modified_project_downloaded(self):
+        download_from_http(self.uri, self.cache_folder)
+        (self.served / "project.qgs").write_bytes(b"<qgis>second</qgis>")
+
+        path = download_from_http(self.uri, self.cache_folder)
+        self.assertEqual(path.read_bytes(), b"<qgis>second</qgis>")
+        self.assertEqual(self.statuses(), ["200", "200"])
+
+    def test_connection_error_uses_local_copy(self):
+        path = download_from_http(self.uri, self.cache_folder)
+        self.stop_server()
+
+        again = download_from_http(self.uri, self.cache_folder)
+        self.assertEqual(again, path)
+        self.assertEqual(again.read_bytes(), b"<qgis>first</qgis>")
+
+    def test_connection_error_without_local_copy(self):
+        self.stop_server()
+        with self.assertRaises(IOError):
+            download_from_http(self.uri, self.cache_folder)
+
+    def test_server_error_uses_local_copy(self):
+        download_from_http(self.uri, self.cache_folder)
+        (self.served / "project.qgs").unlink()
+
+        again = download_from_http(self.uri, self.cache_folder)
+        self.assertEqual(again.read_bytes(), b"<qgis>first</qgis>")
+        self.assertEqual(self.statuses(), ["200", "404"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+#! python3  # noqa: E265
+
+"""
+    Maplayer XML collected while the project summary is extracted.
+"""
+
+# Standard library
+import tempfile
+import unittest
+from pathlib import Path
+
+# project
+from menu_from_project.benchmarks.synthetic_project import project_xml, write_project
+from menu_from_project.logic.qgs_manager import (
+    extract_project_summary,
+    prepare_layer_fragments,
+    resolve_layer_fragments,
+)
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class TestLayerFragments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_single_pass(self):
+        for suffix in (".qgs", ".qgz"):
+            project = str(
+                write_project(
+                    self.folder / ("project" + suffix), project_xml(20, 3, 2)
+                )
+            )
+
+            fragments = dict()
+            summary = extract_project_summary(project, project, None, fragments)
+
+            # same summary, same layers XML as with a pass for each
+            self.assertEqual(summary, extract_project_summary(project, project))
+            prepared = resolve_layer_fragments(fragments, summary)
+            self.assertEqual(prepared, prepare_layer_fragments(project, summary))
+            self.assertEqual(set(prepared), set(summary["layers"]))
+            self.assertIn(
+                "<datasource>{}/./data/layer_0.gpkg".format(self.folder.as_posix()),
+                prepared["layer_000000"],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#! python3  # noqa: E265
+
+"""
+    Sources found unreachable are probed again, reachable ones are kept.
+"""
+
+# Standard library
+import socket
+import unittest
+
+# project
+from menu_from_project.logic.reachability import SourceProbe, source_key
+
+# ############################################################################
+# ########## Functions #############
+# ##################################
+
+
+def listen(port: int = 0) -> socket.socket:
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", port))
+    server.listen()
+    return server
+
+
+def free_port() -> int:
+    server = listen()
+    port = server.getsockname()[1]
+    server.close()
+    return port
+
+
+# ############################################################################
+# ########## Classes ###############
+# ##################################
+
+
+class TestSourceProbe(unittest.TestCase):
+    def test_clear_unreachable(self):
+        online = listen()
+        self.addCleanup(online.close)
+        online_uri = "http://127.0.0.1:{}/project.qgz".format(online.getsockname()[1])
+        offline_port = free_port()
+        offline_uri = "http://127.0.0.1:{}/project.qgz".format(offline_port)
+
+        probe = SourceProbe(timeout=2)
+        probe.start([online_uri, offline_uri])
+        self.assertTrue(probe.is_reachable(online_uri))
+        self.assertFalse(probe.is_reachable(offline_uri))
+
+        # back online
+        offline = listen(offline_port)
+        self.addCleanup(offline.close)
+        known = probe._probes[source_key(online_uri)]
+        probe.clear_unreachable()
+
+        self.assertEqual(list(probe._probes), [source_key(online_uri)])
+        self.assertIs(probe._probes[source_key(online_uri)], known)
+        self.assertTrue(probe.is_reachable(online_uri, wait=False))
+        self.assertTrue(probe.is_reachable(offline_uri))
+
+
+if __name__ == "__main__":
+    unittest.main()
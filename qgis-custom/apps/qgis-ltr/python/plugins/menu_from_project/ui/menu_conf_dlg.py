@@ -9,7 +9,7 @@ import logging
 from functools import partial
 
 # PyQGIS
-from qgis.core import QgsApplication
+from qgis.core import QgsApplication, QgsTask
 from qgis.gui import QgsProviderGuiRegistry
 from qgis.PyQt import uic
 from qgis.PyQt.QtCore import QRect, Qt
@@ -50,6 +50,8 @@ class MenuConfDialog(QDialog, FORM_CLASS):
     def __init__(self, parent, plugin):
         self.plugin = plugin
         self.parent = parent
+        # running project checks, by URI line edit and URI
+        self.checkTasks = dict()
         QDialog.__init__(self, parent)
         self.setupUi(self)
         self.defaultcursor = self.cursor
@@ -177,7 +179,7 @@ class MenuConfDialog(QDialog, FORM_CLASS):
                 le.setStyleSheet("color: {};".format("black"))
 
             self.tableWidget.setCellWidget(idx, self.cols.uri, le)
-            le.textChanged.connect(self.onTextChanged)
+            le.editingFinished.connect(self.onEditingFinished)
 
         # -- Options
         self.cbxLoadAll.setChecked(self.plugin.optionLoadAll)
@@ -189,6 +191,14 @@ class MenuConfDialog(QDialog, FORM_CLASS):
         self.cbxShowTooltip.setCheckState(self.plugin.optionTooltip)
         self.cbxShowTooltip.setTristate(False)
 
+        self.cbxLazyMenus.setChecked(self.plugin.optionLazyMenus)
+        self.cbxLazyMenus.setTristate(False)
+
+        self.cbxParallelLoad.setChecked(self.plugin.optionParallelLoad)
+        self.cbxParallelLoad.setTristate(False)
+
+        self.leManifest.setText(self.plugin.manifestPath)
+
         self.tableTunning()
 
     def addEditButton(self, row, guess_type):
@@ -236,6 +246,7 @@ class MenuConfDialog(QDialog, FORM_CLASS):
             try:
                 file_widget = self.tableWidget.cellWidget(row, self.cols.uri)
                 file_widget.setText(filePath[0])
+                self.checkProject(file_widget)
 
                 name_widget = self.tableWidget.cellWidget(row, self.cols.name)
                 name = name_widget.text()
@@ -269,6 +280,7 @@ class MenuConfDialog(QDialog, FORM_CLASS):
                 try:
                     file_widget = self.tableWidget.cellWidget(row, self.cols.uri)
                     file_widget.setText(uri)
+                    self.checkProject(file_widget)
 
                     name_widget = self.tableWidget.cellWidget(row, self.cols.name)
                     name = name_widget.text()
@@ -309,6 +321,9 @@ class MenuConfDialog(QDialog, FORM_CLASS):
         self.plugin.optionTooltip = self.cbxShowTooltip.isChecked()
         self.plugin.optionLoadAll = self.cbxLoadAll.isChecked()
         self.plugin.optionCreateGroup = self.cbxCreateGroup.isChecked()
+        self.plugin.optionLazyMenus = self.cbxLazyMenus.isChecked()
+        self.plugin.optionParallelLoad = self.cbxParallelLoad.isChecked()
+        self.plugin.manifestPath = self.leManifest.text().strip()
 
         self.plugin.store()
 
@@ -353,7 +368,7 @@ class MenuConfDialog(QDialog, FORM_CLASS):
         itemFile.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
         self.tableWidget.setItem(row, self.cols.uri, itemFile)
         filepath_lineedit = QLineEdit()
-        filepath_lineedit.textChanged.connect(self.onTextChanged)
+        filepath_lineedit.editingFinished.connect(self.onEditingFinished)
         self.tableWidget.setCellWidget(row, self.cols.uri, filepath_lineedit)
 
         # apply table styling
@@ -481,19 +496,56 @@ class MenuConfDialog(QDialog, FORM_CLASS):
         except Exception as err:
             self.plugin.log("Error moving down row {}. Trace: {}".format(r, err))
 
-    def onTextChanged(self, text: str):
-        """Read the project using the URI of the project that changed into the table.
+    def onEditingFinished(self):
+        """Check the project whose URI has been edited into the table."""
+        self.checkProject(self.sender())
 
-        :param text: project path URI
-        :type text: str
+    def checkProject(self, file_widget: QLineEdit):
+        """Check that the project of a table URI can be read, in a background \
+        task, then color the URI accordingly.
+
+        :param file_widget: URI line edit
+        :type file_widget: QLineEdit
         """
-        file_widget = self.sender()
+        uri = file_widget.text()
+        key = (id(file_widget), uri)
+        if not uri or key in self.checkTasks:
+            return
+
+        task = QgsTask.fromFunction(
+            QgsApplication.translate(
+                "menu_from_project", "Checking project {}", None
+            ).format(uri),
+            self.plugin.checkProject,
+            uri,
+            on_finished=partial(self.onProjectChecked, file_widget, uri),
+        )
+        # keep a reference until it is finished
+        self.checkTasks[key] = task
+        QgsApplication.taskManager().addTask(task)
+
+    def onProjectChecked(self, file_widget, uri, exception, result=None):
+        """Color the URI of a checked project, unless it changed in the meantime.
+
+        :param file_widget: URI line edit
+        :type file_widget: QLineEdit
+        :param uri: checked project URI
+        :type uri: str
+        :param exception: the exception raised by the task, if any
+        :type exception: Exception
+        """
+        self.checkTasks.pop((id(file_widget), uri), None)
         try:
-            self.plugin.getQgsDoc(text)
-            file_widget.setStyleSheet("color: {};".format("black"))
-        except Exception as err:
-            self.plugin.log("Error during project reading: {}".format(err))
-            file_widget.setStyleSheet("color: {};".format("red"))
+            if file_widget.text() != uri:
+                return
+            if exception is not None:
+                self.plugin.log("Error during project reading: {}".format(exception))
+            file_widget.setStyleSheet(
+                "color: {};".format("black" if exception is None else "red")
+            )
+        except RuntimeError:
+            # dialog closed
+            pass
 
     def tableTunning(self):
         """Prettify table aspect"""